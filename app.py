@@ -1,21 +1,36 @@
+from utils.startup_timing import StartupTimer
+
+startup_timer = StartupTimer()
+
 import os
 import sys
 import logging
 import uuid
+import hashlib
+import json
+import time
 from datetime import datetime, timedelta
+import click
+from functools import wraps
 from dotenv import load_dotenv
 
 # Load environment variables
 load_dotenv()
-from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session
+from flask import Flask, render_template, request, jsonify, flash, redirect, url_for, session, g, has_app_context, abort
 from werkzeug.utils import secure_filename
 from werkzeug.middleware.proxy_fix import ProxyFix
 from werkzeug.security import check_password_hash, generate_password_hash
 from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.orm import (DeclarativeBase, selectinload, joinedload, deferred,
+                            undefer, undefer_group, column_property)
 from flask_login import LoginManager, login_user, logout_user, login_required, current_user, UserMixin
-from sqlalchemy import or_
-import stripe
+from sqlalchemy import and_, or_, update, func
+from sqlalchemy.exc import IntegrityError
+from jinja2 import FileSystemBytecodeCache
+
+from utils.compressed_text import CompressedText
+
+startup_timer.mark('imports')
 
 # Force UTF-8 encoding
 os.environ['PYTHONIOENCODING'] = 'utf-8'
@@ -53,12 +68,39 @@ db = SQLAlchemy(model_class=Base)
 # Create the app
 app = Flask(__name__)
 
-# Add cache control headers for Replit compatibility
+# Szablony Jinja kompilowane raz na proces (bytecode cache między restartami),
+# przeładowanie z dysku tylko gdy TEMPLATES_AUTO_RELOAD=true (tryb deweloperski)
+app.config['TEMPLATES_AUTO_RELOAD'] = os.environ.get(
+    'TEMPLATES_AUTO_RELOAD', 'false').lower() in ('1', 'true', 'yes')
+app.jinja_options = {
+    **app.jinja_options,
+    'bytecode_cache': FileSystemBytecodeCache(os.environ.get('JINJA_CACHE_DIR')),
+}
+
+# Pliki statyczne z nazwami ze skrótem zawartości - cache immutable (utils/static_assets.py)
+from utils.static_assets import init_static_assets
+
+init_static_assets(app, check_mtime=app.config['TEMPLATES_AUTO_RELOAD'] or app.debug)
+
+# Kompresja gzip/brotli odpowiedzi HTML i JSON (utils/compression.py)
+from utils.compression import init_compression
+
+init_compression(app)
+
+
 @app.after_request
 def after_request(response):
-    response.headers['Cache-Control'] = 'no-cache, no-store, must-revalidate'
-    response.headers['Pragma'] = 'no-cache'
-    response.headers['Expires'] = '0'
+    # Pliki statyczne i awatary ustawiają własne nagłówki cache
+    if 'Cache-Control' in response.headers:
+        return response
+    # Strony zalogowanego użytkownika nie mogą trafić do żadnego cache;
+    # pozostałe odpowiedzi dynamiczne są rewalidowane przy każdym użyciu
+    if current_user.is_authenticated:
+        response.headers['Cache-Control'] = 'private, no-store'
+        response.headers['Pragma'] = 'no-cache'
+    else:
+        response.headers['Cache-Control'] = 'no-cache'
+    response.vary.add('Cookie')
     return response
 # Require SESSION_SECRET in production
 SESSION_SECRET = os.environ.get("SESSION_SECRET")
@@ -68,7 +110,7 @@ if not SESSION_SECRET:
     logger.warning("Using default session secret for development only")
 
 app.secret_key = SESSION_SECRET
-app.wsgi_app = ProxyFix(app.wsgi_app, x_proto=1, x_host=1)
+app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1)
 
 # --- DODAJ TUTAJ ---
 from flask import send_from_directory
@@ -82,7 +124,7 @@ def ads_txt():
                                'ads.txt')
 
 
-# Configure the database - with connection testing and fallback
+# Configure the database - bez połączenia przy imporcie (stan bazy sprawdza /health/ready)
 database_url = None
 pg_host = os.environ.get("PGHOST")
 pg_user = os.environ.get("PGUSER") 
@@ -94,25 +136,6 @@ pg_port = os.environ.get("PGPORT", "5432")
 if all([pg_host, pg_user, pg_password, pg_database]):
     database_url = f"postgresql://{pg_user}:{pg_password}@{pg_host}:{pg_port}/{pg_database}?sslmode=require"
     logger.info("Built PostgreSQL connection from individual env vars")
-    
-    # Test connection
-    try:
-        import psycopg2
-        test_conn = psycopg2.connect(
-            host=pg_host,
-            user=pg_user,
-            password=pg_password,
-            database=pg_database,
-            port=pg_port,
-            sslmode='require',
-            connect_timeout=10
-        )
-        test_conn.close()
-        logger.info("PostgreSQL connection test successful")
-    except Exception as conn_error:
-        logger.error(f"PostgreSQL connection test failed: {str(conn_error)}")
-        logger.warning("Falling back to SQLite due to PostgreSQL connection failure")
-        database_url = "sqlite:///cv_optimizer.db"
 elif os.environ.get("DATABASE_URL"):
     # Try original DATABASE_URL
     database_url = os.environ.get("DATABASE_URL")
@@ -130,20 +153,20 @@ logger.info(
 )
 
 # Configure database engine options based on database type
+from utils.db_config import build_engine_options, gevent_active, patch_psycopg_for_gevent
+
+app.config["SQLALCHEMY_ENGINE_OPTIONS"] = build_engine_options(database_url)
 if database_url and database_url.startswith("sqlite"):
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-        "pool_pre_ping": True,
-    }
     logger.info("Using SQLite database configuration")
 else:
-    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
-        "pool_recycle": 300,
-        "pool_pre_ping": True,
-        "connect_args": {
-            "options": "-c client_encoding=utf8"
-        }
-    }
-    logger.info("Using PostgreSQL database configuration")
+    if gevent_active():
+        patch_psycopg_for_gevent()
+    engine_options = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+    logger.info(
+        f"Using PostgreSQL database configuration (pool_size={engine_options['pool_size']}, "
+        f"max_overflow={engine_options['max_overflow']})")
+
+startup_timer.mark('config')
 
 # File upload configuration
 app.config['MAX_CONTENT_LENGTH'] = 16 * 1024 * 1024  # 16MB max file size
@@ -168,12 +191,27 @@ else:
 
 # Initialize Stripe only if keys are available
 if STRIPE_SECRET_KEY:
-    stripe.api_key = STRIPE_SECRET_KEY
     stripe_mode = "LIVE" if STRIPE_SECRET_KEY.startswith('sk_live_') else "TEST"
     logger.info(f"Stripe initialized in {stripe_mode} mode")
 else:
     logger.info("Stripe disabled - no valid keys configured")
 
+
+# Wywołania API Stripe z limitami czasu, cache i ponownym użyciem sesji checkout
+from utils.stripe_gateway import DEFAULT_TIMEOUT_SECONDS, StripeGateway
+
+stripe_gateway = StripeGateway(STRIPE_SECRET_KEY,
+                               api_base=os.environ.get('STRIPE_API_BASE'),
+                               timeout=float(os.environ.get('STRIPE_TIMEOUT', DEFAULT_TIMEOUT_SECONDS)))
+
+
+def get_stripe():
+    """
+    Moduł stripe z ustawionym kluczem API. Import trwa ok. 0,7 s, więc nie
+    wydłuża importu aplikacji - w gunicorn ładuje go warm_up() przed pierwszym żądaniem
+    """
+    return stripe_gateway.stripe
+
 # Cennik
 PRICING = {
     'single_cv': {
@@ -194,6 +232,29 @@ PRICING = {
     }
 }
 
+# Limity wywołań AI na użytkownika: plan -> grupa tras -> limity w oknie przesuwnym
+# (utils/rate_limit.py). Plany płatne biorą limity z PRICING, pozostali z FREE_RATE_LIMITS.
+PRICING['single_cv']['rate_limits'] = {
+    'optimize': ['5/minute', '30/hour'],
+    'generate': ['5/minute', '30/hour'],
+}
+PRICING['monthly_package']['rate_limits'] = {
+    'optimize': ['10/minute', '120/hour'],
+    'generate': ['10/minute', '120/hour'],
+}
+FREE_RATE_LIMITS = {
+    'optimize': ['3/minute', '20/hour'],
+    'generate': ['3/minute', '20/hour'],
+}
+# Na adres IP, niezależnie od konta (kilka kont z jednego adresu, NAT biura)
+IP_RATE_LIMITS = ['30/minute', '300/hour']
+RATE_LIMIT_ENABLED = os.environ.get('RATE_LIMIT_ENABLED', 'true').lower() in ('1', 'true', 'yes')
+
+# Cache uprawnień (subskrypcja / płatności jednorazowe) współdzielony między żądaniami
+ENTITLEMENTS_CACHE_TTL = int(os.environ.get('ENTITLEMENTS_CACHE_TTL', '300'))  # sekundy, 0 = wyłączony
+ENTITLEMENTS_CACHE_MAX_USERS = 10000
+_entitlements_cache = {}  # user_id -> (entitlements_version, expires_at, entitlements)
+
 # Ensure upload directories exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
 os.makedirs(AVATAR_FOLDER, exist_ok=True)
@@ -228,80 +289,81 @@ class User(UserMixin, db.Model):
     bio = db.Column(db.Text, nullable=True)
     location = db.Column(db.String(100), nullable=True)
 
+    # Wersja uprawnień - zwiększana przy każdej zmianie płatności/subskrypcji,
+    # unieważnia cache uprawnień we wszystkich workerach
+    entitlements_version = db.Column(db.Integer, nullable=True)
+
     # Relacje dla statystyk
     cv_uploads = db.relationship('CVUpload', backref='user', lazy=True)
-
-    def is_premium_active(self):
+    statistics = db.relationship('UserStatistics', uselist=False, lazy=True)
+
+    def get_entitlements(self):
+        """
+        Zwraca migawkę uprawnień użytkownika: cache w flask.g na czas żądania,
+        a między żądaniami cache procesu z TTL ważny tak długo, jak
+        entitlements_version w bazie. Po zmianie płatności wywołaj invalidate_entitlements().
+        """
+        if not has_app_context():
+            return self._resolve_entitlements()
+
+        cache = g.setdefault('entitlements', {})
+        entitlements = cache.get(self.id)
+        if entitlements is None:
+            entitlements = self._get_shared_entitlements()
+            cache[self.id] = entitlements
+        return entitlements
+
+    def _get_shared_entitlements(self):
+        version = self.entitlements_version or 0
+        now = datetime.utcnow()
+        cached = _entitlements_cache.get(self.id)
+        if cached and cached[0] == version and now < cached[1]:
+            return cached[2]
+
+        entitlements = self._resolve_entitlements()
+        if ENTITLEMENTS_CACHE_TTL > 0:
+            # Wygaś najpóźniej z końcem subskrypcji lub premium_until
+            expires_at = min([now + timedelta(seconds=ENTITLEMENTS_CACHE_TTL)] + [
+                moment for moment in (entitlements['payment_status'].get('expires'),
+                                      self.premium_until)
+                if moment and moment > now
+            ])
+            if len(_entitlements_cache) >= ENTITLEMENTS_CACHE_MAX_USERS:
+                _prune_entitlements_cache(now)
+            _entitlements_cache[self.id] = (version, expires_at, entitlements)
+        return entitlements
+
+    def _resolve_entitlements(self):
+        """Wylicza uprawnienia: jedno zapytanie o subskrypcję i jedno o płatności jednorazowe"""
         if self.is_developer():
-            return True
+            return {
+                'is_premium': True,
+                'can_optimize_cv': True,
+                'can_use_full_features': True,
+                'payment_status': {'type': 'developer', 'status': 'active'}
+            }
 
         # Sprawdź aktywną subskrypcję
-        active_subscription = Subscription.query.filter_by(
-            user_id=self.id, status='active').first()
-
-        if active_subscription and active_subscription.is_active():
-            return True
-
-        return self.premium_until and datetime.utcnow() < self.premium_until
-
-    def can_optimize_cv(self):
-        """Sprawdza czy użytkownik może optymalizować CV"""
-        if self.is_developer():
-            return True
-
-        # Sprawdź aktywną subskrypcję (pełny pakiet)
-        if self.is_premium_active():
-            return True
+        subscription = Subscription.query.filter_by(user_id=self.id,
+                                                    status='active').first()
+        has_subscription = bool(subscription and subscription.is_active())
+        is_premium = has_subscription or bool(
+            self.premium_until and datetime.utcnow() < self.premium_until)
 
         # Sprawdź jednorazowe płatności
         single_payment = SinglePayment.query.filter_by(user_id=self.id).filter(
             SinglePayment.cv_optimizations_used <
             SinglePayment.cv_optimizations_limit).first()
 
-        return single_payment is not None
-
-    def can_use_full_features(self):
-        """Sprawdza czy użytkownik ma dostęp do pełnych funkcji (list motywacyjny, pytania, analiza)"""
-        if self.is_developer():
-            return True
-
-        # Tylko subskrybenci mają dostęp do pełnych funkcji
-        return self.is_premium_active()
-
-    def use_cv_optimization(self):
-        """Używa jedną optymalizację CV z jednorazowej płatności"""
-        single_payment = SinglePayment.query.filter_by(user_id=self.id).filter(
-            SinglePayment.cv_optimizations_used <
-            SinglePayment.cv_optimizations_limit).first()
-
-        if single_payment:
-            return single_payment.use_optimization()
-        return False
-
-    def get_payment_status(self):
-        """Zwraca status płatności użytkownika"""
-        if self.is_developer():
-            return {'type': 'developer', 'status': 'active'}
-
-        # Sprawdź subskrypcję
-        subscription = Subscription.query.filter_by(user_id=self.id,
-                                                    status='active').first()
-
-        if subscription and subscription.is_active():
-            return {
+        if has_subscription:
+            payment_status = {
                 'type': 'subscription',
                 'status': 'active',
                 'expires': subscription.current_period_end,
                 'plan': subscription.plan_type
             }
-
-        # Sprawdź jednorazowe płatności
-        single_payment = SinglePayment.query.filter_by(user_id=self.id).filter(
-            SinglePayment.cv_optimizations_used <
-            SinglePayment.cv_optimizations_limit).first()
-
-        if single_payment:
-            return {
+        elif single_payment:
+            payment_status = {
                 'type':
                 'single',
                 'status':
@@ -310,25 +372,51 @@ class User(UserMixin, db.Model):
                 single_payment.cv_optimizations_limit -
                 single_payment.cv_optimizations_used
             }
+        else:
+            payment_status = {'type': 'free', 'status': 'inactive'}
+
+        return {
+            'is_premium': is_premium,
+            # Pełny pakiet albo niewykorzystana jednorazowa optymalizacja
+            'can_optimize_cv': is_premium or single_payment is not None,
+            # Tylko subskrybenci mają dostęp do pełnych funkcji
+            'can_use_full_features': is_premium,
+            'payment_status': payment_status
+        }
+
+    def invalidate_entitlements(self):
+        """Unieważnia uprawnienia użytkownika (przed commitem zmiany płatności)"""
+        invalidate_entitlements(self.id)
+
+    def is_premium_active(self):
+        return self.get_entitlements()['is_premium']
 
-        return {'type': 'free', 'status': 'inactive'}
+    def can_optimize_cv(self):
+        """Sprawdza czy użytkownik może optymalizować CV"""
+        return self.get_entitlements()['can_optimize_cv']
+
+    def can_use_full_features(self):
+        """Sprawdza czy użytkownik ma dostęp do pełnych funkcji (list motywacyjny, pytania, analiza)"""
+        return self.get_entitlements()['can_use_full_features']
+
+    def get_payment_status(self):
+        """Zwraca status płatności użytkownika"""
+        return self.get_entitlements()['payment_status']
 
     def is_developer(self):
         return self.username == 'developer'
 
     def get_cv_count(self):
         """Zwraca liczbę przesłanych CV"""
-        return CVUpload.query.filter_by(user_id=self.id).count()
+        return self.get_statistics().cv_count
 
     def get_optimized_cv_count(self):
         """Zwraca liczbę zoptymalizowanych CV"""
-        return CVUpload.query.filter_by(user_id=self.id).filter(
-            CVUpload.optimized_cv.isnot(None)).count()
+        return self.get_statistics().optimized_count
 
     def get_analyzed_cv_count(self):
         """Zwraca liczbę przeanalizowanych CV"""
-        return CVUpload.query.filter_by(user_id=self.id).filter(
-            CVUpload.cv_analysis.isnot(None)).count()
+        return self.get_statistics().analyzed_count
 
     def get_success_rate(self):
         """Oblicza wskaźnik sukcesu optymalizacji"""
@@ -350,55 +438,69 @@ class User(UserMixin, db.Model):
                                      CVUpload.created_at
                                      >= cutoff_date).count()
 
+    def get_monthly_activity(self, model, months=12):
+        """Liczba wierszy modelu (CVUpload, CoverLetter, ...) per miesiąc kalendarzowy, od najstarszego"""
+        from utils.sql_helpers import time_bucket, bucket_key, last_month_starts
+
+        month_starts = last_month_starts(months)
+        bucket = time_bucket(model.created_at, db.engine.dialect.name, 'month')
+        counts = dict(
+            db.session.query(bucket, func.count(model.id)).filter(
+                model.user_id == self.id,
+                model.created_at >= month_starts[0]).group_by(bucket).all())
+        return [{
+            'month': month_start.strftime('%m/%Y'),
+            'count': counts.get(bucket_key(month_start, 'month'), 0)
+        } for month_start in month_starts]
+
     def get_statistics(self):
-        """Zwraca statystyki użytkownika"""
-        stats = UserStatistics.query.filter_by(user_id=self.id).first()
+        """Zwraca statystyki użytkownika (jeden wiersz, ładowany raz na obiekt)"""
+        stats = self.statistics
+        if not stats or not stats.counters_ready():
+            stats = self._get_or_create_statistics()
+            stats.refresh_counters()
+            db.session.commit()
+        return stats
+
+    def _get_or_create_statistics(self):
+        stats = self.statistics
         if not stats:
             stats = UserStatistics()
             stats.user_id = self.id
             db.session.add(stats)
-            db.session.commit()
+            self.statistics = stats
         return stats
 
+    def increment_statistics(self, **deltas):
+        """
+        Zwiększa zmaterializowane liczniki w bieżącej transakcji (commit robi wywołujący),
+        np. increment_statistics(cv_count=1). UPDATE licznik = licznik + n jest atomowy.
+        """
+        db.session.flush()
+        updated = db.session.execute(
+            update(UserStatistics).where(
+                UserStatistics.user_id == self.id,
+                UserStatistics.cv_count.isnot(None)).values({
+                    getattr(UserStatistics, name): getattr(UserStatistics, name) + delta
+                    for name, delta in deltas.items()
+                })).rowcount
+        if not updated:
+            # Liczniki jeszcze nie zmaterializowane - przelicz (uwzględnia nowy wiersz)
+            self._get_or_create_statistics().refresh_counters()
+
     def get_advanced_stats(self):
         """Zwraca zaawansowane statystyki użytkownika"""
         try:
             from sqlalchemy import func, extract
 
-            # Podstawowe liczby
-            total_cvs = self.get_cv_count()
-            optimized_cvs = self.get_optimized_cv_count()
-
-            # Listy motywacyjne - z obsługą błędów
-            try:
-                cover_letters_count = CoverLetter.query.filter_by(user_id=self.id).count()
-            except Exception as e:
-                logger.warning(f"Error querying CoverLetter table: {str(e)}")
-                cover_letters_count = 0
-
-            # Pytania rekrutacyjne - z obsługą błędów
-            try:
-                interview_questions_count = InterviewQuestions.query.filter_by(user_id=self.id).count()
-            except Exception as e:
-                logger.warning(f"Error querying InterviewQuestions table: {str(e)}")
-                interview_questions_count = 0
-
-            # Analizy luk kompetencyjnych - z obsługą błędów
-            try:
-                skills_analyses_count = SkillsGapAnalysis.query.filter_by(user_id=self.id).count()
-            except Exception as e:
-                logger.warning(f"Error querying SkillsGapAnalysis table: {str(e)}")
-                skills_analyses_count = 0
-
-            # Całkowita wartość zakupów - z obsługą błędów
-            try:
-                total_spent = db.session.query(func.sum(StripePayment.amount)).filter(
-                    StripePayment.user_id == self.id,
-                    StripePayment.status == 'completed'
-                ).scalar() or 0
-            except Exception as e:
-                logger.warning(f"Error querying StripePayment table: {str(e)}")
-                total_spent = 0
+            # Podstawowe liczby - z zmaterializowanego wiersza statystyk
+            stats = self.get_statistics()
+            total_cvs = stats.cv_count
+            optimized_cvs = stats.optimized_count
+            cover_letters_count = stats.cover_letters_count
+            interview_questions_count = stats.interview_questions_count
+            skills_analyses_count = stats.skills_analyses_count
+            total_spent = stats.total_spent
 
             # Aktywność w ostatnich 7 dniach
             week_activity = self.get_recent_activity(7)
@@ -429,21 +531,9 @@ class User(UserMixin, db.Model):
                 logger.warning(f"Error calculating avg optimization time: {str(e)}")
                 avg_optimization_time = 0
 
-            # Aktywność miesięczna (ostatnie 12 miesięcy)
-            monthly_activity = []
+            # Aktywność miesięczna (ostatnie 12 miesięcy kalendarzowych, jedno zapytanie)
             try:
-                for i in range(12):
-                    month_start = datetime.utcnow().replace(day=1) - timedelta(days=30 * i)
-                    month_end = month_start.replace(day=28) + timedelta(days=4)
-                    month_count = CVUpload.query.filter(
-                        CVUpload.user_id == self.id,
-                        CVUpload.created_at >= month_start,
-                        CVUpload.created_at < month_end
-                    ).count()
-                    monthly_activity.append({
-                        'month': month_start.strftime('%m/%Y'),
-                        'count': month_count
-                    })
+                monthly_activity = self.get_monthly_activity(CVUpload, months=12)
             except Exception as e:
                 logger.warning(f"Error calculating monthly activity: {str(e)}")
                 monthly_activity = [{'month': '', 'count': 0} for _ in range(12)]
@@ -471,7 +561,7 @@ class User(UserMixin, db.Model):
                 'week_activity': week_activity,
                 'popular_jobs': [{'title': job[0], 'count': job[1]} for job in popular_jobs],
                 'avg_optimization_time_minutes': round(avg_optimization_time, 1),
-                'monthly_activity': list(reversed(monthly_activity)),
+                'monthly_activity': monthly_activity,
                 'productivity_score': productivity_score,
                 'achievements': achievements
             }
@@ -499,31 +589,17 @@ class User(UserMixin, db.Model):
         try:
             score = 0
 
+            stats = self.get_statistics()
+
             # Punkty za aktywność
-            cv_count = self.get_cv_count()
-            score += min(cv_count * 10, 40)  # Max 40 punktów za CV (4 CV = max)
+            score += min(stats.cv_count * 10, 40)  # Max 40 punktów za CV (4 CV = max)
 
             # Punkty za optymalizacje
-            optimized_count = self.get_optimized_cv_count()
-            score += min(optimized_count * 15, 30)  # Max 30 punktów za optymalizacje
-
-            # Punkty za wykorzystanie dodatkowych funkcji - z obsługą błędów
-            try:
-                cover_letters = CoverLetter.query.filter_by(user_id=self.id).count()
-            except Exception:
-                cover_letters = 0
-
-            try:
-                interview_questions = InterviewQuestions.query.filter_by(user_id=self.id).count()
-            except Exception:
-                interview_questions = 0
-
-            try:
-                skills_analyses = SkillsGapAnalysis.query.filter_by(user_id=self.id).count()
-            except Exception:
-                skills_analyses = 0
+            score += min(stats.optimized_count * 15, 30)  # Max 30 punktów za optymalizacje
 
-            extras = cover_letters + interview_questions + skills_analyses
+            # Punkty za wykorzystanie dodatkowych funkcji
+            extras = (stats.cover_letters_count + stats.interview_questions_count +
+                      stats.skills_analyses_count)
             score += min(extras * 5, 20)  # Max 20 punktów za dodatkowe funkcje
 
             # Punkty za regularność (aktywność w ostatnim tygodniu)
@@ -545,14 +621,10 @@ class User(UserMixin, db.Model):
         try:
             achievements = []
 
-            cv_count = self.get_cv_count()
-            optimized_count = self.get_optimized_cv_count()
-
-            # Query cover letters with error handling
-            try:
-                cover_letters = CoverLetter.query.filter_by(user_id=self.id).count()
-            except Exception:
-                cover_letters = 0
+            stats = self.get_statistics()
+            cv_count = stats.cv_count
+            optimized_count = stats.optimized_count
+            cover_letters = stats.cover_letters_count
 
             # Osiągnięcia za liczbę CV
             if cv_count >= 1:
@@ -633,13 +705,9 @@ class User(UserMixin, db.Model):
     def get_time_saved_estimate(self):
         """Oszacowuje zaoszczędzony czas w godzinach"""
         try:
-            optimized_count = self.get_optimized_cv_count()
-
-            # Query cover letters with error handling
-            try:
-                cover_letters = CoverLetter.query.filter_by(user_id=self.id).count()
-            except Exception:
-                cover_letters = 0
+            stats = self.get_statistics()
+            optimized_count = stats.optimized_count
+            cover_letters = stats.cover_letters_count
 
             # Szacunek: 2h na optymalizację CV ręcznie, 1h na list motywacyjny
             time_saved = (optimized_count * 2) + (cover_letters * 1)
@@ -654,24 +722,100 @@ class User(UserMixin, db.Model):
 
 
 class CVUpload(db.Model):
+    __table_args__ = (db.Index('ix_cv_upload_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     filename = db.Column(db.String(255), nullable=False)
-    original_text = db.Column(db.Text, nullable=False)
+    # Duże kolumny tekstowe (grupa 'content', kompresowane) - ładowane dopiero na stronach szczegółów
+    original_text = deferred(db.Column(CompressedText, nullable=False), group='content')
     job_title = db.Column(db.String(200), nullable=False)
-    job_description = db.Column(db.Text, nullable=True)
-    optimized_cv = db.Column(db.Text, nullable=True)
-    cv_analysis = db.Column(db.Text, nullable=True)
+    job_description = deferred(db.Column(db.Text, nullable=True), group='content')
+    optimized_cv = deferred(db.Column(CompressedText, nullable=True), group='content')
+    cv_analysis = deferred(db.Column(CompressedText, nullable=True), group='content')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     optimized_at = db.Column(db.DateTime, nullable=True)
     analyzed_at = db.Column(db.DateTime, nullable=True)
 
+    # Flagi dla list (profil, panel) - bez pobierania samych tekstów
+    has_optimized_cv = column_property(optimized_cv.columns[0].isnot(None))
+    has_cv_analysis = column_property(cv_analysis.columns[0].isnot(None))
+
+    # Wygenerowane materiały - strona wyniku ładuje je przez selectinload
+    cover_letters = db.relationship('CoverLetter',
+                                    backref='cv_upload',
+                                    lazy=True,
+                                    order_by='CoverLetter.id')
+    interview_questions = db.relationship('InterviewQuestions',
+                                          backref='cv_upload',
+                                          lazy=True,
+                                          order_by='InterviewQuestions.id')
+    skills_analyses = db.relationship('SkillsGapAnalysis',
+                                      backref='cv_upload',
+                                      lazy=True,
+                                      order_by='SkillsGapAnalysis.id')
+
+    def _structured_cv_hash(self):
+        from utils.cv_model import CV_DOCUMENT_VERSION
+        return hashlib.sha1(
+            f"{CV_DOCUMENT_VERSION}:{self.optimized_cv}".encode('utf-8')).hexdigest()
+
+    def get_structured_cv(self):
+        """
+        Zwraca zoptymalizowane CV jako CVDocument - zapisane przy optymalizacji.
+        Tylko odczyt: starsze lub nieaktualne wpisy są parsowane bez zapisu do bazy.
+        """
+        from utils.cv_model import CVDocument
+        from utils.cv_template_processor import parse_cv_document
+
+        if not self.optimized_cv:
+            return None
+
+        structured = StructuredCV.query.filter_by(cv_upload_id=self.id).first()
+        if structured and structured.source_hash == self._structured_cv_hash():
+            document = CVDocument.from_json(structured.document)
+            if document is not None:
+                return document
+        return parse_cv_document(self.optimized_cv)
+
+    def store_structured_cv(self):
+        """Parsuje optimized_cv i zapisuje wynik w StructuredCV (bez commita - robi go wywołujący)"""
+        from utils.cv_template_processor import parse_cv_document
+
+        document = parse_cv_document(self.optimized_cv)
+        structured = StructuredCV.query.filter_by(cv_upload_id=self.id).first()
+        if not structured:
+            structured = StructuredCV()
+            structured.cv_upload_id = self.id
+            db.session.add(structured)
+        structured.source_hash = self._structured_cv_hash()
+        structured.document = document.to_json()
+        structured.created_at = datetime.utcnow()
+        return document
+
     def __repr__(self):
         return f'<CVUpload {self.filename}>'
 
 
+class StructuredCV(db.Model):
+    """Sparsowane dane zoptymalizowanego CV (JSON CVDocument) zapisane obok CVUpload"""
+    id = db.Column(db.Integer, primary_key=True)
+    cv_upload_id = db.Column(db.Integer,
+                             db.ForeignKey('cv_upload.id'),
+                             unique=True,
+                             nullable=False)
+    source_hash = db.Column(db.String(40), nullable=False)  # sha1 wersji i tekstu CV
+    document = db.Column(db.Text, nullable=False)
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    def __repr__(self):
+        return f'<StructuredCV CVUpload:{self.cv_upload_id}>'
+
+
 class UserStatistics(db.Model):
+    __table_args__ = (db.Index('ix_user_statistics_user_id', 'user_id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     total_logins = db.Column(db.Integer, default=0)
@@ -683,11 +827,49 @@ class UserStatistics(db.Model):
                            default=datetime.utcnow,
                            onupdate=datetime.utcnow)
 
+    # Zmaterializowane liczniki aktualizowane przy tworzeniu wierszy
+    # (NULL = jeszcze nie przeliczone z tabel źródłowych)
+    cv_count = db.Column(db.Integer, nullable=True)
+    optimized_count = db.Column(db.Integer, nullable=True)
+    analyzed_count = db.Column(db.Integer, nullable=True)
+    cover_letters_count = db.Column(db.Integer, nullable=True)
+    interview_questions_count = db.Column(db.Integer, nullable=True)
+    skills_analyses_count = db.Column(db.Integer, nullable=True)
+    total_spent = db.Column(db.Integer, nullable=True)  # w groszach
+
+    COUNTER_FIELDS = ('cv_count', 'optimized_count', 'analyzed_count',
+                      'cover_letters_count', 'interview_questions_count',
+                      'skills_analyses_count', 'total_spent')
+
+    def counters_ready(self):
+        return all(getattr(self, name) is not None for name in self.COUNTER_FIELDS)
+
+    def refresh_counters(self):
+        """Przelicza liczniki z tabel źródłowych (jednorazowo dla istniejących kont)"""
+        user_id = self.user_id
+        self.cv_count = CVUpload.query.filter_by(user_id=user_id).count()
+        self.optimized_count = CVUpload.query.filter_by(user_id=user_id).filter(
+            CVUpload.optimized_cv.isnot(None)).count()
+        self.analyzed_count = CVUpload.query.filter_by(user_id=user_id).filter(
+            CVUpload.cv_analysis.isnot(None)).count()
+        self.cover_letters_count = CoverLetter.query.filter_by(user_id=user_id).count()
+        self.interview_questions_count = InterviewQuestions.query.filter_by(
+            user_id=user_id).count()
+        self.skills_analyses_count = SkillsGapAnalysis.query.filter_by(
+            user_id=user_id).count()
+        self.total_spent = db.session.query(func.sum(StripePayment.amount)).filter(
+            StripePayment.user_id == user_id,
+            StripePayment.status == 'completed').scalar() or 0
+
     def __repr__(self):
         return f'<UserStatistics User:{self.user_id}>'
 
 
 class CoverLetter(db.Model):
+    __table_args__ = (
+        db.Index('ix_cover_letter_cv_upload_id', 'cv_upload_id'),
+        db.Index('ix_cover_letter_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     cv_upload_id = db.Column(db.Integer,
@@ -695,9 +877,9 @@ class CoverLetter(db.Model):
                              nullable=False)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     job_title = db.Column(db.String(200), nullable=False)
-    job_description = db.Column(db.Text, nullable=True)
+    job_description = deferred(db.Column(db.Text, nullable=True), group='content')
     company_name = db.Column(db.String(200), nullable=True)
-    cover_letter_content = db.Column(db.Text, nullable=True)
+    cover_letter_content = deferred(db.Column(CompressedText, nullable=True), group='content')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     generated_at = db.Column(db.DateTime, nullable=True)
 
@@ -706,6 +888,10 @@ class CoverLetter(db.Model):
 
 
 class InterviewQuestions(db.Model):
+    __table_args__ = (
+        db.Index('ix_interview_questions_cv_upload_id', 'cv_upload_id'),
+        db.Index('ix_interview_questions_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     cv_upload_id = db.Column(db.Integer,
@@ -713,8 +899,8 @@ class InterviewQuestions(db.Model):
                              nullable=False)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     job_title = db.Column(db.String(200), nullable=False)
-    job_description = db.Column(db.Text, nullable=True)
-    questions_content = db.Column(db.Text, nullable=True)
+    job_description = deferred(db.Column(db.Text, nullable=True), group='content')
+    questions_content = deferred(db.Column(CompressedText, nullable=True), group='content')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     generated_at = db.Column(db.DateTime, nullable=True)
 
@@ -723,6 +909,10 @@ class InterviewQuestions(db.Model):
 
 
 class SkillsGapAnalysis(db.Model):
+    __table_args__ = (
+        db.Index('ix_skills_gap_analysis_cv_upload_id', 'cv_upload_id'),
+        db.Index('ix_skills_gap_analysis_user_id_created_at', 'user_id', 'created_at'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     cv_upload_id = db.Column(db.Integer,
@@ -730,8 +920,8 @@ class SkillsGapAnalysis(db.Model):
                              nullable=False)
     session_id = db.Column(db.String(100), unique=True, nullable=False)
     job_title = db.Column(db.String(200), nullable=False)
-    job_description = db.Column(db.Text, nullable=True)
-    analysis_content = db.Column(db.Text, nullable=True)
+    job_description = deferred(db.Column(db.Text, nullable=True), group='content')
+    analysis_content = deferred(db.Column(CompressedText, nullable=True), group='content')
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     analyzed_at = db.Column(db.DateTime, nullable=True)
 
@@ -740,6 +930,8 @@ class SkillsGapAnalysis(db.Model):
 
 
 class StripePayment(db.Model):
+    __table_args__ = (db.Index('ix_stripe_payment_user_id_status', 'user_id', 'status'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     stripe_payment_intent_id = db.Column(db.String(200),
@@ -764,6 +956,8 @@ class StripePayment(db.Model):
 
 
 class Subscription(db.Model):
+    __table_args__ = (db.Index('ix_subscription_user_id_status', 'user_id', 'status'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     stripe_subscription_id = db.Column(db.String(200),
@@ -796,6 +990,8 @@ class Subscription(db.Model):
 
 
 class SinglePayment(db.Model):
+    __table_args__ = (db.Index('ix_single_payment_user_id', 'user_id'),)
+
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
     payment_id = db.Column(db.Integer,
@@ -818,17 +1014,158 @@ class SinglePayment(db.Model):
     def can_optimize_cv(self):
         return self.cv_optimizations_used < self.cv_optimizations_limit
 
-    def use_optimization(self):
-        if self.can_optimize_cv():
-            self.cv_optimizations_used += 1
-            db.session.commit()
-            return True
-        return False
-
     def __repr__(self):
         return f'<SinglePayment {self.cv_optimizations_used}/{self.cv_optimizations_limit}>'
 
 
+class CreditReservation(db.Model):
+    """
+    Rezerwacja optymalizacji z płatności jednorazowej na czas wywołania AI.
+    Kredyt jest zdejmowany z SinglePayment przy rezerwacji i oddawany przy
+    zwolnieniu (błąd AI lub rezerwacja porzucona dłużej niż CREDIT_RESERVATION_TIMEOUT).
+    """
+    __tablename__ = 'credit_reservation'
+    __table_args__ = (db.Index('ix_credit_reservation_user_id_status', 'user_id', 'status'),)
+
+    id = db.Column(db.Integer, primary_key=True)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    single_payment_id = db.Column(db.Integer,
+                                  db.ForeignKey('single_payment.id'),
+                                  nullable=False)
+    status = db.Column(db.String(20), nullable=False,
+                       default='reserved')  # reserved, committed, released
+    created_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    settled_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<CreditReservation {self.id} {self.status}>'
+
+
+class StripeWebhookEvent(db.Model):
+    """Skrzynka odbiorcza webhooków Stripe - jeden wiersz na event, id eventu deduplikuje ponowienia"""
+    __tablename__ = 'stripe_webhook_event'
+    __table_args__ = (db.Index('ix_stripe_webhook_event_status_received_at', 'status', 'received_at'),)
+
+    id = db.Column(db.String(255), primary_key=True)  # evt_... ze Stripe
+    event_type = db.Column(db.String(100), nullable=False)
+    payload = db.Column(db.Text, nullable=False)
+    status = db.Column(db.String(20), nullable=False,
+                       default='pending')  # pending, processing, processed, failed
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    last_error = db.Column(db.Text, nullable=True)
+    received_at = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = db.Column(db.DateTime, nullable=True)
+    processed_at = db.Column(db.DateTime, nullable=True)
+
+    def __repr__(self):
+        return f'<StripeWebhookEvent {self.id} {self.event_type}: {self.status}>'
+
+
+startup_timer.mark('models')
+
+
+def invalidate_entitlements(user_id):
+    """
+    Unieważnia uprawnienia użytkownika: cache żądania, cache procesu oraz
+    entitlements_version w bazie (inne workery zobaczą nową wersję po commicie).
+    Wywołuj w tej samej transakcji co zmianę płatności, przed db.session.commit().
+    """
+    _entitlements_cache.pop(user_id, None)
+    if has_app_context():
+        g.setdefault('entitlements', {}).pop(user_id, None)
+        db.session.execute(
+            update(User).where(User.id == user_id).values(
+                entitlements_version=func.coalesce(User.entitlements_version, 0) + 1))
+
+
+# Rezerwacja starsza niż to (np. worker zabity w trakcie wywołania AI) wraca do puli
+CREDIT_RESERVATION_TIMEOUT = timedelta(minutes=15)
+CREDIT_RESERVATION_ATTEMPTS = 3
+
+
+def reserve_optimization_credit(user_id):
+    """
+    Rezerwuje jedną optymalizację z płatności jednorazowej pojedynczym
+    UPDATE ... WHERE used < limit RETURNING (bez odczytu i zapisu w Pythonie)
+    i zatwierdza transakcję przed wywołaniem AI. Zwraca id rezerwacji albo None,
+    gdy użytkownik nie ma wolnych kredytów.
+    """
+    release_expired_credit_reservations(user_id)
+    for _ in range(CREDIT_RESERVATION_ATTEMPTS):
+        candidate = (db.select(SinglePayment.id)
+                     .where(SinglePayment.user_id == user_id,
+                            SinglePayment.cv_optimizations_used < SinglePayment.cv_optimizations_limit)
+                     .order_by(SinglePayment.id)
+                     .limit(1)
+                     .scalar_subquery())
+        single_payment_id = db.session.execute(
+            update(SinglePayment)
+            .where(SinglePayment.id == candidate,
+                   SinglePayment.cv_optimizations_used < SinglePayment.cv_optimizations_limit)
+            .values(cv_optimizations_used=SinglePayment.cv_optimizations_used + 1)
+            .returning(SinglePayment.id)).scalar()
+        if single_payment_id is not None:
+            reservation = CreditReservation(user_id=user_id, single_payment_id=single_payment_id)
+            db.session.add(reservation)
+            invalidate_entitlements(user_id)
+            db.session.commit()
+            return reservation.id
+        db.session.rollback()
+        # Równoległe żądanie wykorzystało ostatni kredyt tej płatności - może jest inna
+        if not db.session.query(
+                SinglePayment.query.filter(
+                    SinglePayment.user_id == user_id,
+                    SinglePayment.cv_optimizations_used < SinglePayment.cv_optimizations_limit
+                ).exists()).scalar():
+            return None
+    return None
+
+
+def commit_credit_reservation(reservation_id):
+    """Oznacza rezerwację jako wykorzystaną - w transakcji zapisującej wynik (bez commitu)"""
+    db.session.execute(
+        update(CreditReservation)
+        .where(CreditReservation.id == reservation_id, CreditReservation.status == 'reserved')
+        .values(status='committed', settled_at=datetime.utcnow()))
+
+
+def release_credit_reservation(reservation_id):
+    """Oddaje zarezerwowany kredyt (np. po błędzie AI); bezpieczne przy wielokrotnym wywołaniu"""
+    db.session.rollback()
+    reservation = db.session.execute(
+        update(CreditReservation)
+        .where(CreditReservation.id == reservation_id, CreditReservation.status == 'reserved')
+        .values(status='released', settled_at=datetime.utcnow())
+        .returning(CreditReservation.user_id, CreditReservation.single_payment_id)).first()
+    if reservation is not None:
+        db.session.execute(
+            update(SinglePayment)
+            .where(SinglePayment.id == reservation.single_payment_id)
+            .values(cv_optimizations_used=SinglePayment.cv_optimizations_used - 1))
+        invalidate_entitlements(reservation.user_id)
+    db.session.commit()
+
+
+def release_expired_credit_reservations(user_id):
+    """Zwalnia porzucone rezerwacje użytkownika"""
+    expired_ids = [row[0] for row in db.session.query(CreditReservation.id).filter(
+        CreditReservation.user_id == user_id,
+        CreditReservation.status == 'reserved',
+        CreditReservation.created_at < datetime.utcnow() - CREDIT_RESERVATION_TIMEOUT)]
+    for reservation_id in expired_ids:
+        logger.warning(f"Releasing abandoned credit reservation {reservation_id}")
+        release_credit_reservation(reservation_id)
+
+
+def _prune_entitlements_cache(now):
+    """Usuwa wygasłe wpisy; jeśli to nie wystarczy - czyści cały cache"""
+    for user_id, (_, expires_at, _) in list(_entitlements_cache.items()):
+        if expires_at <= now:
+            _entitlements_cache.pop(user_id, None)
+    if len(_entitlements_cache) >= ENTITLEMENTS_CACHE_MAX_USERS:
+        _entitlements_cache.clear()
+
+
 @login_manager.user_loader
 def load_user(user_id):
     return User.query.get(int(user_id))
@@ -851,6 +1188,17 @@ def generate_cv_html(cv_text):
         return None
 
 
+@app.template_global()
+def avatar_url(user, size=128):
+    """Adres awatara użytkownika w rozmiarze co najmniej size px (None, gdy brak awatara)"""
+    from utils.avatar_images import is_avatar_set, thumbnail_filename
+    if not user.avatar_filename:
+        return None
+    if is_avatar_set(user.avatar_filename):
+        return url_for('serve_avatar', filename=thumbnail_filename(user.avatar_filename, size))
+    return url_for('serve_avatar', filename=user.avatar_filename)
+
+
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -861,6 +1209,117 @@ def allowed_avatar_file(filename):
            filename.rsplit('.', 1)[1].lower() in ALLOWED_AVATAR_EXTENSIONS
 
 
+_rate_limiter = None
+
+
+def get_rate_limiter():
+    """Limiter z licznikami w bazie (wspólnymi dla workerów); RATE_LIMIT_STORAGE=memory - w procesie"""
+    global _rate_limiter
+    if _rate_limiter is None:
+        from utils.rate_limit import DatabaseStore, MemoryStore, RateLimiter
+        if os.environ.get('RATE_LIMIT_STORAGE', 'database') == 'memory':
+            _rate_limiter = RateLimiter(MemoryStore())
+        else:
+            _rate_limiter = RateLimiter(DatabaseStore(db.engine))
+    return _rate_limiter
+
+
+def rate_limits_for(user, scope):
+    """Limity grupy tras dla planu użytkownika (None = bez limitu)"""
+    from utils.rate_limit import parse_rates
+    plan = user.get_payment_status()['type']
+    if plan == 'developer':
+        return None
+    if plan == 'subscription':
+        plan_limits = PRICING['monthly_package']['rate_limits']
+    elif plan == 'single':
+        plan_limits = PRICING['single_cv']['rate_limits']
+    else:
+        plan_limits = FREE_RATE_LIMITS
+    return parse_rates(plan_limits[scope])
+
+
+def rate_limited(scope):
+    """Dekorator tras AI: limit na użytkownika (wg planu) i na adres IP, 429 z Retry-After"""
+    def decorator(view):
+        @wraps(view)
+        def wrapped(*args, **kwargs):
+            if not RATE_LIMIT_ENABLED:
+                return view(*args, **kwargs)
+            user_limits = rate_limits_for(current_user, scope)
+            if user_limits is None:
+                return view(*args, **kwargs)
+
+            from utils.rate_limit import parse_rates
+            try:
+                limiter = get_rate_limiter()
+                results = limiter.hit_many([
+                    (f"{scope}:user:{current_user.id}", user_limits),
+                    (f"{scope}:ip:{request.remote_addr}", parse_rates(IP_RATE_LIMITS))])
+            except Exception as e:
+                # Awaria licznika nie blokuje użytkowników
+                logger.error(f"Rate limiter unavailable: {str(e)}")
+                return view(*args, **kwargs)
+
+            denied = [result for result in results if not result.allowed]
+            if denied:
+                retry_after = max(result.retry_after for result in denied)
+                logger.warning(f"Rate limit exceeded: {scope} user={current_user.id} "
+                               f"ip={request.remote_addr} retry_after={retry_after}s")
+                response = jsonify({
+                    'success': False,
+                    'message': f'Zbyt wiele zapytań. Spróbuj ponownie za {retry_after} s.',
+                    'retry_after': retry_after
+                })
+                response.status_code = 429
+                response.headers['Retry-After'] = str(retry_after)
+                return response
+            return view(*args, **kwargs)
+        return wrapped
+    return decorator
+
+
+# Zapytania AI na proces: domyślnie połowa puli połączeń z bazy - reszta zostaje dla
+# pozostałych tras, nawet gdy OpenRouter zwalnia (utils/admission.py)
+from utils.admission import AdmissionController, AdmissionRejected
+
+_engine_options = app.config["SQLALCHEMY_ENGINE_OPTIONS"]
+_default_ai_in_flight = max(1, (_engine_options['pool_size'] + _engine_options['max_overflow']) // 2
+                            ) if 'pool_size' in _engine_options else 4
+ai_admission = AdmissionController(
+    max_in_flight=int(os.environ.get('AI_MAX_IN_FLIGHT', _default_ai_in_flight)),
+    queue_timeout=float(os.environ.get('AI_QUEUE_TIMEOUT', '5')),
+    slow_latency=float(os.environ.get('AI_SLOW_LATENCY_SECONDS', '30')))
+
+
+def admission_controlled(view):
+    """
+    Dekorator tras AI: limit równoczesnych wywołań modelu, 503 z Retry-After po przekroczeniu.
+    Stoi nad @rate_limited - zapytanie odrzucone przez serwer nie zużywa limitu użytkownika.
+    """
+    @wraps(view)
+    def wrapped(*args, **kwargs):
+        try:
+            ai_admission.acquire()
+        except AdmissionRejected as e:
+            logger.warning(f"AI request shed ({e.reason}): {request.endpoint} "
+                           f"{ai_admission.snapshot()}")
+            response = jsonify({
+                'success': False,
+                'message': 'Serwis AI jest w tej chwili przeciążony. '
+                           f'Spróbuj ponownie za {e.retry_after} s.',
+                'retry_after': e.retry_after
+            })
+            response.status_code = 503
+            response.headers['Retry-After'] = str(e.retry_after)
+            return response
+        try:
+            return view(*args, **kwargs)
+        finally:
+            ai_admission.release()
+    return wrapped
+
+
 # Routes
 @app.route('/')
 def index():
@@ -1057,31 +1516,27 @@ def upload_avatar():
                 'message': 'Plik awatara jest za duży (maksymalnie 2MB)'
             })
         
-        # Generate unique filename
-        file_extension = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"avatar_{current_user.id}_{uuid.uuid4().hex[:8]}.{file_extension}"
-        file_path = os.path.join(AVATAR_FOLDER, filename)
-        
-        # Remove old avatar if exists
-        if current_user.avatar_filename:
-            old_avatar_path = os.path.join(AVATAR_FOLDER, current_user.avatar_filename)
-            if os.path.exists(old_avatar_path):
-                try:
-                    os.remove(old_avatar_path)
-                except OSError as e:
-                    logger.warning(f"Could not remove old avatar: {str(e)}")
-        
-        # Save new avatar
-        file.save(file_path)
-        
-        # Update user record
+        # Miniatury 64/128/256 px (WebP) zamiast oryginału - nazwa ze skrótem treści
+        from utils.avatar_images import AvatarImageError, save_thumbnails
+        try:
+            filename = save_thumbnails(AVATAR_FOLDER, file.read())
+        except AvatarImageError as e:
+            logger.info(f"Rejected avatar upload: {str(e)}")
+            return jsonify({
+                'success': False,
+                'message': 'Nie udało się odczytać obrazu. Prześlij poprawny plik PNG, JPG lub GIF.'
+            })
+
+        old_filename = current_user.avatar_filename
         current_user.avatar_filename = filename
         db.session.commit()
-        
+        if old_filename and old_filename != filename:
+            remove_avatar_files(old_filename)
+
         return jsonify({
             'success': True,
             'message': 'Awatar został zaktualizowany',
-            'avatar_url': url_for('serve_avatar', filename=filename)
+            'avatar_url': avatar_url(current_user, 128)
         })
             
     except Exception as e:
@@ -1092,11 +1547,34 @@ def upload_avatar():
         })
 
 
+def remove_avatar_files(avatar_filename):
+    """Usuwa pliki awatara, jeśli nie używa go inny użytkownik (ten sam obraz = te same pliki)"""
+    from utils.avatar_images import is_avatar_set, thumbnail_filenames
+    if User.query.filter_by(avatar_filename=avatar_filename).first():
+        return
+    filenames = thumbnail_filenames(avatar_filename) if is_avatar_set(avatar_filename) else [avatar_filename]
+    for filename in filenames:
+        path = os.path.join(AVATAR_FOLDER, filename)
+        try:
+            if os.path.exists(path):
+                os.remove(path)
+        except OSError as e:
+            logger.warning(f"Could not remove old avatar: {str(e)}")
+
+
 @app.route('/profile/avatar/<filename>')
 def serve_avatar(filename):
     """Serve user avatar images"""
+    from utils.avatar_images import is_thumbnail
     try:
-        return send_from_directory(AVATAR_FOLDER, filename)
+        response = send_from_directory(AVATAR_FOLDER, filename)
+        if is_thumbnail(filename):
+            # Nazwa zawiera skrót treści - plik pod tym adresem nigdy się nie zmienia
+            response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        else:
+            # Starsze awatary (oryginały); rewalidacja przez ETag/Last-Modified (304)
+            response.headers['Cache-Control'] = 'public, max-age=86400'
+        return response
     except Exception as e:
         logger.error(f"Error serving avatar {filename}: {str(e)}")
         # Return a default avatar or 404
@@ -1244,6 +1722,7 @@ def upload_cv():
             new_cv_upload.job_title = ensure_utf8(job_title)
             new_cv_upload.job_description = ensure_utf8(job_description)
             db.session.add(new_cv_upload)
+            current_user.increment_statistics(cv_count=1)
             db.session.commit()
 
             # Clean up uploaded file
@@ -1274,6 +1753,8 @@ def upload_cv():
 
 @app.route('/generate-cover-letter', methods=['POST'])
 @login_required
+@admission_controlled
+@rate_limited('generate')
 def generate_cover_letter_route():
     """Generuje list motywacyjny na podstawie przesłanego CV"""
     try:
@@ -1303,8 +1784,8 @@ def generate_cover_letter_route():
             })
 
         # Pobierz CV z bazy danych
-        cv_upload = CVUpload.query.filter_by(session_id=session_id,
-                                             user_id=current_user.id).first()
+        cv_upload = CVUpload.query.options(undefer(CVUpload.original_text)).filter_by(
+            session_id=session_id, user_id=current_user.id).first()
         if not cv_upload:
             return jsonify({
                 'success': False,
@@ -1316,12 +1797,13 @@ def generate_cover_letter_route():
 
         # Generuj list motywacyjny
         from utils.openrouter_api import generate_cover_letter
-        result = generate_cover_letter(cv_text=cv_upload.original_text,
-                                       job_title=job_title,
-                                       job_description=job_description,
-                                       company_name=company_name,
-                                       is_premium=is_premium,
-                                       selected_model=selected_model)
+        with ai_admission.measure():
+            result = generate_cover_letter(cv_text=cv_upload.original_text,
+                                           job_title=job_title,
+                                           job_description=job_description,
+                                           company_name=company_name,
+                                           is_premium=is_premium,
+                                           selected_model=selected_model)
 
         if not result or not result.get('success'):
             return jsonify({
@@ -1344,6 +1826,7 @@ def generate_cover_letter_route():
         new_cover_letter.generated_at = datetime.utcnow()
 
         db.session.add(new_cover_letter)
+        current_user.increment_statistics(cover_letters_count=1)
         db.session.commit()
 
         return jsonify({
@@ -1370,6 +1853,8 @@ def generate_cover_letter_route():
 
 @app.route('/generate-interview-questions', methods=['POST'])
 @login_required
+@admission_controlled
+@rate_limited('generate')
 def generate_interview_questions_route():
     """Generuje pytania na rozmowę kwalifikacyjną na podstawie CV"""
     try:
@@ -1398,8 +1883,8 @@ def generate_interview_questions_route():
             })
 
         # Pobierz CV z bazy danych
-        cv_upload = CVUpload.query.filter_by(session_id=session_id,
-                                             user_id=current_user.id).first()
+        cv_upload = CVUpload.query.options(undefer(CVUpload.original_text)).filter_by(
+            session_id=session_id, user_id=current_user.id).first()
         if not cv_upload:
             return jsonify({
                 'success': False,
@@ -1411,11 +1896,12 @@ def generate_interview_questions_route():
 
         # Generuj pytania na rozmowę
         from utils.openrouter_api import generate_interview_questions
-        result = generate_interview_questions(cv_text=cv_upload.original_text,
-                                              job_title=job_title,
-                                              job_description=job_description,
-                                              is_premium=is_premium,
-                                              selected_model=selected_model)
+        with ai_admission.measure():
+            result = generate_interview_questions(cv_text=cv_upload.original_text,
+                                                  job_title=job_title,
+                                                  job_description=job_description,
+                                                  is_premium=is_premium,
+                                                  selected_model=selected_model)
 
         if not result or not result.get('success'):
             return jsonify({
@@ -1437,6 +1923,7 @@ def generate_interview_questions_route():
         new_questions.generated_at = datetime.utcnow()
 
         db.session.add(new_questions)
+        current_user.increment_statistics(interview_questions_count=1)
         db.session.commit()
 
         return jsonify({
@@ -1463,6 +1950,8 @@ def generate_interview_questions_route():
 
 @app.route('/analyze-skills-gap', methods=['POST'])
 @login_required
+@admission_controlled
+@rate_limited('generate')
 def analyze_skills_gap_route():
     """Analizuje luki kompetencyjne między CV a wymaganiami stanowiska"""
     try:
@@ -1491,8 +1980,8 @@ def analyze_skills_gap_route():
             })
 
         # Pobierz CV z bazy danych
-        cv_upload = CVUpload.query.filter_by(session_id=session_id,
-                                             user_id=current_user.id).first()
+        cv_upload = CVUpload.query.options(undefer(CVUpload.original_text)).filter_by(
+            session_id=session_id, user_id=current_user.id).first()
         if not cv_upload:
             return jsonify({
                 'success': False,
@@ -1504,11 +1993,12 @@ def analyze_skills_gap_route():
 
         # Analizuj luki kompetencyjne
         from utils.openrouter_api import analyze_skills_gap
-        result = analyze_skills_gap(cv_text=cv_upload.original_text,
-                                    job_title=job_title,
-                                    job_description=job_description,
-                                    is_premium=is_premium,
-                                    selected_model=selected_model)
+        with ai_admission.measure():
+            result = analyze_skills_gap(cv_text=cv_upload.original_text,
+                                        job_title=job_title,
+                                        job_description=job_description,
+                                        is_premium=is_premium,
+                                        selected_model=selected_model)
 
         if not result or not result.get('success'):
             return jsonify({
@@ -1530,6 +2020,7 @@ def analyze_skills_gap_route():
         new_analysis.analyzed_at = datetime.utcnow()
 
         db.session.add(new_analysis)
+        current_user.increment_statistics(skills_analyses_count=1)
         db.session.commit()
 
         return jsonify({
@@ -1556,7 +2047,10 @@ def analyze_skills_gap_route():
 
 @app.route('/optimize-cv', methods=['POST'])
 @login_required
+@admission_controlled
+@rate_limited('optimize')
 def optimize_cv_route():
+    reservation_id = None
     try:
         data = request.get_json()
         session_id = data.get('session_id')
@@ -1565,8 +2059,8 @@ def optimize_cv_route():
         # Debug logging
         logger.info(f"📝 DEBUG optimize_cv: received selected_model = {selected_model}")
 
-        cv_upload = CVUpload.query.filter_by(session_id=session_id,
-                                             user_id=current_user.id).first()
+        cv_upload = CVUpload.query.options(undefer_group('content')).filter_by(
+            session_id=session_id, user_id=current_user.id).first()
 
         if not cv_upload:
             return jsonify({
@@ -1576,8 +2070,14 @@ def optimize_cv_route():
                 'Sesja wygasła. Proszę przesłać CV ponownie.'
             })
 
-        # Sprawdź czy użytkownik może optymalizować CV
-        if not current_user.can_optimize_cv():
+        # Check if user has premium access
+        is_premium = current_user.is_premium_active()
+
+        # Płatność jednorazowa: kredyt rezerwowany przed wywołaniem AI,
+        # zatwierdzany razem z wynikiem albo oddawany po błędzie
+        if not is_premium:
+            reservation_id = reserve_optimization_credit(current_user.id)
+        if not is_premium and reservation_id is None:
             payment_status = current_user.get_payment_status()
             if payment_status['type'] == 'free':
                 return jsonify({
@@ -1598,22 +2098,22 @@ def optimize_cv_route():
         job_title = cv_upload.job_title
         job_description = cv_upload.job_description
 
-        # Check if user has premium access
-        is_premium = current_user.is_premium_active()
-
         # Call OpenRouter API to optimize CV
         from utils.openrouter_api import optimize_cv
         
         # Debug logging - sprawdź co otrzymujemy z frontendu
         logger.info(f"📝 DEBUG optimize_cv_route: received selected_model = {selected_model}")
         
-        optimized_cv = optimize_cv(cv_text,
-                                   job_title,
-                                   job_description,
-                                   is_premium=is_premium,
-                                   selected_model=selected_model)
+        with ai_admission.measure():
+            optimized_cv = optimize_cv(cv_text,
+                                       job_title,
+                                       job_description,
+                                       is_premium=is_premium,
+                                       selected_model=selected_model)
 
         if not optimized_cv:
+            if reservation_id is not None:
+                release_credit_reservation(reservation_id)
             return jsonify({
                 'success':
                 False,
@@ -1621,13 +2121,19 @@ def optimize_cv_route():
                 'Nie udało się zoptymalizować CV. Spróbuj ponownie.'
             })
 
-        # Użyj optymalizacji (dla jednorazowych płatności)
-        if not current_user.is_premium_active():
-            current_user.use_cv_optimization()
-
         # Store optimized CV in the database
+        first_optimization = cv_upload.optimized_cv is None
         cv_upload.optimized_cv = optimized_cv
         cv_upload.optimized_at = datetime.utcnow()
+        try:
+            # Strukturalne CV dla /view-cv - parsowane raz, przy zapisie
+            cv_upload.store_structured_cv()
+        except Exception as parse_error:
+            logger.warning(f"Could not store structured CV: {str(parse_error)}")
+        if first_optimization:
+            current_user.increment_statistics(optimized_count=1)
+        if reservation_id is not None:
+            commit_credit_reservation(reservation_id)
         db.session.commit()
 
         return jsonify({
@@ -1638,6 +2144,9 @@ def optimize_cv_route():
 
     except Exception as e:
         logger.error(f"Error in optimize_cv_route: {str(e)}")
+        if reservation_id is not None:
+            # Zatwierdzona rezerwacja nie zostanie zwolniona (warunek status='reserved')
+            release_credit_reservation(reservation_id)
         error_message = "Wystąpił błąd podczas optymalizacji CV"
         if any(keyword in str(e).lower()
                for keyword in ["timeout", "timed out", "worker timeout", "read timeout"]):
@@ -1651,6 +2160,8 @@ def optimize_cv_route():
 
 @app.route('/analyze-cv', methods=['POST'])
 @login_required
+@admission_controlled
+@rate_limited('optimize')
 def analyze_cv_route():
     try:
         data = request.get_json()
@@ -1658,8 +2169,8 @@ def analyze_cv_route():
         selected_model = data.get('selected_model')
 
         # Validate session ownership (IDOR protection)
-        cv_upload = CVUpload.query.filter_by(session_id=session_id,
-                                             user_id=current_user.id).first()
+        cv_upload = CVUpload.query.options(undefer_group('content')).filter_by(
+            session_id=session_id, user_id=current_user.id).first()
 
         if not cv_upload:
             return jsonify({
@@ -1686,11 +2197,12 @@ def analyze_cv_route():
 
         # Call OpenRouter API to analyze CV
         from utils.openrouter_api import analyze_cv_with_score
-        cv_analysis = analyze_cv_with_score(cv_text,
-                                            job_title,
-                                            job_description,
-                                            is_premium=is_premium,
-                                            selected_model=selected_model)
+        with ai_admission.measure():
+            cv_analysis = analyze_cv_with_score(cv_text,
+                                                job_title,
+                                                job_description,
+                                                is_premium=is_premium,
+                                                selected_model=selected_model)
 
         if not cv_analysis:
             return jsonify({
@@ -1701,8 +2213,11 @@ def analyze_cv_route():
             })
 
         # Store analysis in the database
+        first_analysis = cv_upload.cv_analysis is None
         cv_upload.cv_analysis = cv_analysis
         cv_upload.analyzed_at = datetime.utcnow()
+        if first_analysis:
+            current_user.increment_statistics(analyzed_count=1)
         db.session.commit()
 
         return jsonify({
@@ -1725,40 +2240,37 @@ def analyze_cv_route():
 @app.route('/result/<session_id>')
 @login_required
 def result(session_id):
-    cv_upload = CVUpload.query.filter_by(session_id=session_id,
-                                         user_id=current_user.id).first()
+    # CV i powiązane materiały w jednym przebiegu - opisy ofert materiałów nie są wyświetlane
+    cv_upload = CVUpload.query.options(
+        undefer_group('content'),
+        selectinload(CVUpload.cover_letters).undefer(CoverLetter.cover_letter_content),
+        selectinload(CVUpload.interview_questions).undefer(
+            InterviewQuestions.questions_content),
+        selectinload(CVUpload.skills_analyses).undefer(
+            SkillsGapAnalysis.analysis_content)).filter_by(
+                session_id=session_id, user_id=current_user.id).first()
 
     if not cv_upload:
         flash('Sesja wygasła. Proszę przesłać CV ponownie.', 'error')
         return redirect(url_for('index'))
 
-    # Pobierz powiązane listy motywacyjne
-    cover_letters = CoverLetter.query.filter_by(
-        cv_upload_id=cv_upload.id).all()
-
-    # Pobierz powiązane pytania na rozmowę
-    interview_questions = InterviewQuestions.query.filter_by(
-        cv_upload_id=cv_upload.id).all()
-
-    # Pobierz powiązane analizy luk kompetencyjnych
-    skills_analyses = SkillsGapAnalysis.query.filter_by(
-        cv_upload_id=cv_upload.id).all()
-
     return render_template('result.html',
                            cv_upload=cv_upload,
                            session_id=session_id,
-                           cover_letters=cover_letters,
-                           interview_questions=interview_questions,
-                           skills_analyses=skills_analyses)
+                           cover_letters=cv_upload.cover_letters,
+                           interview_questions=cv_upload.interview_questions,
+                           skills_analyses=cv_upload.skills_analyses)
 
 
 @app.route('/cover-letter/<session_id>')
 @login_required
 def view_cover_letter(session_id):
     """Wyświetl wygenerowany list motywacyjny"""
-    cover_letter = CoverLetter.query.filter_by(
-        session_id=session_id, user_id=current_user.id).first_or_404()
-    cv_upload = CVUpload.query.get(cover_letter.cv_upload_id)
+    cover_letter = CoverLetter.query.options(
+        undefer_group('content'),
+        joinedload(CoverLetter.cv_upload).load_only(CVUpload.session_id)).filter_by(
+            session_id=session_id, user_id=current_user.id).first_or_404()
+    cv_upload = cover_letter.cv_upload
     return render_template('cover_letter.html',
                            cover_letter=cover_letter,
                            cv_upload=cv_upload)
@@ -1768,9 +2280,11 @@ def view_cover_letter(session_id):
 @login_required
 def view_interview_questions(session_id):
     """Wyświetl wygenerowane pytania na rozmowę kwalifikacyjną"""
-    questions = InterviewQuestions.query.filter_by(
-        session_id=session_id, user_id=current_user.id).first_or_404()
-    cv_upload = CVUpload.query.get(questions.cv_upload_id)
+    questions = InterviewQuestions.query.options(
+        undefer_group('content'),
+        joinedload(InterviewQuestions.cv_upload).load_only(CVUpload.session_id)).filter_by(
+            session_id=session_id, user_id=current_user.id).first_or_404()
+    cv_upload = questions.cv_upload
     return render_template('interview_questions.html',
                            questions=questions,
                            cv_upload=cv_upload)
@@ -1780,9 +2294,11 @@ def view_interview_questions(session_id):
 @login_required
 def view_skills_gap_analysis(session_id):
     """Wyświetl analizę luk kompetencyjnych"""
-    analysis = SkillsGapAnalysis.query.filter_by(
-        session_id=session_id, user_id=current_user.id).first_or_404()
-    cv_upload = CVUpload.query.get(analysis.cv_upload_id)
+    analysis = SkillsGapAnalysis.query.options(
+        undefer_group('content'),
+        joinedload(SkillsGapAnalysis.cv_upload).load_only(CVUpload.session_id)).filter_by(
+            session_id=session_id, user_id=current_user.id).first_or_404()
+    cv_upload = analysis.cv_upload
     return render_template('skills_gap_analysis.html',
                            analysis=analysis,
                            cv_upload=cv_upload)
@@ -1792,14 +2308,47 @@ def view_skills_gap_analysis(session_id):
 @login_required
 def view_cv(session_id):
     """Wyświetl zoptymalizowane CV w nowym oknie z formatowaniem"""
-    cv_upload = CVUpload.query.filter_by(
+    cv_upload = CVUpload.query.options(undefer(CVUpload.optimized_cv)).filter_by(
         session_id=session_id, user_id=current_user.id).first_or_404()
 
     if not cv_upload.optimized_cv:
         flash('CV nie zostało jeszcze zoptymalizowane.', 'error')
         return redirect(url_for('result', session_id=session_id))
 
-    return render_template('view_cv.html', cv_upload=cv_upload)
+    # Zapisane strukturalne CV - bez ponownego parsowania przy każdym wyświetleniu
+    try:
+        cv_document = cv_upload.get_structured_cv()
+    except Exception as e:
+        db.session.rollback()
+        logger.warning(f"Error loading structured CV: {str(e)}")
+        cv_document = None
+
+    return render_template('view_cv.html',
+                           cv_upload=cv_upload,
+                           cv_document=cv_document)
+
+
+_readiness = {'checked_at': 0.0, 'ok': False, 'error': None}
+READINESS_CACHE_SECONDS = 5
+
+
+@app.route('/health/ready')
+def health_ready():
+    """Gotowość do obsługi ruchu - SELECT 1 na bazie, wynik zapamiętany na kilka sekund"""
+    now = time.monotonic()
+    if now - _readiness['checked_at'] >= READINESS_CACHE_SECONDS:
+        try:
+            with db.engine.connect() as conn:
+                conn.execute(db.text('SELECT 1'))
+            _readiness.update(ok=True, error=None)
+        except Exception as e:
+            logger.error(f"Database readiness check failed: {str(e)}")
+            _readiness.update(ok=False, error=type(e).__name__)
+        _readiness['checked_at'] = now
+
+    body = {'status': 'ready' if _readiness['ok'] else 'unavailable',
+            'database': 'ok' if _readiness['ok'] else _readiness['error']}
+    return body, 200 if _readiness['ok'] else 503
 
 
 @app.route('/health')
@@ -1807,6 +2356,21 @@ def health():
     return {'status': 'healthy', 'timestamp': datetime.now().isoformat()}
 
 
+@app.route('/health/stats')
+@login_required
+def health_stats():
+    """Liczniki puli połączeń i kontroli zapytań AI tego workera - tylko dla konta deweloperskiego"""
+    if not current_user.is_developer():
+        abort(404)
+    from utils.db_config import pool_wait_stats
+    return {
+        'pid': os.getpid(),
+        'timestamp': datetime.now().isoformat(),
+        'db_pool': pool_wait_stats.snapshot(),
+        'ai_admission': ai_admission.snapshot()
+    }
+
+
 @app.route('/api')
 def api_status():
     """Basic API status endpoint"""
@@ -1856,6 +2420,7 @@ def pricing():
 @login_required
 def create_checkout_session():
     """Tworzy sesję płatności Stripe"""
+    stripe = get_stripe()
     try:
         # Sprawdź czy Stripe jest skonfigurowany
         if not STRIPE_SECRET_KEY:
@@ -1875,16 +2440,13 @@ def create_checkout_session():
 
         # Sprawdź czy użytkownik już ma aktywną subskrypcję
         if payment_type == 'monthly_package':
-            existing_subscription = Subscription.query.filter_by(
-                user_id=current_user.id, status='active').first()
-
-            if existing_subscription and existing_subscription.is_active():
+            if current_user.get_payment_status()['type'] == 'subscription':
                 return jsonify({'error': 'Masz już aktywną subskrypcję'}), 400
 
         # Utwórz lub pobierz Stripe customer
         try:
             if not current_user.stripe_customer_id:
-                customer = stripe.Customer.create(
+                customer = stripe_gateway.create_customer(
                     email=current_user.email,
                     name=f"{current_user.first_name} {current_user.last_name}",
                     metadata={'user_id': str(current_user.id)})
@@ -1899,7 +2461,7 @@ def create_checkout_session():
         try:
             if payment_type == 'single_cv':
                 # Jednorazowa płatność
-                checkout_session = stripe.checkout.Session.create(
+                session_params = dict(
                     customer=current_user.stripe_customer_id,
                     payment_method_types=['card', 'blik'],
                     line_items=[{
@@ -1923,7 +2485,7 @@ def create_checkout_session():
                     })
             else:
                 # Subskrypcja miesięczna
-                checkout_session = stripe.checkout.Session.create(
+                session_params = dict(
                     customer=current_user.stripe_customer_id,
                     payment_method_types=['card'],
                     line_items=[{
@@ -1949,6 +2511,10 @@ def create_checkout_session():
                         'payment_type': payment_type
                     })
 
+            # Otwarta sesja tego samego produktu jest używana ponownie (np. po powrocie z checkout)
+            checkout_session = stripe_gateway.open_checkout_session(
+                current_user.id, payment_type, current_user.entitlements_version or 0,
+                **session_params)
             return jsonify({'checkout_url': checkout_session.url})
 
         except stripe.error.StripeError as stripe_error:
@@ -1968,10 +2534,13 @@ def payment_success():
     """Strona sukcesu płatności"""
     session_id = request.args.get('session_id')
 
-    if session_id:
+    if session_id and payment_already_processed(session_id):
+        # Webhook zapisał już płatność - bez wywołania API Stripe
+        flash('Płatność została zrealizowana pomyślnie!', 'success')
+    elif session_id:
         try:
-            # Pobierz sesję z Stripe
-            checkout_session = stripe.checkout.Session.retrieve(session_id)
+            # Pobierz sesję z Stripe (subskrypcja w tej samej odpowiedzi)
+            checkout_session = stripe_gateway.checkout_session(session_id, expand=['subscription'])
 
             if checkout_session.payment_status == 'paid':
                 payment_type = checkout_session.metadata.get('payment_type')
@@ -1996,6 +2565,7 @@ def payment_success():
 @app.route('/webhook', methods=['POST'])
 def stripe_webhook():
     """Webhook do obsługi eventów Stripe"""
+    stripe = get_stripe()
     if not STRIPE_WEBHOOK_SECRET:
         logger.error("Stripe webhook secret not configured")
         return '', 400
@@ -2013,32 +2583,117 @@ def stripe_webhook():
         logger.error(f"Invalid signature: {str(e)}")
         return '', 400
 
+    # Zapis do skrzynki i szybkie 200 - przetwarzanie w tle (process_webhook_events)
     try:
-        # Obsługa eventów
-        if event['type'] == 'checkout.session.completed':
-            session = event['data']['object']
-            handle_checkout_session_completed(session)
+        db.session.add(StripeWebhookEvent(id=event['id'], event_type=event['type'], payload=payload))
+        db.session.commit()
+    except IntegrityError:
+        db.session.rollback()
+        logger.info(f"Duplicate webhook event {event['id']} ignored")
+        return '', 200
+    except Exception as e:
+        db.session.rollback()
+        logger.error(f"Error storing webhook event {event['id']}: {str(e)}")
+        return '', 500
 
-        elif event['type'] == 'invoice.payment_succeeded':
-            invoice = event['data']['object']
-            handle_subscription_payment_succeeded(invoice)
+    webhook_worker.wake()
+    return '', 200
 
-        elif event['type'] == 'customer.subscription.deleted':
-            subscription = event['data']['object']
-            handle_subscription_deleted(subscription)
 
-        logger.info(f"Processed webhook event: {event['type']}")
+WEBHOOK_BATCH_SIZE = 50
+WEBHOOK_MAX_ATTEMPTS = 5
+WEBHOOK_RETRY_DELAY = timedelta(minutes=1)
+# Event w stanie processing dłużej niż to (np. restart workera) jest przejmowany ponownie
+WEBHOOK_LOCK_TIMEOUT = timedelta(minutes=5)
+
+
+def _webhook_event_ready(now):
+    """Warunek: event czeka na (ponowne) przetworzenie"""
+    return or_(
+        StripeWebhookEvent.status == 'pending',
+        and_(StripeWebhookEvent.status == 'failed',
+             StripeWebhookEvent.attempts < WEBHOOK_MAX_ATTEMPTS,
+             StripeWebhookEvent.locked_at < now - WEBHOOK_RETRY_DELAY),
+        and_(StripeWebhookEvent.status == 'processing',
+             StripeWebhookEvent.locked_at < now - WEBHOOK_LOCK_TIMEOUT))
+
+
+def dispatch_webhook_event(event):
+    """Wywołuje obsługę eventu Stripe - obsługa musi być idempotentna"""
+    if event['type'] == 'checkout.session.completed':
+        handle_checkout_session_completed(event['data']['object'])
+
+    elif event['type'] == 'invoice.payment_succeeded':
+        handle_subscription_payment_succeeded(event['data']['object'])
+
+    elif event['type'] == 'customer.subscription.deleted':
+        handle_subscription_deleted(event['data']['object'])
+
+
+def process_webhook_events(limit=WEBHOOK_BATCH_SIZE):
+    """
+    Przetwarza oczekujące eventy ze skrzynki, najstarsze najpierw.
+    Event jest przejmowany warunkowym UPDATE, więc kilka procesów nie obsłuży
+    go równocześnie. Zwraca liczbę obsłużonych eventów.
+    """
+    stripe = get_stripe()
+    event_ids = [row[0] for row in db.session.query(StripeWebhookEvent.id)
+                 .filter(_webhook_event_ready(datetime.utcnow()))
+                 .order_by(StripeWebhookEvent.received_at)
+                 .limit(limit)]
+    handled = 0
+    for event_id in event_ids:
+        now = datetime.utcnow()
+        claimed = db.session.execute(
+            update(StripeWebhookEvent)
+            .where(StripeWebhookEvent.id == event_id, _webhook_event_ready(now))
+            .values(status='processing', locked_at=now, attempts=StripeWebhookEvent.attempts + 1))
+        db.session.commit()
+        if claimed.rowcount != 1:
+            continue
 
-    except Exception as e:
-        logger.error(f"Error processing webhook: {str(e)}")
-        return '', 500
+        inbox_event = db.session.get(StripeWebhookEvent, event_id)
+        try:
+            dispatch_webhook_event(stripe.Event.construct_from(json.loads(inbox_event.payload),
+                                                               stripe.api_key))
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"Error processing webhook event {event_id}: {str(e)}")
+            inbox_event.status = 'failed'
+            inbox_event.last_error = str(e)[:2000]
+        else:
+            inbox_event.status = 'processed'
+            inbox_event.last_error = None
+            inbox_event.processed_at = datetime.utcnow()
+            logger.info(f"Processed webhook event: {inbox_event.event_type} ({event_id})")
+        db.session.commit()
+        handled += 1
+    return handled
 
-    return '', 200
+
+def _process_webhook_events_in_background():
+    with app.app_context():
+        while process_webhook_events() == WEBHOOK_BATCH_SIZE:
+            pass
+
+
+from utils.background_worker import BackgroundWorker
+
+webhook_worker = BackgroundWorker('stripe-webhooks', _process_webhook_events_in_background)
+
+
+def payment_already_processed(session_id):
+    """Czy sesja checkout została już zapisana (payment_success i webhook obsługują tę samą sesję)"""
+    return db.session.query(
+        StripePayment.query.filter_by(stripe_session_id=session_id).exists()).scalar()
 
 
 def process_single_payment(checkout_session):
-    """Przetwarza jednorazową płatność"""
+    """Przetwarza jednorazową płatność (idempotentnie - raz na sesję checkout)"""
     try:
+        if payment_already_processed(checkout_session.id):
+            logger.info(f"Checkout session {checkout_session.id} already processed")
+            return
         user_id = int(checkout_session.metadata.get('user_id'))
         user = User.query.get(user_id)
 
@@ -2068,18 +2723,28 @@ def process_single_payment(checkout_session):
         single_payment.cv_optimizations_limit = 1
 
         db.session.add(single_payment)
+        user.increment_statistics(total_spent=payment.amount or 0)
+        invalidate_entitlements(user_id)
         db.session.commit()
 
         logger.info(f"Single payment processed for user {user_id}")
 
+    except IntegrityError:
+        # Ta sama sesja zapisana równolegle (unikalny stripe_session_id)
+        db.session.rollback()
+        logger.info(f"Checkout session {checkout_session.id} processed concurrently")
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error processing single payment: {str(e)}")
+        raise
 
 
 def process_subscription_payment(checkout_session):
-    """Przetwarza płatność subskrypcji"""
+    """Przetwarza płatność subskrypcji (idempotentnie - raz na sesję checkout)"""
     try:
+        if payment_already_processed(checkout_session.id):
+            logger.info(f"Checkout session {checkout_session.id} already processed")
+            return
         user_id = int(checkout_session.metadata.get('user_id'))
         user = User.query.get(user_id)
 
@@ -2087,9 +2752,10 @@ def process_subscription_payment(checkout_session):
             logger.error(f"User not found for subscription: {user_id}")
             return
 
-        # Pobierz subskrypcję z Stripe
-        stripe_subscription = stripe.Subscription.retrieve(
-            checkout_session.subscription)
+        # Subskrypcja rozwinięta w sesji (payment_success) albo pobrana z Stripe (webhook)
+        stripe_subscription = checkout_session.subscription
+        if isinstance(stripe_subscription, str):
+            stripe_subscription = stripe_gateway.subscription(stripe_subscription)
 
         # Zapisz płatność
         payment = StripePayment()
@@ -2121,29 +2787,30 @@ def process_subscription_payment(checkout_session):
             stripe_subscription.current_period_end)
 
         db.session.add(subscription)
+        user.increment_statistics(total_spent=payment.amount or 0)
+        invalidate_entitlements(user_id)
         db.session.commit()
 
         logger.info(f"Subscription processed for user {user_id}")
 
+    except IntegrityError:
+        db.session.rollback()
+        logger.info(f"Checkout session {checkout_session.id} processed concurrently")
     except Exception as e:
         db.session.rollback()
         logger.error(f"Error processing subscription: {str(e)}")
+        raise
 
 
 def handle_checkout_session_completed(session):
-    """Obsługuje zakończoną sesję checkout"""
-    user_id = session['metadata'].get('user_id')
+    """Obsługuje zakończoną sesję checkout (również gdy użytkownik nie wrócił na payment_success)"""
+    if session.get('payment_status') != 'paid':
+        return
     payment_type = session['metadata'].get('payment_type')
-
-    if user_id and payment_type:
-        user = User.query.get(int(user_id))
-        if user:
-            if payment_type == 'single_cv':
-                # Logika już obsłużona w process_single_payment
-                pass
-            elif payment_type == 'monthly_package':
-                # Logika już obsłużona w process_subscription_payment
-                pass
+    if payment_type == 'single_cv':
+        process_single_payment(session)
+    elif payment_type == 'monthly_package':
+        process_subscription_payment(session)
 
 
 def handle_subscription_payment_succeeded(invoice):
@@ -2154,12 +2821,13 @@ def handle_subscription_payment_succeeded(invoice):
 
     if subscription_obj:
         # Aktualizuj daty subskrypcji
-        stripe_subscription = stripe.Subscription.retrieve(subscription_id)
+        stripe_subscription = stripe_gateway.subscription(subscription_id)
         subscription_obj.current_period_start = datetime.fromtimestamp(
             stripe_subscription.current_period_start)
         subscription_obj.current_period_end = datetime.fromtimestamp(
             stripe_subscription.current_period_end)
         subscription_obj.status = stripe_subscription.status
+        invalidate_entitlements(subscription_obj.user_id)
         db.session.commit()
 
 
@@ -2170,6 +2838,7 @@ def handle_subscription_deleted(subscription):
 
     if subscription_obj:
         subscription_obj.status = 'canceled'
+        invalidate_entitlements(subscription_obj.user_id)
         db.session.commit()
 
 
@@ -2306,62 +2975,160 @@ def register():
 # Register blueprint
 app.register_blueprint(auth)
 
-# Create database tables with error handling
-# Database initialization - always run for development environment
-should_initialize = True
+def upgrade_database():
+    """Wykonuje brakujące migracje schematu (utils/migrations.py)"""
+    from utils.migrations import upgrade
+    return upgrade(db.engine, db.metadata)
+
+
+@app.cli.command('db-upgrade')
+def db_upgrade_command():
+    """Wykonuje brakujące migracje schematu bazy danych"""
+    applied = upgrade_database()
+    print(f"Applied migrations: {', '.join(applied) if applied else 'none'}")
+
+
+@app.cli.command('db-status')
+def db_status_command():
+    """Wypisuje migracje oczekujące na wykonanie"""
+    from utils.migrations import pending_migrations
+    pending = pending_migrations(db.engine)
+    if not pending:
+        print("Database schema is up to date")
+    for revision, description in pending:
+        print(f"pending: {revision} - {description}")
+
+
+@app.cli.command('compress-texts')
+@click.option('--batch-size', default=200, show_default=True)
+def compress_texts_command(batch_size):
+    """Kompresuje teksty CV i wyniki AI zapisane przed wprowadzeniem CompressedText"""
+    from utils.compressed_text import backfill_compressed_columns
+    results = backfill_compressed_columns(db.engine, db.metadata, batch_size)
+    for column, converted in results.items():
+        print(f"{column}: {converted} compressed")
+
+
+@app.cli.command('avatar-thumbnails')
+def avatar_thumbnails_command():
+    """Zamienia starsze awatary (oryginalne pliki) na miniatury WebP"""
+    from utils.avatar_images import AvatarImageError, is_avatar_set, save_thumbnails
+    converted = 0
+    for user in User.query.filter(User.avatar_filename.isnot(None)):
+        if is_avatar_set(user.avatar_filename):
+            continue
+        path = os.path.join(AVATAR_FOLDER, user.avatar_filename)
+        try:
+            with open(path, 'rb') as f:
+                filename = save_thumbnails(AVATAR_FOLDER, f.read())
+        except (OSError, AvatarImageError) as e:
+            print(f"user {user.id}: skipped ({e})")
+            continue
+        old_filename = user.avatar_filename
+        user.avatar_filename = filename
+        db.session.commit()
+        remove_avatar_files(old_filename)
+        converted += 1
+    print(f"{converted} avatars converted")
+
+
+@app.cli.command('process-webhooks')
+@click.option('--retry-failed', is_flag=True, help='Ponów również eventy po wyczerpaniu prób')
+def process_webhooks_command(retry_failed):
+    """Przetwarza oczekujące eventy ze skrzynki webhooków Stripe"""
+    if retry_failed:
+        StripeWebhookEvent.query.filter_by(status='failed').update(
+            {'attempts': 0, 'locked_at': datetime(1970, 1, 1)})
+        db.session.commit()
+    total = 0
+    while True:
+        handled = process_webhook_events()
+        total += handled
+        if handled < WEBHOOK_BATCH_SIZE:
+            break
+    print(f"{total} webhook events handled")
+
+
+def ensure_developer_account():
+    """Tworzy konto deweloperskie, jeśli jeszcze nie istnieje"""
+    developer = User.query.filter_by(username='developer').first()
+    if developer:
+        logger.info("Developer account already exists")
+        return developer
+
+    dev_password = os.environ.get("DEV_USER_PASSWORD", "developer123")
+    developer = User()
+    developer.username = 'developer'
+    developer.email = 'developer@cvoptimizer.pro'
+    developer.first_name = 'Developer'
+    developer.last_name = 'Account'
+    developer.password_hash = generate_password_hash(dev_password)
+    developer.active = True
+    developer.created_at = datetime.utcnow()
+
+    db.session.add(developer)
+    db.session.commit()
+
+    logger.info("Created developer account for development environment")
+    return developer
+
+
+@app.cli.command('init-db')
+@click.option('--seed/--no-seed', default=True, help='Utwórz konto deweloperskie')
+def init_db_command(seed):
+    """Migracje schematu i dane startowe - uruchamiane przy wdrożeniu, nie przy starcie workera"""
+    applied = upgrade_database()
+    print(f"Applied migrations: {', '.join(applied) if applied else 'none'}")
+    if seed:
+        ensure_developer_account()
+
+
+startup_timer.mark('routes')
+
+
+def warm_up():
+    """
+    Ładuje moduły wolne w imporcie i kompiluje szablony, zanim worker przyjmie
+    pierwsze żądanie (gunicorn.conf.py: post_worker_init) - pierwsze żądanie po
+    wdrożeniu jest tak samo szybkie jak kolejne
+    """
+    started = time.perf_counter()
+    get_stripe()
+    import utils.openrouter_api  # noqa: F401 - requests, walidacja klucza API
+    import utils.pdf_extraction  # noqa: F401 - PyPDF2
+    import utils.cv_template_processor  # noqa: F401 - regexy i automat słów kluczowych
+    for template in app.jinja_env.list_templates(extensions=['html']):
+        app.jinja_env.get_template(template)
+    # Eventy webhooków zapisane, ale nieprzetworzone przed restartem
+    webhook_worker.start()
+    logger.info(f"Warm-up finished in {(time.perf_counter() - started) * 1000:.0f} ms")
+
+# Inicjalizacja bazy przy imporcie tylko lokalnie (SQLite) lub gdy INITIALIZE_DB=true;
+# na produkcji schemat i dane startowe przygotowuje wyłącznie `flask --app app init-db`
+# (.replit: [deployment] build, Procfile: release) - przed startem workerów
+should_initialize = os.environ.get(
+    'INITIALIZE_DB', 'true' if database_url.startswith('sqlite') else 'false').lower() == 'true'
 if should_initialize:
     try:
         with app.app_context():
-            # Test database connection first
-            try:
-                db.engine.connect()
-                logger.info("Database connection successful")
-            except Exception as conn_err:
-                logger.error(f"Database connection failed: {str(conn_err)}")
-                if "sqlite" not in str(app.config["SQLALCHEMY_DATABASE_URI"]).lower():
-                    logger.warning("Switching to SQLite fallback due to connection failure")
-                    app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///cv_optimizer.db"
-                    db.init_app(app)
-            
-            db.create_all()
-            logger.info("Database tables created successfully")
+            applied = upgrade_database()
+            logger.info(f"Database schema up to date (applied: {applied or 'none'})")
 
             # Create developer account for development environment
             try:
-                developer = User.query.filter_by(username='developer').first()
-                if not developer:
-                    dev_password = os.environ.get("DEV_USER_PASSWORD", "developer123")
-                    developer = User()
-                    developer.username = 'developer'
-                    developer.email = 'developer@cvoptimizer.pro'
-                    developer.first_name = 'Developer'
-                    developer.last_name = 'Account'
-                    developer.password_hash = generate_password_hash(dev_password)
-                    developer.active = True
-                    developer.created_at = datetime.utcnow()
-
-                    db.session.add(developer)
-                    db.session.commit()
-
-                    logger.info("Created developer account for development environment")
-                else:
-                    logger.info("Developer account already exists")
+                ensure_developer_account()
             except Exception as dev_err:
                 logger.warning(f"Could not create/verify developer account: {str(dev_err)}")
 
     except Exception as e:
         logger.error(f"Database initialization failed: {str(e)}")
         logger.info("App will continue with limited functionality")
-        # Try to force SQLite as last resort
-        try:
-            app.config["SQLALCHEMY_DATABASE_URI"] = "sqlite:///cv_optimizer.db"
-            db.init_app(app)
-            logger.info("Forced SQLite fallback")
-        except Exception as sqlite_err:
-            logger.error(f"Even SQLite fallback failed: {str(sqlite_err)}")
+    startup_timer.mark('database init')
 else:
     logger.info("Database initialization disabled (set INITIALIZE_DB=true to enable)")
 
+logger.info(startup_timer.report())
+
 if __name__ == '__main__':
     import os
     port = int(os.environ.get('PORT', 5000))
@@ -0,0 +1,13 @@
+# -*- coding: utf-8 -*-
+"""
+Hooki gunicorn - plik wczytywany automatycznie z katalogu roboczego
+(ustawienia workerów zostają w Procfile)
+"""
+
+
+def post_worker_init(worker):
+    # post_fork działa przed monkey-patchem gevent, więc import aplikacji tam
+    # załadowałby ssl/requests bez patcha; ten hook działa po załadowaniu
+    # aplikacji w workerze, a przed przyjęciem pierwszego żądania
+    from app import warm_up
+    warm_up()
@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Compressed text column benchmark for CV Optimizer Pro
+
+Compares the CompressedText column type (utils/compressed_text.py) with plain
+Text on a throw-away SQLite database: database file size, bulk insert time
+and time to read every row back. Rows are built from the sample CVs in
+scripts/cv_corpus, sized like an upload with its optimized version and
+analysis.
+
+Usage:
+    python scripts/bench_compressed_text.py [--rows 2000]
+"""
+import argparse
+import glob
+import os
+import sys
+import tempfile
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(ROOT_DIR, 'scripts', 'cv_corpus')
+sys.path.insert(0, ROOT_DIR)
+
+from sqlalchemy import Column, Integer, MetaData, Table, Text, create_engine, select  # noqa: E402
+
+from utils.compressed_text import CompressedText, compress_text, decompress_text  # noqa: E402
+
+
+def load_corpus():
+    texts = []
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            texts.append(f.read())
+    return texts
+
+
+def build_rows(count):
+    """Rows with original text, optimized CV (~2x) and analysis per upload"""
+    corpus = load_corpus()
+    rows = []
+    for i in range(count):
+        cv_text = corpus[i % len(corpus)] + f'\nNumer referencyjny: {i}\n'
+        rows.append({
+            'id': i + 1,
+            'original_text': cv_text,
+            'optimized_cv': cv_text + '\n' + cv_text.upper(),
+            'cv_analysis': f'Ocena CV: {i % 100}/100\n' + cv_text[:1500],
+        })
+    return rows
+
+
+def run_storage(column_type, rows):
+    """Returns (file size in bytes, insert seconds, read seconds)"""
+    path = os.path.join(tempfile.mkdtemp(prefix='cv_compress_bench_'), 'bench.db')
+    engine = create_engine(f'sqlite:///{path}')
+    metadata = MetaData()
+    table = Table('cv_upload', metadata,
+                  Column('id', Integer, primary_key=True),
+                  Column('original_text', column_type),
+                  Column('optimized_cv', column_type),
+                  Column('cv_analysis', column_type))
+    metadata.create_all(engine)
+
+    start = time.perf_counter()
+    with engine.begin() as conn:
+        conn.execute(table.insert(), rows)
+    insert_time = time.perf_counter() - start
+
+    start = time.perf_counter()
+    with engine.connect() as conn:
+        loaded = conn.execute(select(table)).all()
+    read_time = time.perf_counter() - start
+    assert len(loaded) == len(rows)
+
+    engine.dispose()
+    return os.path.getsize(path), insert_time, read_time
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--rows', type=int, default=2000)
+    args = parser.parse_args()
+
+    rows = build_rows(args.rows)
+    values = [row[key] for row in rows[:200] for key in ('original_text', 'optimized_cv', 'cv_analysis')]
+    raw_bytes = sum(len(value.encode('utf-8')) for value in values)
+
+    start = time.perf_counter()
+    compressed = [compress_text(value) for value in values]
+    compress_time = time.perf_counter() - start
+    start = time.perf_counter()
+    for value in compressed:
+        decompress_text(value)
+    decompress_time = time.perf_counter() - start
+    ratio = raw_bytes / sum(len(value) for value in compressed)
+
+    print(f"Per value ({len(values)} values, avg {raw_bytes / len(values) / 1024:.1f} KB):")
+    print(f"  compress    {compress_time / len(values) * 1e6:8.1f} us")
+    print(f"  decompress  {decompress_time / len(values) * 1e6:8.1f} us")
+    print(f"  ratio       {ratio:8.2f}x")
+    print()
+
+    print(f"SQLite, {args.rows} uploads:")
+    print(f"  {'type':<16}{'file MB':>10}{'insert s':>10}{'read s':>10}")
+    for name, column_type in (('Text', Text), ('CompressedText', CompressedText)):
+        size, insert_time, read_time = run_storage(column_type, rows)
+        print(f"  {name:<16}{size / 1e6:>10.2f}{insert_time:>10.3f}{read_time:>10.3f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Response compression benchmark for CV Optimizer Pro
+
+Reports bytes on the wire and compression CPU time per response for the
+payload types the app sends: rendered HTML pages, JSON carrying optimized CV
+and analysis texts, and the static CSS/JS bundles. Dynamic payloads use the
+per-request levels from utils/compression.py, static ones the one-off
+maximum levels. Brotli is included when the brotli package is installed.
+
+Usage:
+    python scripts/bench_compression.py [--repeat 50]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+os.environ.setdefault('INITIALIZE_DB', 'false')
+
+from utils.compression import (DYNAMIC_LEVELS, STATIC_LEVELS, available_encodings,  # noqa: E402
+                               compress)
+
+
+def load_payloads():
+    """(name, bytes, is_static) for representative responses"""
+    from app import app
+
+    client = app.test_client()
+    payloads = [
+        ('index.html', client.get('/').data, False),
+        ('auth/login.html', client.get('/auth/login').data, False),
+    ]
+
+    corpus = [open(path, encoding='utf-8').read()
+              for path in sorted(glob.glob(os.path.join(ROOT_DIR, 'scripts', 'cv_corpus', '*.txt')))]
+    by_length = sorted(corpus, key=len)
+    optimize_json = json.dumps({
+        'success': True,
+        'optimized_cv': by_length[-1],
+        'cv_analysis': by_length[-2],
+        'message': 'CV zostało zoptymalizowane'
+    }, ensure_ascii=False).encode('utf-8')
+    payloads.append(('optimize-cv JSON', optimize_json, False))
+
+    for filename in ('css/custom.css', 'js/main.js'):
+        with open(os.path.join(ROOT_DIR, 'static', filename), 'rb') as f:
+            payloads.append((filename, f.read(), True))
+    return payloads
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+
+    encodings = available_encodings()
+    header = f"{'payload':<20}{'raw KB':>9}"
+    for encoding in encodings:
+        header += f"{encoding + ' KB':>10}{encoding + ' ratio':>12}{encoding + ' ms':>10}"
+    print(header)
+
+    for name, data, is_static in load_payloads():
+        levels = STATIC_LEVELS if is_static else DYNAMIC_LEVELS
+        row = f"{name:<20}{len(data) / 1024:>9.1f}"
+        for encoding in encodings:
+            repeat = 1 if is_static else args.repeat
+            start = time.perf_counter()
+            for _ in range(repeat):
+                compressed = compress(data, encoding, levels[encoding])
+            elapsed = (time.perf_counter() - start) / repeat
+            row += (f"{len(compressed) / 1024:>10.1f}{len(data) / len(compressed):>11.1f}x"
+                    f"{elapsed * 1000:>10.2f}")
+        print(row + ('  (static: once per process)' if is_static else ''))
+
+
+if __name__ == '__main__':
+    main()
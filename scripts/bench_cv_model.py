@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+CV data model benchmark for CV Optimizer Pro
+
+Compares the dict produced by parse_cv_to_structured_data with the slotted
+CVDocument: retained memory per parsed CV, JSON serialization time and the
+cost of restoring a stored document versus reparsing the CV text.
+
+Usage:
+    python scripts/bench_cv_model.py [--number 2000]
+"""
+import argparse
+import glob
+import json
+import os
+import sys
+import timeit
+import tracemalloc
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(ROOT_DIR, 'scripts', 'cv_corpus')
+sys.path.insert(0, ROOT_DIR)
+
+from utils.cv_model import CVDocument  # noqa: E402
+from utils.cv_template_processor import parse_cv_to_structured_data  # noqa: E402
+
+
+def retained_bytes(factory, copies=200):
+    """Average memory retained by one object built by factory()"""
+    tracemalloc.start()
+    before = tracemalloc.take_snapshot()
+    objects = [factory() for _ in range(copies)]
+    after = tracemalloc.take_snapshot()
+    tracemalloc.stop()
+    size = sum(stat.size_diff for stat in after.compare_to(before, 'filename'))
+    del objects
+    return size / copies
+
+
+def per_call_us(func, number):
+    return min(timeit.repeat(func, number=number, repeat=3)) / number * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--number', type=int, default=2000,
+                        help='iterations per timing measurement')
+    args = parser.parse_args()
+
+    paths = sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt')))
+    if not paths:
+        print(f"❌ No CVs found in {CORPUS_DIR}")
+        return 1
+
+    print("🧪 CV data model: memory and serialization")
+    print("=" * 78)
+    print(f"  {'CV':<22}{'dict B':>9}{'doc B':>9}{'dumps µs':>10}{'to_json µs':>12}"
+          f"{'from_json µs':>14}{'reparse µs':>12}")
+    for path in paths:
+        with open(path, 'r', encoding='utf-8') as f:
+            cv_text = f.read()
+        cv_data = parse_cv_to_structured_data(cv_text)
+        document = CVDocument.from_dict(cv_data)
+        raw = document.to_json()
+
+        dict_bytes = retained_bytes(lambda: json.loads(json.dumps(cv_data)))
+        doc_bytes = retained_bytes(lambda: CVDocument.from_json(raw))
+        dumps_us = per_call_us(lambda: json.dumps(cv_data, ensure_ascii=False), args.number)
+        to_json_us = per_call_us(document.to_json, args.number)
+        from_json_us = per_call_us(lambda: CVDocument.from_json(raw), args.number)
+        reparse_us = per_call_us(lambda: parse_cv_to_structured_data(cv_text),
+                                 max(args.number // 20, 1))
+
+        print(f"  {os.path.basename(path):<22}{dict_bytes:>9.0f}{doc_bytes:>9.0f}"
+              f"{dumps_us:>10.1f}{to_json_us:>12.1f}{from_json_us:>14.1f}{reparse_us:>12.1f}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
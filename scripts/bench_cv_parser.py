@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+"""
+CV parser benchmark for CV Optimizer Pro
+
+Measures parse_cv_to_structured_data throughput (CVs/second) on the sample
+corpus in scripts/cv_corpus and checks how parse time scales with CV length
+and with the number of bullet points in a single position.
+
+Usage:
+    python scripts/bench_cv_parser.py [--seconds 2.0]
+"""
+import argparse
+import glob
+import os
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CORPUS_DIR = os.path.join(ROOT_DIR, 'scripts', 'cv_corpus')
+sys.path.insert(0, ROOT_DIR)
+
+from utils.cv_template_processor import parse_cv_to_structured_data  # noqa: E402
+
+
+def load_corpus():
+    """Load all sample CVs from the corpus directory"""
+    corpus = {}
+    for path in sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt'))):
+        with open(path, 'r', encoding='utf-8') as f:
+            corpus[os.path.basename(path)] = f.read()
+    return corpus
+
+
+def build_synthetic_cv(positions, bullets=8):
+    """Build a senior-level CV with the given number of positions"""
+    lines = [
+        'Tomasz Lewandowski',
+        'tomasz.lewandowski@example.com',
+        '+48 501 502 503',
+        'Wrocław',
+        'Doświadczenie zawodowe',
+    ]
+    for i in range(positions):
+        lines.append(f'Kierownik projektu | Firma {i}')
+        lines.append(f'{2000 + i % 20} - {2001 + i % 20}')
+        for j in range(bullets):
+            lines.append(f'- Koordynacja zadania {j} w projekcie {i} i raportowanie do zarządu')
+    lines += ['Umiejętności', 'Scrum, PRINCE2, ITIL', 'Wykształcenie',
+              'Magister inżynier', 'Politechnika Wrocławska', '1995-2000']
+    return '\n'.join(lines)
+
+
+def measure(cv_text, seconds):
+    """Return (iterations, elapsed) for repeated parsing of one CV"""
+    iterations = 0
+    start = time.perf_counter()
+    deadline = start + seconds
+    while True:
+        parse_cv_to_structured_data(cv_text)
+        iterations += 1
+        now = time.perf_counter()
+        if now >= deadline:
+            return iterations, now - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--seconds', type=float, default=2.0,
+                        help='time budget per measurement')
+    args = parser.parse_args()
+
+    corpus = load_corpus()
+    if not corpus:
+        print(f"❌ No CVs found in {CORPUS_DIR}")
+        return 1
+
+    print("🧪 CV parser throughput")
+    print("=" * 50)
+    total_iterations = 0
+    total_elapsed = 0.0
+    for name, cv_text in corpus.items():
+        iterations, elapsed = measure(cv_text, args.seconds / len(corpus))
+        total_iterations += iterations
+        total_elapsed += elapsed
+        print(f"  {name:<24} {iterations / elapsed:>10.0f} CV/s")
+    print(f"  {'corpus':<24} {total_iterations / total_elapsed:>10.0f} CV/s")
+
+    print("\n📈 Scaling with CV length")
+    print("=" * 50)
+    sizes = (10, 20, 40, 80, 160)
+    for positions in sizes:
+        cv_text = build_synthetic_cv(positions)
+        line_count = cv_text.count('\n') + 1
+        iterations, elapsed = measure(cv_text, args.seconds / len(sizes))
+        per_parse_ms = elapsed / iterations * 1000
+        per_line_us = elapsed / iterations / line_count * 1e6
+        print(f"  {positions:>4} positions {line_count:>6} lines "
+              f"{per_parse_ms:>9.2f} ms/CV {per_line_us:>8.2f} µs/line")
+
+    print("\n📈 Scaling with bullets per position")
+    print("=" * 50)
+    for bullets in (50, 100, 200, 400, 800):
+        cv_text = build_synthetic_cv(2, bullets=bullets)
+        line_count = cv_text.count('\n') + 1
+        iterations, elapsed = measure(cv_text, args.seconds / len(sizes))
+        per_parse_ms = elapsed / iterations * 1000
+        per_line_us = elapsed / iterations / line_count * 1e6
+        print(f"  {bullets:>4} bullets   {line_count:>6} lines "
+              f"{per_parse_ms:>9.2f} ms/CV {per_line_us:>8.2f} µs/line")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
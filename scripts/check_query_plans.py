@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Query plan check for CV Optimizer Pro
+
+Runs EXPLAIN (PostgreSQL) or EXPLAIN QUERY PLAN (SQLite) for the hot lookup
+queries issued by routes and fails when any of them falls back to a full
+table scan or a temporary sort. Run it after adding a migration that touches
+indexes.
+
+Without DATABASE_URL a throw-away SQLite database is created and migrated,
+so the check never touches instance/cv_optimizer.db.
+
+Usage:
+    python scripts/check_query_plans.py
+    DATABASE_URL=postgresql://... python scripts/check_query_plans.py
+"""
+import os
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT_DIR)
+
+if not (os.environ.get('DATABASE_URL') or os.environ.get('PGHOST')):
+    os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(
+        tempfile.mkdtemp(prefix='cv_query_plans_'), 'plans.db')
+
+from sqlalchemy import func, select, text  # noqa: E402
+
+from app import (app, db, upgrade_database, CVUpload, StructuredCV, UserStatistics,  # noqa: E402
+                 CoverLetter, InterviewQuestions, SkillsGapAnalysis, StripePayment,
+                 Subscription, SinglePayment)
+
+
+def hot_queries():
+    """(name, statement) for lookups executed on every page view"""
+    user_id = 1
+    since = datetime.utcnow() - timedelta(days=365)
+    queries = [
+        ('cv_upload by session', select(CVUpload).filter_by(session_id='abc', user_id=user_id)),
+        ('recent cv_uploads', select(CVUpload).filter_by(user_id=user_id)
+         .order_by(CVUpload.created_at.desc()).limit(5)),
+        ('cv_upload activity since', select(func.count(CVUpload.id))
+         .where(CVUpload.user_id == user_id, CVUpload.created_at >= since)),
+        ('structured cv', select(StructuredCV).filter_by(cv_upload_id=1)),
+        ('user statistics', select(UserStatistics).filter_by(user_id=user_id)),
+        ('active subscription', select(Subscription).filter_by(user_id=user_id, status='active')),
+        ('subscription by stripe id', select(Subscription)
+         .filter_by(stripe_subscription_id='sub_123')),
+        ('open single payment', select(SinglePayment).filter_by(user_id=user_id).where(
+            SinglePayment.cv_optimizations_used < SinglePayment.cv_optimizations_limit)),
+        ('total spent', select(func.sum(StripePayment.amount))
+         .filter_by(user_id=user_id, status='completed')),
+    ]
+    for model in (CoverLetter, InterviewQuestions, SkillsGapAnalysis):
+        table = model.__tablename__
+        queries.append((f'{table} by cv_upload', select(model).filter_by(cv_upload_id=1)))
+        queries.append((f'recent {table}', select(model).filter_by(user_id=user_id)
+                        .order_by(model.created_at.desc()).limit(2)))
+    return queries
+
+
+def explain(conn, dialect_name, statement):
+    """Returns the plan as a list of text lines"""
+    compiled = statement.compile(dialect=conn.dialect)
+    if dialect_name == 'postgresql':
+        rows = conn.exec_driver_sql('EXPLAIN ' + str(compiled), compiled.params)
+        return [row[0] for row in rows]
+    params = tuple(compiled.params[name] for name in compiled.positiontup)
+    rows = conn.exec_driver_sql('EXPLAIN QUERY PLAN ' + str(compiled), params)
+    return [row[-1] for row in rows]
+
+
+def plan_problems(dialect_name, plan):
+    """Lines of the plan that indicate a full scan or an extra sort"""
+    if dialect_name == 'postgresql':
+        return [line for line in plan if 'Seq Scan' in line]
+    return [line for line in plan
+            if (line.startswith('SCAN') and 'USING' not in line) or 'TEMP B-TREE' in line]
+
+
+def main():
+    failures = 0
+    with app.app_context():
+        upgrade_database()
+        dialect_name = db.engine.dialect.name
+        with db.engine.connect() as conn:
+            if dialect_name == 'postgresql':
+                # Tiny tables would make the planner pick Seq Scan despite the index
+                conn.execute(text('SET enable_seqscan = off'))
+            for name, statement in hot_queries():
+                plan = explain(conn, dialect_name, statement)
+                problems = plan_problems(dialect_name, plan)
+                status = 'FAIL' if problems else 'ok'
+                print(f"{status:4}  {name}")
+                for line in plan:
+                    print(f"        {line}")
+                failures += bool(problems)
+
+    print(f"\n{failures} quer{'y' if failures == 1 else 'ies'} without index access")
+    return 1 if failures else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Import-time profile for CV Optimizer Pro
+
+Runs `python -X importtime` in a fresh interpreter for the given module
+(app by default) and prints the slowest imports by cumulative time, plus the
+total. Database initialization at import is disabled so only module loading
+is measured. Use --warm-up to also time app.warm_up(), i.e. what a gunicorn
+worker does before its first request.
+
+Usage:
+    python scripts/import_profile.py [--module app] [--top 25] [--warm-up]
+"""
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run_importtime(statement):
+    """Returns ([(cumulative_us, self_us, module)], wall seconds) for a fresh interpreter"""
+    env = dict(os.environ, INITIALIZE_DB='false', PYTHONDONTWRITEBYTECODE='1')
+    start = time.perf_counter()
+    result = subprocess.run([sys.executable, '-X', 'importtime', '-c', statement],
+                            cwd=ROOT_DIR, env=env, capture_output=True, text=True)
+    wall = time.perf_counter() - start
+    if result.returncode != 0:
+        sys.stderr.write(result.stderr)
+        sys.exit(result.returncode)
+
+    entries = []
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        self_us, cumulative_us, module = line[len('import time:'):].split('|')
+        entries.append((int(cumulative_us), int(self_us), module.rstrip()))
+    return entries, wall
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument('--module', default='app')
+    parser.add_argument('--top', type=int, default=25)
+    parser.add_argument('--warm-up', action='store_true')
+    args = parser.parse_args()
+
+    statement = f'import {args.module}'
+    if args.warm_up:
+        statement += f'; {args.module}.warm_up()'
+    entries, wall = run_importtime(statement)
+
+    print(f"{'cumulative ms':>14}{'self ms':>10}  module")
+    for cumulative_us, self_us, module in sorted(entries, reverse=True)[:args.top]:
+        print(f"{cumulative_us / 1000:>14.1f}{self_us / 1000:>10.1f}  {module}")
+
+    top_level = [entry for entry in entries if not entry[2].startswith(' ' * 3)]
+    print(f"\nTotal import time: {sum(entry[0] for entry in top_level) / 1000:.0f} ms "
+          f"({len(entries)} modules, process wall time {wall:.2f} s)")
+
+
+if __name__ == '__main__':
+    main()
@@ -176,7 +176,8 @@ function analyzeCV(sessionId, buttonElement = null) {
             })
         })
         .then(response => {
-            if (!response.ok) {
+            // 429 (limit zapytań) i 503 (przeciążenie AI) niosą komunikat dla użytkownika
+            if (!response.ok && response.status !== 429 && response.status !== 503) {
                 throw new Error(`HTTP error! status: ${response.status}`);
             }
             return response.json();
@@ -1,26 +1,141 @@
-const CACHE_NAME = 'cv-optimizer-v1';
-const urlsToCache = [
-  '/',
-  '/static/css/custom.css',
-  '/static/js/main.js'
+// Service worker CV Optimizer Pro
+//
+// Skrypt jest serwowany przez /service-worker.js (utils/static_assets.py), który
+// dopisuje na początku self.__SW_CONFIG z wersją i listą adresów app shell ze
+// skrótem zawartości. Zmiana dowolnego pliku z listy zmienia wersję, a więc
+// i treść skryptu - przeglądarka instaluje nowego workera, a stare cache są usuwane.
+//
+// Strategie:
+//   app shell      - precache przy instalacji
+//   /static i CDN  - stale-while-revalidate
+//   /api           - network-first, cache tylko jako zapas offline
+//   nawigacja      - network-first, potem zapisana strona, potem strona offline
+//
+// Odpowiedzi z Cache-Control: no-store (strony zalogowanego użytkownika) nigdy
+// nie trafiają do cache.
+
+const CONFIG = self.__SW_CONFIG || { version: 'dev', precache: [], offline: null };
+const PRECACHE = 'cv-optimizer-precache-' + CONFIG.version;
+const STATIC_CACHE = 'cv-optimizer-static-' + CONFIG.version;
+const RUNTIME_CACHE = 'cv-optimizer-runtime-' + CONFIG.version;
+const CURRENT_CACHES = [PRECACHE, STATIC_CACHE, RUNTIME_CACHE];
+
+const CDN_HOSTS = [
+  'cdn.jsdelivr.net',
+  'code.jquery.com',
+  'fonts.googleapis.com',
+  'fonts.gstatic.com'
 ];
 
 self.addEventListener('install', function(event) {
-  console.log('Service Worker installing...');
-  self.skipWaiting();
+  event.waitUntil(
+    caches.open(PRECACHE)
+      .then(function(cache) { return cache.addAll(CONFIG.precache); })
+      .then(function() { return self.skipWaiting(); })
+  );
 });
 
 self.addEventListener('activate', function(event) {
-  console.log('Service Worker activating...');
-  event.waitUntil(self.clients.claim());
+  event.waitUntil(
+    caches.keys()
+      .then(function(names) {
+        return Promise.all(names
+          .filter(function(name) {
+            return name.startsWith('cv-optimizer-') && CURRENT_CACHES.indexOf(name) === -1;
+          })
+          .map(function(name) { return caches.delete(name); }));
+      })
+      .then(function() { return self.clients.claim(); })
+  );
 });
 
-self.addEventListener('fetch', function(event) {
-  // For now, just pass through all requests
-  event.respondWith(
-    fetch(event.request).catch(function() {
-      // Fallback in case of network error
-      return new Response('Offline');
+function isCacheable(response) {
+  if (!response) {
+    return false;
+  }
+  // Nieprzezroczyste odpowiedzi z CDN (no-cors) mają status 0
+  if (response.type === 'opaque') {
+    return true;
+  }
+  const cacheControl = response.headers.get('Cache-Control') || '';
+  return response.ok && cacheControl.indexOf('no-store') === -1;
+}
+
+function putInCache(cacheName, request, response) {
+  if (!isCacheable(response)) {
+    return Promise.resolve();
+  }
+  const copy = response.clone();
+  return caches.open(cacheName).then(function(cache) { return cache.put(request, copy); });
+}
+
+function staleWhileRevalidate(event) {
+  const request = event.request;
+  const network = fetch(request).then(function(response) {
+    event.waitUntil(putInCache(STATIC_CACHE, request, response));
+    return response;
+  });
+  return caches.match(request).then(function(cached) {
+    if (cached) {
+      // Odświeżenie w tle - błąd sieci nie wpływa na odpowiedź z cache
+      event.waitUntil(network.catch(function() {}));
+      return cached;
+    }
+    return network;
+  });
+}
+
+function networkFirst(event, fallbackUrl) {
+  const request = event.request;
+  return fetch(request)
+    .then(function(response) {
+      event.waitUntil(putInCache(RUNTIME_CACHE, request, response));
+      return response;
     })
-  );
-});
\ No newline at end of file
+    .catch(function(error) {
+      return caches.match(request).then(function(cached) {
+        if (cached) {
+          return cached;
+        }
+        if (fallbackUrl) {
+          return caches.match(fallbackUrl).then(function(fallback) {
+            if (fallback) {
+              return fallback;
+            }
+            throw error;
+          });
+        }
+        throw error;
+      });
+    });
+}
+
+self.addEventListener('fetch', function(event) {
+  const request = event.request;
+  if (request.method !== 'GET' || request.headers.has('Range')) {
+    return;
+  }
+  // Strumienie (SSE) i sprawdzenia stanu zawsze idą prosto do sieci
+  if ((request.headers.get('Accept') || '').indexOf('text/event-stream') !== -1) {
+    return;
+  }
+
+  const url = new URL(request.url);
+  if (url.origin === self.location.origin) {
+    if (url.pathname.startsWith('/health') || url.pathname === '/service-worker.js') {
+      return;
+    }
+    if (url.pathname.startsWith('/static/')) {
+      event.respondWith(staleWhileRevalidate(event));
+    } else if (url.pathname === '/api' || url.pathname.startsWith('/api/')) {
+      event.respondWith(networkFirst(event, null));
+    } else if (request.mode === 'navigate') {
+      event.respondWith(networkFirst(event, CONFIG.offline));
+    }
+    return;
+  }
+
+  if (CDN_HOSTS.indexOf(url.hostname) !== -1) {
+    event.respondWith(staleWhileRevalidate(event));
+  }
+});
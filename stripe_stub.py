@@ -0,0 +1,202 @@
+# -*- coding: utf-8 -*-
+"""
+Lokalna atrapa API Stripe do testów (test_stripe_gateway.py) i pracy bez sieci
+
+Obsługuje tylko wywołania używane przez aplikację: tworzenie klientów, tworzenie
+i pobieranie sesji checkout (z Idempotency-Key) oraz pobieranie subskrypcji.
+Stan jest trzymany w pamięci; GET /_stub/requests zwraca liczniki wywołań.
+
+Uruchomienie:
+    python stripe_stub.py --port 12111
+    STRIPE_API_BASE=http://localhost:12111 STRIPE_SECRET_KEY=sk_test_stub flask --app app run
+"""
+import argparse
+import itertools
+import json
+import re
+import threading
+import time
+from collections import Counter
+
+from werkzeug.serving import make_server
+from werkzeug.wrappers import Request, Response
+
+SESSION_LIFETIME_SECONDS = 24 * 3600
+
+_KEY_PART_RE = re.compile(r'\[([^\]]*)\]')
+
+
+def parse_stripe_form(form):
+    """Zamienia klucze w stylu Stripe (metadata[user_id], items[0][price]) na słowniki i listy"""
+    result = {}
+    for raw_key, value in form.items(multi=True):
+        head = raw_key.split('[', 1)[0]
+        parts = [head] + _KEY_PART_RE.findall(raw_key[len(head):])
+        node = result
+        for part, next_part in zip(parts, parts[1:]):
+            default = [] if next_part.isdigit() or next_part == '' else {}
+            if isinstance(node, list):
+                index = int(part)
+                while len(node) <= index:
+                    node.append(None)
+                if node[index] is None:
+                    node[index] = default
+                node = node[index]
+            else:
+                node = node.setdefault(part, default)
+        last = parts[-1]
+        if isinstance(node, list):
+            if last == '':
+                node.append(value)
+            else:
+                index = int(last)
+                while len(node) <= index:
+                    node.append(None)
+                node[index] = value
+        else:
+            node[last] = value
+    return result
+
+
+def _error(status, message, error_type='invalid_request_error'):
+    return Response(json.dumps({'error': {'type': error_type, 'message': message}}),
+                    status=status, mimetype='application/json')
+
+
+class StripeStub:
+    """Aplikacja WSGI udająca wybrane endpointy api.stripe.com"""
+
+    def __init__(self, base_url='http://localhost'):
+        self.base_url = base_url
+        self.objects = {}
+        self.requests = Counter()
+        self._idempotent = {}  # Idempotency-Key -> (parametry, pierwsza odpowiedź)
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def _new_id(self, prefix):
+        return f"{prefix}_stub{next(self._ids):06d}"
+
+    def create_customer(self, params):
+        customer = {'id': self._new_id('cus'), 'object': 'customer',
+                    'email': params.get('email'), 'name': params.get('name'),
+                    'metadata': params.get('metadata', {})}
+        self.objects[customer['id']] = customer
+        return customer
+
+    def create_checkout_session(self, params):
+        now = int(time.time())
+        session_id = self._new_id('cs_test')
+        session = {
+            'id': session_id, 'object': 'checkout.session',
+            'mode': params.get('mode', 'payment'), 'status': 'open', 'payment_status': 'unpaid',
+            'customer': params.get('customer'), 'metadata': params.get('metadata', {}),
+            'success_url': params.get('success_url'), 'cancel_url': params.get('cancel_url'),
+            'url': f"{self.base_url}/pay/{session_id}",
+            'amount_total': sum(int(item['price_data']['unit_amount']) * int(item.get('quantity', 1))
+                                for item in params.get('line_items', []) if 'price_data' in item),
+            'currency': next((item['price_data']['currency'] for item in params.get('line_items', [])
+                              if 'price_data' in item), 'pln'),
+            'payment_intent': None, 'subscription': None,
+            'created': now, 'expires_at': now + SESSION_LIFETIME_SECONDS,
+        }
+        self.objects[session_id] = session
+        return session
+
+    def complete_checkout_session(self, session_id):
+        """Symuluje opłacenie sesji (do testów)"""
+        session = self.objects[session_id]
+        session.update(status='complete', payment_status='paid')
+        if session['mode'] == 'subscription':
+            now = int(time.time())
+            subscription = {
+                'id': self._new_id('sub'), 'object': 'subscription', 'status': 'active',
+                'customer': session['customer'],
+                'current_period_start': now, 'current_period_end': now + 30 * 24 * 3600,
+                'items': {'object': 'list', 'data': [{'price': {
+                    'unit_amount': session['amount_total'], 'currency': session['currency']}}]},
+            }
+            self.objects[subscription['id']] = subscription
+            session['subscription'] = subscription['id']
+        else:
+            session['payment_intent'] = self._new_id('pi')
+        return session
+
+    def _expanded(self, obj, expand):
+        obj = dict(obj)
+        for field in expand:
+            if isinstance(obj.get(field), str) and obj[field] in self.objects:
+                obj[field] = self.objects[obj[field]]
+        return obj
+
+    def dispatch(self, request):
+        path = request.path.rstrip('/')
+        if path == '/_stub/requests':
+            return Response(json.dumps(self.requests), mimetype='application/json')
+
+        self.requests[f"{request.method} {re.sub(r'/[a-z_]+_stub[0-9]+', '/:id', path)}"] += 1
+        params = parse_stripe_form(request.form if request.method == 'POST' else request.args)
+
+        if request.method == 'POST' and path in ('/v1/customers', '/v1/checkout/sessions'):
+            create = self.create_customer if path == '/v1/customers' else self.create_checkout_session
+            key = request.headers.get('Idempotency-Key')
+            with self._lock:
+                if key in self._idempotent:
+                    # Jak Stripe: powtórka pierwszej odpowiedzi, nie bieżący stan obiektu
+                    previous_params, body = self._idempotent[key]
+                    if previous_params != params:
+                        return _error(400, 'Keys for idempotent requests can only be used with the '
+                                           'same parameters they were first used with.',
+                                      'idempotency_error')
+                    return Response(body, mimetype='application/json',
+                                    headers={'Idempotent-Replayed': 'true'})
+                body = json.dumps(create(params))
+                if key:
+                    self._idempotent[key] = (params, body)
+            return Response(body, mimetype='application/json')
+
+        match = re.fullmatch(r'/v1/(customers|checkout/sessions|subscriptions)/([^/]+)', path)
+        if request.method == 'GET' and match:
+            obj = self.objects.get(match.group(2))
+            if obj is None:
+                return _error(404, f"No such object: '{match.group(2)}'")
+            return Response(json.dumps(self._expanded(obj, params.get('expand', []))),
+                            mimetype='application/json')
+
+        return _error(404, f"Unrecognized request URL ({request.method}: {path})")
+
+    def __call__(self, environ, start_response):
+        return self.dispatch(Request(environ))(environ, start_response)
+
+
+class StubServer:
+    """Serwer atrapy w wątku tła - `with StubServer() as server: server.url`"""
+
+    def __init__(self, host='127.0.0.1', port=0):
+        self.stub = StripeStub()
+        self._server = make_server(host, port, self.stub, threaded=True)
+        self.url = f"http://{host}:{self._server.server_port}"
+        self.stub.base_url = self.url
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Lokalna atrapa API Stripe')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=12111)
+    args = parser.parse_args()
+    server = make_server(args.host, args.port, StripeStub(f"http://{args.host}:{args.port}"),
+                         threaded=True)
+    print(f"Stripe stub listening on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
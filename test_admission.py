@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+"""
+Tests for AI request admission control in utils/admission.py
+"""
+import threading
+
+import pytest
+
+from utils.admission import AdmissionController, AdmissionRejected
+
+
+def test_requests_beyond_limit_and_queue_are_rejected():
+    controller = AdmissionController(max_in_flight=2, queue_timeout=0)
+    controller.acquire()
+    controller.acquire()
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire()
+
+    assert rejected.value.retry_after >= 5
+    assert controller.snapshot()['rejected'] == 1
+
+
+def test_queued_request_is_admitted_when_slot_frees():
+    controller = AdmissionController(max_in_flight=1, queue_timeout=5)
+    controller.acquire()
+    admitted = threading.Event()
+
+    def waiter():
+        controller.acquire()
+        admitted.set()
+
+    thread = threading.Thread(target=waiter)
+    thread.start()
+    assert not admitted.wait(0.1)
+    controller.release()
+
+    assert admitted.wait(2)
+    thread.join()
+    assert controller.snapshot()['in_flight'] == 1
+
+
+def test_queue_times_out():
+    controller = AdmissionController(max_in_flight=1, queue_timeout=0.05)
+    controller.acquire()
+
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire()
+    assert rejected.value.reason == 'queue timeout'
+
+
+def test_limit_halves_while_upstream_is_slow():
+    controller = AdmissionController(max_in_flight=6, queue_timeout=0, slow_latency=30)
+    for _ in range(5):
+        controller.record_latency(45.0)
+
+    assert controller.limit() == 3
+    for _ in range(3):
+        controller.acquire()
+    with pytest.raises(AdmissionRejected) as rejected:
+        controller.acquire()
+    assert rejected.value.retry_after == 23
+
+    for _ in range(3):
+        controller.release()
+    for _ in range(10):
+        controller.record_latency(2.0)
+    assert controller.limit() == 6
+    assert controller.snapshot()['in_flight'] == 0
+
+
+def test_measure_records_model_call_latency_even_on_error():
+    now = [100.0]
+    controller = AdmissionController(max_in_flight=2, slow_latency=30, clock=lambda: now[0])
+
+    with pytest.raises(TimeoutError):
+        with controller.measure():
+            now[0] += 40
+            raise TimeoutError()
+
+    assert controller.median_latency() == 40
+    assert controller.limit() == 1
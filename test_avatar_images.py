@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+"""
+Tests for avatar thumbnails in utils/avatar_images.py
+"""
+import io
+
+import pytest
+from PIL import Image
+
+from utils.avatar_images import (AVATAR_SIZES, AvatarImageError, is_avatar_set, is_thumbnail,
+                                 make_thumbnails, save_thumbnails, thumbnail_filename)
+
+
+def image_bytes(size=(1200, 800), fmt='PNG', mode='RGB'):
+    buffer = io.BytesIO()
+    Image.new(mode, size, 'navy').save(buffer, fmt)
+    return buffer.getvalue()
+
+
+def test_thumbnails_are_square_webp_in_every_size():
+    avatar_filename, thumbnails = make_thumbnails(image_bytes())
+
+    assert is_avatar_set(avatar_filename)
+    assert len(thumbnails) == len(AVATAR_SIZES)
+    for size in AVATAR_SIZES:
+        data = thumbnails[thumbnail_filename(avatar_filename, size)]
+        with Image.open(io.BytesIO(data)) as thumbnail:
+            assert thumbnail.format == 'WEBP'
+            assert thumbnail.size == (size, size)
+
+
+def test_name_depends_only_on_content():
+    first, _ = make_thumbnails(image_bytes())
+    second, _ = make_thumbnails(image_bytes())
+    other, _ = make_thumbnails(image_bytes(size=(640, 480)))
+
+    assert first == second
+    assert first != other
+
+
+def test_transparent_gif_is_converted():
+    avatar_filename, thumbnails = make_thumbnails(image_bytes(fmt='GIF', mode='P'))
+
+    with Image.open(io.BytesIO(thumbnails[thumbnail_filename(avatar_filename, 64)])) as thumbnail:
+        assert thumbnail.size == (64, 64)
+
+
+def test_invalid_file_is_rejected():
+    with pytest.raises(AvatarImageError):
+        make_thumbnails(b'%PDF-1.4 not an image')
+
+
+def test_requested_size_rounds_up_to_available_thumbnail():
+    assert thumbnail_filename('a' * 24 + '.webp', 80) == 'a' * 24 + '_128.webp'
+    assert thumbnail_filename('a' * 24 + '.webp', 1000) == 'a' * 24 + '_256.webp'
+    assert is_thumbnail('a' * 24 + '_64.webp')
+    assert not is_thumbnail('avatar_1_1f17ad5a.png')
+    assert not is_avatar_set('avatar_1_1f17ad5a.png')
+
+
+def test_saved_thumbnails_are_a_fraction_of_the_upload(tmp_path):
+    data = image_bytes(size=(2000, 2000), fmt='BMP')
+    avatar_filename = save_thumbnails(str(tmp_path), data)
+
+    files = sorted(path.name for path in tmp_path.iterdir())
+    assert files == sorted(thumbnail_filename(avatar_filename, size) for size in AVATAR_SIZES)
+    assert (tmp_path / thumbnail_filename(avatar_filename, 256)).stat().st_size < len(data) / 100
@@ -0,0 +1,40 @@
+#!/usr/bin/env python3
+"""
+Tests for the in-process background worker in utils/background_worker.py
+"""
+import threading
+
+from utils.background_worker import BackgroundWorker
+
+
+def test_wake_runs_target_without_waiting_for_interval():
+    done = threading.Event()
+    worker = BackgroundWorker('test-wake', done.set, interval=3600)
+
+    worker.wake()
+
+    assert done.wait(2)
+
+
+def test_target_errors_do_not_stop_the_worker():
+    calls = []
+    second_call = threading.Event()
+
+    def target():
+        calls.append(1)
+        if len(calls) == 1:
+            raise RuntimeError('boom')
+        second_call.set()
+
+    worker = BackgroundWorker('test-errors', target, interval=0.01)
+    worker.start()
+
+    assert second_call.wait(2)
+
+
+def test_start_is_idempotent_within_a_process():
+    worker = BackgroundWorker('test-start', lambda: None, interval=3600)
+    worker.start()
+    worker.start()
+
+    assert [t.name for t in threading.enumerate()].count('test-start') == 1
@@ -0,0 +1,57 @@
+#!/usr/bin/env python3
+"""
+Tests for the compressed text column type in utils/compressed_text.py
+"""
+import pytest
+from sqlalchemy import Column, Integer, MetaData, Table, Text, create_engine, select, text
+
+from utils.compressed_text import (CompressedText, backfill_compressed_columns,
+                                   compress_text, decompress_text, is_compressed)
+
+LONG_TEXT = 'Doświadczenie zawodowe: kierowca kurier, Warszawa. ' * 40
+
+
+def test_long_text_is_compressed_and_round_trips():
+    stored = compress_text(LONG_TEXT)
+
+    assert is_compressed(stored)
+    assert len(stored) < len(LONG_TEXT.encode('utf-8')) / 4
+    assert decompress_text(stored) == LONG_TEXT
+
+
+def test_short_text_is_stored_without_compression():
+    stored = compress_text('Jan Kowalski')
+
+    assert stored[1] == 0
+    assert decompress_text(stored) == 'Jan Kowalski'
+
+
+def test_legacy_values_are_read_unchanged():
+    assert decompress_text('zwykły tekst') == 'zwykły tekst'
+    assert decompress_text('bajty UTF-8 – ąę'.encode('utf-8')) == 'bajty UTF-8 – ąę'
+
+
+def test_unknown_format_version_is_rejected():
+    with pytest.raises(ValueError):
+        decompress_text(b'\x00\x7fpayload')
+
+
+def test_backfill_compresses_legacy_rows_once():
+    engine = create_engine('sqlite://')
+    metadata = MetaData()
+    table = Table('cv_upload', metadata,
+                  Column('id', Integer, primary_key=True),
+                  Column('original_text', CompressedText))
+    with engine.begin() as conn:
+        # Tabela sprzed kompresji - zwykły tekst w kolumnie TEXT
+        conn.execute(text('CREATE TABLE cv_upload (id INTEGER PRIMARY KEY, original_text TEXT)'))
+        for row_id in range(1, 6):
+            conn.execute(text('INSERT INTO cv_upload VALUES (:id, :value)'),
+                         {'id': row_id, 'value': f'{row_id} {LONG_TEXT}'})
+
+    assert backfill_compressed_columns(engine, metadata, batch_size=2) == {'cv_upload.original_text': 5}
+    assert backfill_compressed_columns(engine, metadata) == {'cv_upload.original_text': 0}
+
+    with engine.connect() as conn:
+        assert conn.execute(select(table.c.original_text).where(table.c.id == 3)).scalar() == f'3 {LONG_TEXT}'
+        assert conn.execute(text("SELECT typeof(original_text) FROM cv_upload")).scalars().all() == ['blob'] * 5
@@ -0,0 +1,76 @@
+#!/usr/bin/env python3
+"""
+Tests for the response compression in utils/compression.py
+"""
+import gzip
+import json
+
+from flask import Flask, Response, jsonify, request, stream_with_context
+
+from utils.compression import init_compression
+
+LONG_TEXT = 'Zoptymalizowane CV: doświadczenie, umiejętności, wykształcenie. ' * 100
+
+
+def make_app():
+    app = Flask(__name__)
+    init_compression(app)
+
+    @app.route('/json')
+    def json_view():
+        return jsonify({'optimized_cv': LONG_TEXT})
+
+    @app.route('/small')
+    def small_view():
+        return jsonify({'status': 'ok'})
+
+    @app.route('/conditional')
+    def conditional_view():
+        response = Response(LONG_TEXT, mimetype='text/plain')
+        response.set_etag('v1')
+        return response.make_conditional(request)
+
+    @app.route('/events')
+    def events_view():
+        def generate():
+            yield 'data: pierwszy\n\n'
+            yield 'data: drugi\n\n'
+        return Response(stream_with_context(generate()), mimetype='text/event-stream')
+
+    return app
+
+
+def test_large_json_is_gzipped_when_accepted():
+    response = make_app().test_client().get('/json', headers={'Accept-Encoding': 'gzip'})
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert json.loads(gzip.decompress(response.data)) == {'optimized_cv': LONG_TEXT}
+    assert int(response.headers['Content-Length']) == len(response.data)
+
+
+def test_no_compression_without_accept_encoding_or_below_threshold():
+    client = make_app().test_client()
+
+    assert 'Content-Encoding' not in client.get('/json').headers
+    assert 'Content-Encoding' not in client.get('/small', headers={'Accept-Encoding': 'gzip'}).headers
+
+
+def test_event_stream_passes_through_uncompressed():
+    response = make_app().test_client().get('/events', headers={'Accept-Encoding': 'gzip'})
+
+    assert 'Content-Encoding' not in response.headers
+    assert response.data == b'data: pierwszy\n\ndata: drugi\n\n'
+
+
+def test_compressed_etag_is_honoured_by_conditional_requests():
+    client = make_app().test_client()
+    first = client.get('/conditional', headers={'Accept-Encoding': 'gzip'})
+
+    revalidated = client.get('/conditional', headers={'Accept-Encoding': 'gzip',
+                                                      'If-None-Match': first.headers['ETag']})
+
+    assert first.headers['ETag'] == '"v1-gzip"'
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+    assert revalidated.headers['ETag'] == '"v1-gzip"'
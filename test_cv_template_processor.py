@@ -0,0 +1,72 @@
+#!/usr/bin/env python3
+"""
+Golden corpus tests for the CV parser in utils/cv_template_processor.py
+
+Every scripts/cv_corpus/<name>.txt has a matching <name>.json with the
+structured data the parser must produce for it.
+"""
+import glob
+import json
+import os
+
+import pytest
+
+from utils.cv_model import CVDocument
+from utils.cv_template_processor import (parse_cv_document, parse_cv_to_structured_data,
+                                         split_experience_entries)
+
+CORPUS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'scripts', 'cv_corpus')
+CORPUS_FILES = sorted(glob.glob(os.path.join(CORPUS_DIR, '*.txt')))
+
+
+@pytest.mark.parametrize('cv_path', CORPUS_FILES, ids=os.path.basename)
+def test_parse_matches_golden_output(cv_path):
+    with open(cv_path, 'r', encoding='utf-8') as f:
+        cv_text = f.read()
+    with open(cv_path[:-len('.txt')] + '.json', 'r', encoding='utf-8') as f:
+        expected = json.load(f)
+
+    assert parse_cv_to_structured_data(cv_text) == expected
+
+
+@pytest.mark.parametrize('cv_path', CORPUS_FILES, ids=os.path.basename)
+def test_cv_document_json_round_trip(cv_path):
+    with open(cv_path, 'r', encoding='utf-8') as f:
+        cv_text = f.read()
+
+    document = parse_cv_document(cv_text)
+    restored = CVDocument.from_json(document.to_json())
+
+    assert restored == document
+    assert restored.to_dict() == parse_cv_to_structured_data(cv_text)
+
+
+def test_split_experience_entries_long_position():
+    """Jedno stanowisko z setkami obowiązków pozostaje jedną grupą"""
+    content = ['Kierownik projektu | Comarch', '2010 - obecnie']
+    content += [f'- Obowiązek numer {i} w projekcie' for i in range(500)]
+    content += ['Architekt systemów | Asseco', '2005 - 2010', '- Projektowanie architektury']
+
+    experiences = split_experience_entries(content)
+
+    assert [len(exp) for exp in experiences] == [502, 3]
+    assert experiences[1][0] == 'Architekt systemów | Asseco'
+
+
+def test_english_headers_and_cities():
+    cv_text = '\n'.join([
+        'Adam Nowak',
+        'Gdynia, pomorskie',
+        'Professional experience',
+        'Backend Developer | Globex',
+        '2018 - 2021',
+        '- Building REST APIs in Flask',
+        'Hobbies',
+        'Sailing, chess',
+    ])
+
+    cv_data = parse_cv_to_structured_data(cv_text)
+
+    assert cv_data['location'] == 'Gdynia, pomorskie'
+    assert [exp['company'] for exp in cv_data['experience']] == ['Globex']
+    assert cv_data['interests'] == ['Sailing', 'chess']
@@ -0,0 +1,50 @@
+#!/usr/bin/env python3
+"""
+Tests for the versioned schema migrations in utils/migrations.py
+"""
+from sqlalchemy import MetaData, create_engine, inspect, text
+
+from utils.migrations import MIGRATIONS, applied_revisions, pending_migrations, upgrade
+
+
+def legacy_engine():
+    """Database created before counters, entitlements version and indexes existed"""
+    engine = create_engine('sqlite://')
+    with engine.begin() as conn:
+        conn.execute(text('CREATE TABLE "user" (id INTEGER PRIMARY KEY)'))
+        conn.execute(text('CREATE TABLE user_statistics (id INTEGER PRIMARY KEY, user_id INTEGER)'))
+        for table in ('cv_upload', 'cover_letter', 'interview_questions', 'skills_gap_analysis'):
+            extra = '' if table == 'cv_upload' else ', cv_upload_id INTEGER'
+            conn.execute(text(
+                f'CREATE TABLE {table} (id INTEGER PRIMARY KEY, user_id INTEGER, '
+                f'created_at TIMESTAMP{extra})'))
+        conn.execute(text('CREATE TABLE subscription (id INTEGER PRIMARY KEY, user_id INTEGER, status VARCHAR)'))
+        conn.execute(text('CREATE TABLE single_payment (id INTEGER PRIMARY KEY, user_id INTEGER)'))
+        conn.execute(text('CREATE TABLE stripe_payment (id INTEGER PRIMARY KEY, user_id INTEGER, status VARCHAR)'))
+    return engine
+
+
+def test_upgrade_adds_columns_and_indexes_to_legacy_schema():
+    engine = legacy_engine()
+
+    applied = upgrade(engine, MetaData())
+
+    assert applied == [revision for revision, _, _ in MIGRATIONS]
+    inspector = inspect(engine)
+    assert 'entitlements_version' in {col['name'] for col in inspector.get_columns('user')}
+    assert 'cv_count' in {col['name'] for col in inspector.get_columns('user_statistics')}
+    assert 'ix_subscription_user_id_status' in {ix['name'] for ix in inspector.get_indexes('subscription')}
+    assert 'ix_stripe_webhook_event_status_received_at' in {
+        ix['name'] for ix in inspector.get_indexes('stripe_webhook_event')}
+    assert 'ix_credit_reservation_user_id_status' in {
+        ix['name'] for ix in inspector.get_indexes('credit_reservation')}
+    assert 'rate_limit_counter' in inspector.get_table_names()
+
+
+def test_upgrade_runs_each_revision_once():
+    engine = legacy_engine()
+    upgrade(engine, MetaData())
+
+    assert upgrade(engine, MetaData()) == []
+    assert pending_migrations(engine) == []
+    assert applied_revisions(engine) == {revision for revision, _, _ in MIGRATIONS}
@@ -0,0 +1,207 @@
+#!/usr/bin/env python3
+"""
+Tests for the sliding window rate limiter in utils/rate_limit.py and the
+rate_limited decorator of the AI routes in app.py
+"""
+import pytest
+from sqlalchemy import create_engine
+
+from utils.rate_limit import (DatabaseStore, MemoryStore, RateLimit, RateLimiter, metadata,
+                              parse_rate)
+
+
+class Clock:
+    def __init__(self, now=1_000_000.0):
+        self.now = now
+
+    def __call__(self):
+        return self.now
+
+
+def database_store():
+    engine = create_engine('sqlite://')
+    metadata.create_all(engine)
+    return DatabaseStore(engine)
+
+
+@pytest.fixture(params=['memory', 'database'])
+def store(request):
+    return MemoryStore() if request.param == 'memory' else database_store()
+
+
+def test_parse_rate():
+    assert parse_rate('10/minute') == RateLimit(10, 60)
+    assert parse_rate('100/hours') == RateLimit(100, 3600)
+    assert parse_rate('5/10 minutes') == RateLimit(5, 600)
+    with pytest.raises(ValueError):
+        parse_rate('5/fortnight')
+
+
+def test_limit_is_enforced_with_retry_after(store):
+    clock = Clock()
+    limiter = RateLimiter(store, clock)
+    limits = [RateLimit(3, 60)]
+
+    results = [limiter.hit('user:1', limits) for _ in range(4)]
+
+    assert [result.allowed for result in results] == [True, True, True, False]
+    assert results[2].remaining == 0
+    assert 1 <= results[3].retry_after <= 120
+    # Inny klucz ma własny licznik
+    assert limiter.hit('user:2', limits).allowed
+
+
+def test_previous_window_is_weighted_by_overlap(store):
+    clock = Clock(now=60 * 1000)  # początek okna
+    limiter = RateLimiter(store, clock)
+    limits = [RateLimit(10, 60)]
+    for _ in range(10):
+        assert limiter.hit('user:1', limits).allowed
+
+    # 15 s w nowym oknie: poprzednie okno liczy się jeszcze w 75% (7,5 zapytania)
+    clock.now += 75
+    assert [limiter.hit('user:1', limits).allowed for _ in range(3)] == [True, True, False]
+
+
+def test_retry_after_is_when_next_request_fits(store):
+    clock = Clock(now=60 * 1000)
+    limiter = RateLimiter(store, clock)
+    limits = [RateLimit(2, 60)]
+    limiter.hit('user:1', limits)
+    limiter.hit('user:1', limits)
+    denied = limiter.hit('user:1', limits)
+
+    clock.now += denied.retry_after
+    assert limiter.hit('user:1', limits).allowed
+
+
+def test_strictest_of_several_limits_applies(store):
+    limiter = RateLimiter(store, Clock())
+    limits = [RateLimit(10, 60), RateLimit(2, 3600)]
+
+    assert [limiter.hit('ip:1', limits).allowed for _ in range(3)] == [True, True, False]
+
+
+def test_rejected_requests_do_not_extend_the_block(store):
+    clock = Clock(now=3600 * 1000)
+    limiter = RateLimiter(store, clock)
+    limits = [RateLimit(2, 60), RateLimit(5, 3600)]
+    limiter.hit('user:1', limits)
+    limiter.hit('user:1', limits)
+
+    # Ponawianie po 429 nie zużywa limitu godzinowego
+    assert not any(limiter.hit('user:1', limits).allowed for _ in range(10))
+    clock.now += 120
+    assert [limiter.hit('user:1', limits).allowed for _ in range(3)] == [True, True, False]
+    clock.now += 120
+    assert [limiter.hit('user:1', limits).allowed for _ in range(2)] == [True, False]
+
+
+def test_request_denied_for_one_key_is_not_counted_for_others(store):
+    limiter = RateLimiter(store, Clock())
+    user_limits, ip_limits = [RateLimit(1, 60)], [RateLimit(2, 60)]
+
+    first, _ = limiter.hit_many([('user:1', user_limits), ('ip:1', ip_limits)])
+    denied_user, _ = limiter.hit_many([('user:1', user_limits), ('ip:1', ip_limits)])
+    _, other_user_ip = limiter.hit_many([('user:2', user_limits), ('ip:1', ip_limits)])
+
+    assert first.allowed and not denied_user.allowed
+    assert other_user_ip.allowed
+
+
+@pytest.fixture(scope='module')
+def app_module(tmp_path_factory):
+    """app.py z bazą SQLite w katalogu tymczasowym (nie instance/cv_optimizer.db)"""
+    with pytest.MonkeyPatch.context() as env:
+        for name in ('PGHOST', 'PGUSER', 'PGPASSWORD', 'PGDATABASE'):
+            env.delenv(name, raising=False)
+        env.setenv('DATABASE_URL', f"sqlite:///{tmp_path_factory.mktemp('db') / 'app.db'}")
+        env.setenv('INITIALIZE_DB', 'true')
+        import app
+    return app
+
+
+@pytest.fixture
+def limited(app_module, monkeypatch):
+    """Widok opakowany w rate_limited('optimize') z limiterem w pamięci i stałym zegarem"""
+    calls = []
+    limiter = RateLimiter(MemoryStore(), Clock())
+    monkeypatch.setattr(app_module, '_rate_limiter', limiter)
+    monkeypatch.setattr(app_module, 'RATE_LIMIT_ENABLED', True)
+    view = app_module.rate_limited('optimize')(lambda: calls.append(1) or 'ok')
+    return view, calls, limiter
+
+
+def call_as(app_module, user, view):
+    from flask_login import login_user
+    with app_module.app.test_request_context('/optimize-cv', method='POST',
+                                             environ_base={'REMOTE_ADDR': '10.0.0.1'}):
+        login_user(user)
+        return app_module.app.make_response(view())
+
+
+def make_user(app_module, username):
+    with app_module.app.app_context():
+        user = app_module.User.query.filter_by(username=username).first()
+        if user is None:
+            user = app_module.User(username=username, email=f"{username}@example.com",
+                                   first_name='Test', last_name='User', password_hash='x')
+            app_module.db.session.add(user)
+            app_module.db.session.commit()
+        return user.id
+
+
+def test_decorator_returns_429_with_retry_after(app_module, limited):
+    view, calls, _ = limited
+    user_id = make_user(app_module, 'rate_free')
+
+    with app_module.app.app_context():
+        user = app_module.db.session.get(app_module.User, user_id)
+        responses = [call_as(app_module, user, view) for _ in range(4)]
+
+    assert [response.status_code for response in responses] == [200, 200, 200, 429]
+    assert len(calls) == 3
+    assert int(responses[3].headers['Retry-After']) >= 1
+    assert responses[3].get_json()['retry_after'] == int(responses[3].headers['Retry-After'])
+
+
+def test_developer_is_not_limited(app_module, limited):
+    view, calls, _ = limited
+
+    with app_module.app.app_context():
+        developer = app_module.User.query.filter_by(username='developer').one()
+        responses = [call_as(app_module, developer, view) for _ in range(10)]
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len(calls) == 10
+
+
+def test_limits_follow_user_plan(app_module, monkeypatch):
+    user_id = make_user(app_module, 'rate_plan')
+    with app_module.app.app_context():
+        user = app_module.db.session.get(app_module.User, user_id)
+        limits = {}
+        for plan in ('free', 'single', 'subscription'):
+            monkeypatch.setattr(user, 'get_payment_status', lambda plan=plan: {'type': plan})
+            limits[plan] = app_module.rate_limits_for(user, 'optimize')
+
+    assert limits['free'] == [RateLimit(3, 60), RateLimit(20, 3600)]
+    assert limits['single'] == [RateLimit(5, 60), RateLimit(30, 3600)]
+    assert limits['subscription'] == [RateLimit(10, 60), RateLimit(120, 3600)]
+
+
+def test_decorator_fails_open_when_store_is_down(app_module, limited):
+    view, calls, limiter = limited
+    user_id = make_user(app_module, 'rate_store_down')
+
+    class BrokenStore:
+        def hit(self, slots, now, accept):
+            raise ConnectionError('database unavailable')
+
+    limiter.store = BrokenStore()
+    with app_module.app.app_context():
+        user = app_module.db.session.get(app_module.User, user_id)
+        responses = [call_as(app_module, user, view) for _ in range(5)]
+
+    assert all(response.status_code == 200 for response in responses)
+    assert len(calls) == 5
@@ -0,0 +1,56 @@
+#!/usr/bin/env python3
+"""
+Tests for the portable time-bucket helpers in utils/sql_helpers.py
+"""
+from datetime import datetime
+
+from sqlalchemy import Column, DateTime, Integer, create_engine, func, select
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import DeclarativeBase, Session
+
+from utils.sql_helpers import bucket_key, last_month_starts, time_bucket
+
+
+class Base(DeclarativeBase):
+    pass
+
+
+class Event(Base):
+    __tablename__ = 'event'
+    id = Column(Integer, primary_key=True)
+    created_at = Column(DateTime, nullable=False)
+
+
+def test_last_month_starts_crosses_year_boundary():
+    starts = last_month_starts(3, now=datetime(2025, 2, 17, 13, 5))
+
+    assert starts == [datetime(2024, 12, 1), datetime(2025, 1, 1), datetime(2025, 2, 1)]
+
+
+def test_time_bucket_groups_calendar_months_on_sqlite():
+    engine = create_engine('sqlite://')
+    Base.metadata.create_all(engine)
+    with Session(engine) as session:
+        session.add_all([
+            Event(created_at=datetime(2025, 1, 31, 23, 59)),
+            Event(created_at=datetime(2025, 2, 1, 0, 0)),
+            Event(created_at=datetime(2025, 2, 28, 12, 0)),
+        ])
+        session.commit()
+
+        bucket = time_bucket(Event.created_at, engine.dialect.name, 'month')
+        counts = dict(session.execute(
+            select(bucket, func.count(Event.id)).group_by(bucket)).all())
+
+    assert counts == {
+        bucket_key(datetime(2025, 1, 1)): 1,
+        bucket_key(datetime(2025, 2, 1)): 2,
+    }
+
+
+def test_time_bucket_uses_date_trunc_on_postgresql():
+    bucket = time_bucket(Event.created_at, 'postgresql', 'month')
+    sql = str(bucket.compile(dialect=postgresql.dialect(),
+                             compile_kwargs={'literal_binds': True}))
+
+    assert sql == "to_char(date_trunc('month', event.created_at), 'YYYY-MM')"
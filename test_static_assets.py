@@ -0,0 +1,86 @@
+#!/usr/bin/env python3
+"""
+Tests for content-hashed static asset URLs in utils/static_assets.py
+"""
+import json
+import os
+
+from flask import Flask, url_for
+
+from utils.static_assets import IMMUTABLE_CACHE_CONTROL, REVALIDATE_CACHE_CONTROL, init_static_assets
+
+
+def make_app(tmp_path):
+    static_dir = tmp_path / 'static'
+    (static_dir / 'css').mkdir(parents=True)
+    (static_dir / 'css' / 'custom.css').write_text('body { color: #0066FF; }')
+    (static_dir / 'service-worker.js').write_text('self.addEventListener("fetch", () => {});')
+    app = Flask(__name__, static_folder=str(static_dir))
+    init_static_assets(app)
+    return app, static_dir
+
+
+def test_url_contains_content_hash_and_is_served_immutable(tmp_path):
+    app, _ = make_app(tmp_path)
+    with app.test_request_context():
+        url = url_for('static', filename='css/custom.css')
+
+    assert url.startswith('/static/css/custom.') and url.endswith('.css') and url != '/static/css/custom.css'
+    response = app.test_client().get(url)
+    assert response.status_code == 200
+    assert response.headers['Cache-Control'] == IMMUTABLE_CACHE_CONTROL
+    assert response.data == b'body { color: #0066FF; }'
+
+
+def test_hash_changes_with_content(tmp_path):
+    app, static_dir = make_app(tmp_path)
+    with app.test_request_context():
+        old_url = url_for('static', filename='css/custom.css')
+        css = static_dir / 'css' / 'custom.css'
+        css.write_text('body { color: red; }')
+        os.utime(css, ns=(0, os.stat(css).st_mtime_ns + 1_000_000_000))
+        new_url = url_for('static', filename='css/custom.css')
+
+    assert new_url != old_url
+    # Stary adres nadal działa, ale bez cache immutable
+    response = app.test_client().get(old_url)
+    assert response.data == b'body { color: red; }'
+    assert response.headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+
+
+def test_plain_name_revalidates_with_etag(tmp_path):
+    app, _ = make_app(tmp_path)
+    client = app.test_client()
+
+    response = client.get('/static/css/custom.css')
+    assert response.headers['Cache-Control'] == REVALIDATE_CACHE_CONTROL
+    assert client.get('/static/css/custom.css',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+
+def test_service_worker_keeps_stable_url(tmp_path):
+    app, _ = make_app(tmp_path)
+    with app.test_request_context():
+        assert url_for('static', filename='service-worker.js') == '/static/service-worker.js'
+
+
+def test_service_worker_route_embeds_hashed_precache_and_version(tmp_path):
+    app, static_dir = make_app(tmp_path)
+    client = app.test_client()
+
+    response = client.get('/service-worker.js')
+    assert response.status_code == 200
+    assert response.headers['Service-Worker-Allowed'] == '/'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    config = json.loads(response.get_data(as_text=True).split('\n', 1)[0]
+                        .removeprefix('self.__SW_CONFIG = ').rstrip(';'))
+    with app.test_request_context():
+        assert url_for('static', filename='css/custom.css') in config['precache']
+    assert client.get('/service-worker.js',
+                      headers={'If-None-Match': response.headers['ETag']}).status_code == 304
+
+    # Zmiana pliku z app shell zmienia wersję workera (nowy cache)
+    css = static_dir / 'css' / 'custom.css'
+    css.write_text('body { color: red; }')
+    os.utime(css, ns=(0, os.stat(css).st_mtime_ns + 1_000_000_000))
+    assert client.get('/service-worker.js').headers['ETag'] != response.headers['ETag']
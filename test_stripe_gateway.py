@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+"""
+Tests for the Stripe gateway in utils/stripe_gateway.py, run against the
+local Stripe stub server from stripe_stub.py
+"""
+import pytest
+
+from utils.stripe_gateway import CHECKOUT_REUSE_SECONDS, StripeGateway
+from stripe_stub import StubServer, parse_stripe_form
+
+CHECKOUT_PARAMS = dict(
+    customer='cus_test',
+    line_items=[{'price_data': {'currency': 'pln', 'unit_amount': 1900,
+                                'product_data': {'name': 'Jednorazowa optymalizacja CV'}},
+                 'quantity': 1}],
+    mode='payment',
+    success_url='http://localhost/payment-success?session_id={CHECKOUT_SESSION_ID}',
+    cancel_url='http://localhost/pricing',
+    metadata={'user_id': '1', 'payment_type': 'single_cv'},
+)
+
+
+@pytest.fixture
+def stub():
+    with StubServer() as server:
+        yield server
+
+
+@pytest.fixture(autouse=True)
+def stripe_globals(monkeypatch):
+    """StripeGateway konfiguruje globalny moduł stripe - monkeypatch przywraca go po teście"""
+    import stripe
+    for name in ('api_key', 'api_base', 'default_http_client', 'max_network_retries'):
+        monkeypatch.setattr(stripe, name, getattr(stripe, name))
+
+
+@pytest.fixture
+def gateway(stub):
+    return StripeGateway('sk_test_stub', api_base=stub.url, timeout=5)
+
+
+def test_open_checkout_session_is_reused(stub, gateway):
+    first = gateway.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+    second = gateway.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+
+    assert first.id == second.id
+    assert first.amount_total == 1900
+    assert stub.stub.requests['POST /v1/checkout/sessions'] == 1
+
+
+def test_other_process_gets_same_session_through_idempotency_key(stub, gateway):
+    other_process = StripeGateway('sk_test_stub', api_base=stub.url, clock=gateway.clock)
+
+    first = gateway.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+    second = other_process.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+
+    assert first.id == second.id
+    assert len([obj for obj in stub.stub.objects.values() if obj['object'] == 'checkout.session']) == 1
+
+
+def test_new_session_after_payment_or_reuse_window(stub, gateway):
+    first = gateway.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+    # Po płatności rośnie wersja uprawnień użytkownika
+    after_payment = gateway.open_checkout_session(1, 'single_cv', 1, **CHECKOUT_PARAMS)
+    later = StripeGateway('sk_test_stub', api_base=stub.url,
+                          clock=lambda: gateway.clock() + CHECKOUT_REUSE_SECONDS)
+    next_window = later.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+
+    assert len({first.id, after_payment.id, next_window.id}) == 3
+
+
+def test_paid_session_is_cached_but_open_session_is_not(stub, gateway):
+    session = gateway.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+
+    assert gateway.checkout_session(session.id).status == 'open'
+    stub.stub.complete_checkout_session(session.id)
+    assert gateway.checkout_session(session.id).payment_status == 'paid'
+    gateway.checkout_session(session.id)
+
+    assert stub.stub.requests['GET /v1/checkout/sessions/:id'] == 2
+
+
+def test_subscription_is_expanded_in_session(stub, gateway):
+    params = dict(CHECKOUT_PARAMS, mode='subscription')
+    session = gateway.open_checkout_session(1, 'monthly_package', 0, **params)
+    stub.stub.complete_checkout_session(session.id)
+
+    expanded = gateway.checkout_session(session.id, expand=['subscription'])
+
+    assert expanded.subscription.status == 'active'
+    assert expanded.subscription['items']['data'][0]['price']['unit_amount'] == 1900
+
+
+def test_stub_parses_nested_stripe_form_keys():
+    from werkzeug.datastructures import MultiDict
+
+    form = MultiDict([('metadata[user_id]', '1'), ('line_items[0][quantity]', '1'),
+                      ('line_items[0][price_data][currency]', 'pln'), ('expand[]', 'subscription')])
+
+    assert parse_stripe_form(form) == {
+        'metadata': {'user_id': '1'},
+        'line_items': [{'quantity': '1', 'price_data': {'currency': 'pln'}}],
+        'expand': ['subscription'],
+    }
+
+
+def test_paid_session_is_not_reused_before_webhook_updates_version(stub, gateway):
+    other_process = StripeGateway('sk_test_stub', api_base=stub.url, clock=gateway.clock)
+    first = gateway.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+    stub.stub.complete_checkout_session(first.id)
+
+    # Wersja uprawnień jeszcze się nie zmieniła (webhook czeka w skrzynce)
+    same_process = gateway.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+    replayed = other_process.open_checkout_session(1, 'single_cv', 0, **CHECKOUT_PARAMS)
+
+    assert same_process.status == replayed.status == 'open'
+    assert len({first.id, same_process.id, replayed.id}) == 3
@@ -0,0 +1,123 @@
+# -*- coding: utf-8 -*-
+"""
+Kontrola przyjmowania zapytań AI (admission control) i zrzucanie obciążenia
+
+Zapytanie do modelu AI potrafi trwać ponad minutę i przez cały ten czas
+trzyma połączenie z bazy z puli workera. Bez limitu awaria lub spowolnienie
+OpenRouter zajmuje całą pulę i przestają działać także tanie strony
+(/dashboard, /health). Kontroler (na proces):
+
+- przepuszcza najwyżej max_in_flight równoczesnych zapytań AI,
+- kolejne czekają w krótkiej kolejce (queue_timeout, max_queued), a potem
+  dostają odmowę z Retry-After zamiast wisieć do timeoutu gunicorn,
+- gdy mediana czasu ostatnich wywołań modelu (measure()) przekracza
+  slow_latency, limit spada o połowę - mniej zapytań czeka na wolny upstream.
+"""
+import math
+import statistics
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+LATENCY_SAMPLES = 20
+MIN_RETRY_AFTER_SECONDS = 5
+MAX_RETRY_AFTER_SECONDS = 60
+
+
+class AdmissionRejected(Exception):
+    """Brak miejsca na kolejne zapytanie AI"""
+
+    def __init__(self, retry_after, reason):
+        super().__init__(reason)
+        self.retry_after = retry_after
+        self.reason = reason
+
+
+class AdmissionController:
+
+    def __init__(self, max_in_flight, queue_timeout=5.0, max_queued=None, slow_latency=30.0,
+                 clock=time.monotonic):
+        self.max_in_flight = max(1, max_in_flight)
+        self.queue_timeout = queue_timeout
+        self.max_queued = self.max_in_flight if max_queued is None else max_queued
+        self.slow_latency = slow_latency
+        self.clock = clock
+        self._condition = threading.Condition()
+        self._in_flight = 0
+        self._queued = 0
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.admitted = 0
+        self.rejected = 0
+
+    def median_latency(self):
+        return statistics.median(self._latencies) if self._latencies else 0.0
+
+    def limit(self):
+        """Bieżący limit równoczesnych zapytań - połowa przy wolnym upstreamie"""
+        if self._latencies and self.median_latency() > self.slow_latency:
+            return max(1, self.max_in_flight // 2)
+        return self.max_in_flight
+
+    def retry_after(self):
+        return min(MAX_RETRY_AFTER_SECONDS,
+                   max(MIN_RETRY_AFTER_SECONDS, math.ceil(self.median_latency() / 2)))
+
+    def acquire(self):
+        """Zajmuje miejsce albo rzuca AdmissionRejected (po czasie oczekiwania w kolejce)"""
+        with self._condition:
+            if self._in_flight < self.limit():
+                self._in_flight += 1
+                self.admitted += 1
+                return
+            if self._queued >= self.max_queued or self.queue_timeout <= 0:
+                self.rejected += 1
+                raise AdmissionRejected(self.retry_after(), 'queue full')
+
+            self._queued += 1
+            deadline = self.clock() + self.queue_timeout
+            try:
+                while self._in_flight >= self.limit():
+                    remaining = deadline - self.clock()
+                    if remaining <= 0:
+                        self.rejected += 1
+                        raise AdmissionRejected(self.retry_after(), 'queue timeout')
+                    self._condition.wait(remaining)
+                self._in_flight += 1
+                self.admitted += 1
+            finally:
+                self._queued -= 1
+
+    def release(self):
+        with self._condition:
+            self._in_flight -= 1
+            self._condition.notify()
+
+    def record_latency(self, latency):
+        with self._condition:
+            self._latencies.append(latency)
+
+    @contextmanager
+    def measure(self):
+        """
+        Mierzy samo wywołanie modelu. Szybkie wyjścia z widoku (walidacja, brak
+        kredytów) nie są próbkami - zaniżałyby medianę przy wolnym upstreamie.
+        """
+        started = self.clock()
+        try:
+            yield
+        finally:
+            self.record_latency(self.clock() - started)
+
+    def snapshot(self):
+        with self._condition:
+            return {
+                'in_flight': self._in_flight,
+                'queued': self._queued,
+                'limit': self.limit(),
+                'max_in_flight': self.max_in_flight,
+                'median_latency_s': round(self.median_latency(), 2),
+                'admitted': self.admitted,
+                'rejected': self.rejected,
+            }
+
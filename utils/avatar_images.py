@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+"""
+Miniatury awatarów
+
+Przesłany obraz jest od razu przycinany do kwadratu i zapisywany w kilku
+rozmiarach (WebP) pod nazwami ze skrótem treści: <skrót>_<rozmiar>.webp.
+W User.avatar_filename trafia <skrót>.webp, a szablony wybierają rozmiar przez
+avatar_url(). Nazwa zmienia się razem z obrazem, więc miniatury mogą być
+cache'owane bezterminowo. Starsze awatary (oryginalne pliki) nadal działają.
+"""
+import hashlib
+import io
+import os
+import re
+
+AVATAR_SIZES = (64, 128, 256)
+AVATAR_FORMAT = 'webp'
+AVATAR_QUALITY = 82
+# Większe obrazy są odrzucane przed dekodowaniem (ochrona przed "bombami" pikseli)
+MAX_SOURCE_PIXELS = 40_000_000
+
+_AVATAR_NAME_RE = re.compile(r'^(?P<digest>[0-9a-f]{24})\.' + AVATAR_FORMAT + r'$')
+_THUMBNAIL_NAME_RE = re.compile(r'^[0-9a-f]{24}_(?:' + '|'.join(map(str, AVATAR_SIZES)) + r')\.'
+                                + AVATAR_FORMAT + r'$')
+
+
+class AvatarImageError(ValueError):
+    """Plik nie jest poprawnym obrazem"""
+
+
+def is_avatar_set(avatar_filename):
+    """Czy nazwa oznacza zestaw miniatur (a nie starszy, oryginalny plik)"""
+    return bool(avatar_filename and _AVATAR_NAME_RE.match(avatar_filename))
+
+
+def is_thumbnail(filename):
+    return bool(_THUMBNAIL_NAME_RE.match(filename))
+
+
+def thumbnail_filename(avatar_filename, size):
+    """Nazwa pliku miniatury w danym rozmiarze (najbliższy nie mniejszy z AVATAR_SIZES)"""
+    size = next((s for s in AVATAR_SIZES if s >= size), AVATAR_SIZES[-1])
+    digest = _AVATAR_NAME_RE.match(avatar_filename).group('digest')
+    return f"{digest}_{size}.{AVATAR_FORMAT}"
+
+
+def thumbnail_filenames(avatar_filename):
+    return [thumbnail_filename(avatar_filename, size) for size in AVATAR_SIZES]
+
+
+def make_thumbnails(data):
+    """
+    Zwraca (avatar_filename, {nazwa_pliku: bajty}) dla obrazu w data.
+    Rzuca AvatarImageError, gdy data nie jest obsługiwanym obrazem.
+    """
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(io.BytesIO(data)) as image:
+            if image.width * image.height > MAX_SOURCE_PIXELS:
+                raise AvatarImageError("Obraz ma zbyt dużą rozdzielczość")
+            image.load()
+            image = ImageOps.exif_transpose(image)
+    except (UnidentifiedImageError, OSError, Image.DecompressionBombError) as e:
+        raise AvatarImageError(f"Nieprawidłowy plik obrazu: {e}") from e
+
+    # GIF/paleta -> RGBA (zachowanie przezroczystości), pozostałe -> RGB
+    has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+    image = image.convert('RGBA' if has_alpha else 'RGB')
+
+    digest = hashlib.sha256(data).hexdigest()[:24]
+    avatar_filename = f"{digest}.{AVATAR_FORMAT}"
+    thumbnails = {}
+    for size in AVATAR_SIZES:
+        thumbnail = ImageOps.fit(image, (size, size), Image.Resampling.LANCZOS)
+        buffer = io.BytesIO()
+        thumbnail.save(buffer, AVATAR_FORMAT.upper(), quality=AVATAR_QUALITY, method=6)
+        thumbnails[thumbnail_filename(avatar_filename, size)] = buffer.getvalue()
+    return avatar_filename, thumbnails
+
+
+def save_thumbnails(folder, data):
+    """Tworzy miniatury i zapisuje brakujące pliki w folder; zwraca avatar_filename"""
+    avatar_filename, thumbnails = make_thumbnails(data)
+    os.makedirs(folder, exist_ok=True)
+    for filename, content in thumbnails.items():
+        path = os.path.join(folder, filename)
+        if os.path.exists(path):
+            continue  # ten sam obraz - te same pliki
+        tmp_path = f"{path}.tmp{os.getpid()}"
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+    return avatar_filename
@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""
+Zadanie w tle w procesie aplikacji
+
+Wątek (pod gevent: greenlet) wykonuje funkcję po wybudzeniu przez wake() albo
+co interval sekund. Wątek startuje leniwie w procesie, który go potrzebuje -
+po fork() w gunicorn każdy worker uruchamia własny.
+"""
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+
+class BackgroundWorker:
+
+    def __init__(self, name, target, interval=60.0):
+        self.name = name
+        self.target = target
+        self.interval = interval
+        self._wakeup = threading.Event()
+        self._lock = threading.Lock()
+        self._pid = None
+
+    def start(self):
+        """Uruchamia wątek, jeśli nie działa jeszcze w tym procesie"""
+        if self._pid == os.getpid():
+            return
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            thread = threading.Thread(target=self._run, name=self.name, daemon=True)
+            thread.start()
+            self._pid = os.getpid()
+            logger.info(f"Background worker {self.name} started (pid {self._pid})")
+
+    def wake(self):
+        """Zleca natychmiastowe wykonanie (bez czekania na kolejny interwał)"""
+        self.start()
+        self._wakeup.set()
+
+    def _run(self):
+        while True:
+            self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            try:
+                self.target()
+            except Exception as e:
+                logger.error(f"Background worker {self.name} failed: {str(e)}")
@@ -0,0 +1,107 @@
+# -*- coding: utf-8 -*-
+"""
+Kompresowany typ kolumny dla dużych tekstów (CV, wyniki AI)
+
+Wartości zapisywane są jako BLOB/bytea z nagłówkiem: bajt NUL + bajt wersji.
+Tekst w PostgreSQL nie może zawierać bajtu NUL, więc wiersze zapisane przed
+kompresją (zwykły tekst lub bajty UTF-8 po zmianie typu kolumny) są
+rozpoznawane bez nagłówka i odczytywane bez zmian.
+"""
+import zlib
+
+from sqlalchemy import LargeBinary, select, type_coerce, update
+from sqlalchemy.types import TypeDecorator
+
+_HEADER = b'\x00'
+FORMAT_STORED = 0  # bez kompresji - krótkie lub nieściśliwe wartości
+FORMAT_ZLIB = 1
+
+# Krótsze wartości nie zyskują na kompresji (nagłówek zlib ~ 11 bajtów)
+MIN_COMPRESS_SIZE = 256
+ZLIB_LEVEL = 6
+
+
+def compress_text(value):
+    """Zwraca bajty z nagłówkiem wersji dla tekstu"""
+    raw = value.encode('utf-8')
+    if len(raw) >= MIN_COMPRESS_SIZE:
+        compressed = zlib.compress(raw, ZLIB_LEVEL)
+        if len(compressed) < len(raw):
+            return _HEADER + bytes((FORMAT_ZLIB,)) + compressed
+    return _HEADER + bytes((FORMAT_STORED,)) + raw
+
+
+def is_compressed(raw):
+    """Czy wartość z bazy ma już nagłówek formatu"""
+    return isinstance(raw, (bytes, bytearray, memoryview)) and bytes(raw[:1]) == _HEADER
+
+
+def decompress_text(raw):
+    """Odtwarza tekst z wartości kolumny (również sprzed wprowadzenia kompresji)"""
+    if isinstance(raw, str):
+        return raw
+    raw = bytes(raw)
+    if raw[:1] != _HEADER:
+        return raw.decode('utf-8')
+
+    version, payload = raw[1], raw[2:]
+    if version == FORMAT_ZLIB:
+        return zlib.decompress(payload).decode('utf-8')
+    if version == FORMAT_STORED:
+        return payload.decode('utf-8')
+    raise ValueError(f"Nieznany format skompresowanego tekstu: {version}")
+
+
+class CompressedText(TypeDecorator):
+    """Tekst kompresowany zlib po stronie aplikacji - przezroczysty dla modeli i szablonów"""
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        return compress_text(value)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        return decompress_text(value)
+
+
+def compressed_columns(metadata):
+    """Kolumny typu CompressedText we wszystkich tabelach metadanych"""
+    return [(table, column) for table in metadata.sorted_tables
+            for column in table.columns if isinstance(column.type, CompressedText)]
+
+
+def backfill_compressed_columns(engine, metadata, batch_size=200):
+    """
+    Kompresuje wartości zapisane przed wprowadzeniem CompressedText.
+    Przetwarza wiersze partiami po kluczu głównym; można przerwać i wznowić.
+    Zwraca słownik {tabela.kolumna: liczba skompresowanych wartości}.
+    """
+    results = {}
+    for table, column in compressed_columns(metadata):
+        primary_key = list(table.primary_key.columns)[0]
+        raw_column = type_coerce(column, LargeBinary)
+        converted = 0
+        last_id = None
+        while True:
+            query = select(primary_key, raw_column).where(column.isnot(None))
+            if last_id is not None:
+                query = query.where(primary_key > last_id)
+            with engine.begin() as conn:
+                rows = conn.execute(query.order_by(primary_key).limit(batch_size)).all()
+                for row_id, raw in rows:
+                    if is_compressed(raw):
+                        continue
+                    conn.execute(
+                        update(table).where(primary_key == row_id).values(
+                            {column.name: type_coerce(compress_text(decompress_text(raw)),
+                                                      LargeBinary)}))
+                    converted += 1
+            if len(rows) < batch_size:
+                break
+            last_id = rows[-1][0]
+        results[f'{table.name}.{column.name}'] = converted
+    return results
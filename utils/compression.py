@@ -0,0 +1,93 @@
+# -*- coding: utf-8 -*-
+"""
+Kompresja odpowiedzi HTTP (gzip, brotli jeśli zainstalowany)
+
+Kompresowane są tylko buforowane odpowiedzi tekstowe powyżej progu rozmiaru.
+Odpowiedzi strumieniowe (w tym SSE - text/event-stream) i pliki wysyłane przez
+send_file przechodzą bez zmian, więc strumień nie jest buforowany.
+"""
+import gzip
+
+from flask import request
+
+try:
+    import brotli
+except ImportError:  # brotli jest opcjonalny - wtedy tylko gzip
+    brotli = None
+
+COMPRESSIBLE_MIMETYPES = frozenset({
+    'text/html', 'text/css', 'text/plain', 'text/javascript', 'text/xml',
+    'application/json', 'application/javascript', 'application/xml',
+    'application/manifest+json', 'image/svg+xml',
+})
+
+# Poniżej ~1 KB narzut nagłówków i CPU przewyższa zysk
+MIN_COMPRESS_SIZE = 1024
+
+# Poziomy dla odpowiedzi dynamicznych (szybkie) i plików statycznych (kompresowane raz)
+DYNAMIC_LEVELS = {'br': 4, 'gzip': 6}
+STATIC_LEVELS = {'br': 11, 'gzip': 9}
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+def negotiate_encoding(accept_encodings):
+    """Najlepsze kodowanie akceptowane przez klienta (werkzeug Accept) lub None"""
+    best, best_quality = None, 0
+    for encoding in available_encodings():
+        quality = accept_encodings[encoding]
+        if quality > best_quality:
+            best, best_quality = encoding, quality
+    return best
+
+
+def is_compressible(mimetype):
+    return mimetype in COMPRESSIBLE_MIMETYPES
+
+
+def compress(data, encoding, level=None):
+    if encoding == 'br':
+        return brotli.compress(data, quality=DYNAMIC_LEVELS['br'] if level is None else level)
+    if encoding == 'gzip':
+        # mtime=0 - ten sam wynik dla tej samej treści (stabilny ETag)
+        return gzip.compress(data, DYNAMIC_LEVELS['gzip'] if level is None else level, mtime=0)
+    raise ValueError(f"Nieobsługiwane kodowanie: {encoding}")
+
+
+def compress_response(response, accept_encodings, min_size=MIN_COMPRESS_SIZE):
+    """Kompresuje odpowiedź Flask w miejscu, jeśli to możliwe i opłacalne"""
+    if (response.direct_passthrough or response.is_streamed
+            or not is_compressible(response.mimetype)
+            or 'Content-Encoding' in response.headers
+            or response.status_code < 200 or response.status_code in (204, 206, 304)):
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = negotiate_encoding(accept_encodings)
+    if encoding is None:
+        return response
+    data = response.get_data()
+    if len(data) < min_size:
+        return response
+
+    response.set_data(compress(data, encoding))
+    response.headers['Content-Encoding'] = encoding
+    etag, weak = response.get_etag()
+    if etag:
+        response.set_etag(f"{etag}-{encoding}", weak)
+    return response
+
+
+def init_compression(app, min_size=MIN_COMPRESS_SIZE):
+    """Rejestruje kompresję odpowiedzi dla aplikacji"""
+
+    @app.after_request
+    def compress_after_request(response):
+        etag = response.get_etag()[0]
+        response = compress_response(response, request.accept_encodings, min_size)
+        # Widok sprawdził If-None-Match wobec ETagu sprzed kompresji - ponownie, wobec nowego
+        if etag and response.get_etag()[0] != etag:
+            response.make_conditional(request)
+        return response
@@ -0,0 +1,120 @@
+# -*- coding: utf-8 -*-
+import json
+from dataclasses import dataclass, field
+from typing import List
+
+# Zmiana struktury lub parsera unieważnia zapisane dokumenty
+CV_DOCUMENT_VERSION = 1
+
+
+@dataclass(slots=True)
+class ExperienceItem:
+    """Pojedyncze stanowisko w doświadczeniu zawodowym"""
+    position: str = ''
+    company: str = ''
+    period: str = ''
+    responsibilities: List[str] = field(default_factory=list)
+
+    def to_dict(self):
+        return {
+            'position': self.position,
+            'company': self.company,
+            'period': self.period,
+            'responsibilities': list(self.responsibilities)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('position', ''), data.get('company', ''),
+                   data.get('period', ''), list(data.get('responsibilities', ())))
+
+
+@dataclass(slots=True)
+class EducationItem:
+    """Pojedynczy element wykształcenia"""
+    title: str = ''
+    institution: str = ''
+    period: str = ''
+
+    def to_dict(self):
+        return {
+            'title': self.title,
+            'institution': self.institution,
+            'period': self.period
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(data.get('title', ''), data.get('institution', ''),
+                   data.get('period', ''))
+
+
+@dataclass(slots=True)
+class CVDocument:
+    """
+    Strukturalne dane CV - wynik parsowania zapisywany obok CVUpload
+    i używany ponownie przez szablony bez ponownego parsowania tekstu
+    """
+    name: str = ''
+    subtitle: str = ''
+    phone: str = ''
+    email: str = ''
+    location: str = ''
+    summary: str = ''
+    skills: List[str] = field(default_factory=list)
+    education: List[EducationItem] = field(default_factory=list)
+    experience: List[ExperienceItem] = field(default_factory=list)
+    interests: List[str] = field(default_factory=list)
+    additional_info: List[str] = field(default_factory=list)
+
+    def to_dict(self):
+        """Zwraca strukturę zgodną z wynikiem parse_cv_to_structured_data"""
+        return {
+            'name': self.name,
+            'subtitle': self.subtitle,
+            'phone': self.phone,
+            'email': self.email,
+            'location': self.location,
+            'summary': self.summary,
+            'skills': list(self.skills),
+            'education': [edu.to_dict() for edu in self.education],
+            'experience': [exp.to_dict() for exp in self.experience],
+            'interests': list(self.interests),
+            'additional_info': list(self.additional_info)
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls(
+            data.get('name', ''),
+            data.get('subtitle', ''),
+            data.get('phone', ''),
+            data.get('email', ''),
+            data.get('location', ''),
+            data.get('summary', ''),
+            list(data.get('skills', ())),
+            [EducationItem.from_dict(edu) for edu in data.get('education', ())],
+            [ExperienceItem.from_dict(exp) for exp in data.get('experience', ())],
+            list(data.get('interests', ())),
+            list(data.get('additional_info', ()))
+        )
+
+    def template_context(self):
+        """
+        Płytki słownik pól dla szablonu - elementy listy zostają obiektami
+        (Jinja odczytuje exp.position tak samo jak dla słowników)
+        """
+        return {name: getattr(self, name) for name in self.__slots__}
+
+    def to_json(self):
+        data = self.to_dict()
+        data['version'] = CV_DOCUMENT_VERSION
+        return json.dumps(data, ensure_ascii=False, separators=(',', ':'))
+
+    @classmethod
+    def from_json(cls, raw):
+        """Odtwarza dokument z JSON; zwraca None dla nieaktualnej wersji"""
+        data = json.loads(raw)
+        if data.get('version') != CV_DOCUMENT_VERSION:
+            return None
+        return cls.from_dict(data)
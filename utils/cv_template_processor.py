@@ -2,11 +2,168 @@
 # -*- coding: utf-8 -*-
 import re
 import json
-from flask import render_template_string
+from flask import render_template
+from jinja2 import TemplateNotFound
 import logging
+from utils.keyword_matcher import KeywordMatcher
+from utils.cv_model import CVDocument
 
 logger = logging.getLogger(__name__)
 
+# Szablon CV ładowany przez loader Jinja aplikacji - kompilowany raz na proces
+CV_TEMPLATE_NAME = 'cv_template.html'
+
+# Markery sekcji CV z różnymi wariantami (kolejność = priorytet dopasowania częściowego)
+SECTION_MARKERS = {
+    'streszczenie': 'summary',
+    'profil': 'summary',
+    'profil zawodowy': 'summary',
+    'o mnie': 'summary',
+    'opis': 'summary',
+    'cel zawodowy': 'summary',
+    'podsumowanie': 'summary',
+    'podsumowanie zawodowe': 'summary',
+    'umiejętności': 'skills',
+    'kompetencje': 'skills',
+    'skills': 'skills',
+    'technologie': 'skills',
+    'narzędzia': 'skills',
+    'języki programowania': 'skills',
+    'techniczne': 'skills',
+    'komunikacyjne': 'skills',
+    'doświadczenie': 'experience',
+    'doświadczenie zawodowe': 'experience',
+    'praca': 'experience',
+    'historia zatrudnienia': 'experience',
+    'kariera': 'experience',
+    'work experience': 'experience',
+    'zatrudnienie': 'experience',
+    'wykształcenie': 'education',
+    'edukacja': 'education',
+    'education': 'education',
+    'szkoły': 'education',
+    'studia': 'education',
+    'kursy': 'education',
+    'certyfikaty': 'education',
+    'zainteresowania': 'interests',
+    'hobby': 'interests',
+    'interests': 'interests',
+    'pasje': 'interests',
+    'dodatkowe': 'additional_info',
+    'dodatkowe informacje': 'additional_info',
+    'inne': 'additional_info',
+    'projekty': 'additional_info',
+    'osiągnięcia': 'additional_info',
+    'informacje dodatkowe': 'additional_info',
+    # Warianty angielskie
+    'summary': 'summary',
+    'about me': 'summary',
+    'professional experience': 'experience',
+    'employment history': 'experience',
+    'certifications': 'education',
+    'courses': 'education',
+    'hobbies': 'interests',
+    'projects': 'additional_info',
+    'achievements': 'additional_info',
+    'additional information': 'additional_info'
+}
+
+# Słowa kluczowe lokalizacji (miasta, regiony)
+LOCATION_KEYWORDS = [
+    'warszawa', 'kraków', 'poznań', 'wrocław', 'gdańsk', 'łódź', 'katowice',
+    'szczecin', 'bydgoszcz', 'lublin', 'białystok', 'częstochowa', 'radom',
+    'sosnowiec', 'toruń', 'kielce', 'gliwice', 'zabrze', 'bytom', 'bielsko',
+    'polska', 'poland', 'mazowieckie', 'małopolskie', 'śląskie',
+    'gdynia', 'sopot', 'rzeszów', 'olsztyn', 'opole', 'zielona góra', 'gorzów',
+    'płock', 'elbląg', 'tarnów', 'koszalin', 'legnica', 'kalisz', 'rybnik', 'tychy',
+    'pomorskie', 'wielkopolskie', 'dolnośląskie', 'łódzkie', 'lubelskie', 'podkarpackie',
+    'podlaskie', 'warmińsko-mazurskie', 'świętokrzyskie', 'opolskie', 'lubuskie',
+    'warsaw', 'krakow', 'cracow', 'wroclaw', 'poznan', 'gdansk', 'lodz'
+]
+
+RESPONSIBILITY_MARKERS = ('-', '•', '*', '▸', '→', '◦', '–', '‒', '✓', '+')
+
+# Wzorce kompilowane raz przy imporcie modułu - parser nie buduje regexów per linia
+_UPPER = 'A-ZĄĆĘŁŃÓŚŹŻ'
+_LOWER = 'a-ząćęłńóśźż'
+
+_NAME_RE = re.compile(
+    rf'^(?:[{_UPPER}][{_LOWER}]+\s+[{_UPPER}][{_LOWER}]+'                       # Jan Kowalski
+    rf'|[{_UPPER}][{_LOWER}]+\s+[{_UPPER}]\.\s+[{_UPPER}][{_LOWER}]+'            # Jan M. Kowalski
+    r'|[A-Z][a-z]+\s+[A-Z][a-z]+)$'                                              # John Smith
+)
+
+_EMAIL_RE = re.compile(r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b', re.IGNORECASE)
+
+# Kolejność ma znaczenie - pierwszy wzorzec z dopasowaniem wygrywa
+_PHONE_RES = (
+    re.compile(r'(?:\+48[\s-]?)?(?:\d{3}[\s-]?\d{3}[\s-]?\d{3})'),             # +48 123 456 789
+    re.compile(r'(?:\+48[\s-]?)?(?:\d{2}[\s-]?\d{3}[\s-]?\d{2}[\s-]?\d{2})'),  # +48 12 345 67 89
+    re.compile(r'(?:\+48[\s-]?)?\(?\d{2,3}\)?[\s-]?\d{3}[\s-]?\d{3}'),          # (12) 345 678
+    re.compile(r'\b\d{9}\b'),                                                   # 123456789
+)
+
+# Rodzaje słów kluczowych we wspólnym automacie
+_SECTION = 'section'
+_LOCATION = 'location'
+
+
+def build_keyword_matcher(section_markers, location_keywords):
+    """
+    Buduje jeden automat Aho–Corasick dla markerów sekcji i słów kluczowych lokalizacji
+    
+    Wartość trafienia to (rodzaj, priorytet, sekcja) - priorytet markera to jego
+    pozycja w słowniku, używana gdy linia zawiera kilka markerów.
+    """
+    matcher = KeywordMatcher()
+    for priority, (marker, section) in enumerate(section_markers.items()):
+        matcher.add(marker, (_SECTION, priority, section))
+    for keyword in location_keywords:
+        matcher.add(keyword, (_LOCATION, 0, None))
+    return matcher
+
+
+# Budowany raz przy imporcie; jedno przejście po linii znajduje wszystkie słowa kluczowe
+_KEYWORD_MATCHER = build_keyword_matcher(SECTION_MARKERS, LOCATION_KEYWORDS)
+
+_YEAR_RE = re.compile(r'\d{4}')
+
+_EXPERIENCE_SEPARATOR_RE = re.compile(r'^[-–—]{3}\s*stanowisko\s*[-–—]{3}', re.IGNORECASE)
+
+# Wzorce które mogą oznaczać początek nowego doświadczenia
+_JOB_TITLE_RE = re.compile(
+    r'(?i:^[-–—]{3}\s*stanowisko\s*[-–—]{3})'                     # "--- STANOWISKO ---" (odporny separator)
+    rf'|^[{_UPPER}][{_LOWER}\s]+\|\s*[{_UPPER}]'                  # "Kurier | DHL"
+    rf'|^[{_UPPER}][{_LOWER}\s]+\s-\s[{_UPPER}]'                   # "Kurier - DHL"
+    rf'|^\*\*[{_UPPER}][{_LOWER}\s]+\*\*'                          # "**Kurier**"
+    rf'|^[{_UPPER}][{_LOWER}\s]+$'                                   # "Kurier" (samodzielnie)
+    rf'|^[{_UPPER}][{_LOWER}\s]*[{_UPPER}][{_LOWER}\s]*$'            # "Load Master"
+    r'|^[A-Z][a-z]+\s+[A-Z][a-z]+'                                 # "Load Master" (EN)
+    r'|^\*\*[A-Z][a-z\s]+\*\*'                                     # "**Load Master**"
+)
+
+# Wzorce dat które mogą oznaczać nowy okres pracy (sprawdzane na małych literach)
+_EXPERIENCE_DATE_RE = re.compile(
+    r'\d{4}[\s\-–]*(?:\d{4}|obecnie|obecnie.*|present|current)'
+    r'|\*\d{4}[\s\-–]*\d{4}\*'
+    r'|^\d{4}\s*[\-–]\s*\d{4}'
+    r'|^\d{4}\s*[\-–]\s*obecnie'
+)
+
+# Wszystkie formy okresu zatrudnienia (sprawdzane na małych literach)
+_PERIOD_RE = re.compile(
+    r'\d{4}[\s\-–]*(?:\d{4}|obecnie|obecnie.*|present|current)'  # 2020-2024, 2020-obecnie
+    r'|\d{1,2}[\./]\d{4}[\s\-–]*\d{1,2}[\./]\d{4}'               # 01/2020 - 12/2024
+    r'|(?:styczeń|luty|marzec|kwiecień|maj|czerwiec|lipiec|sierpień|wrzesień|październik|listopad|grudzień)[\s\-–]*\d{4}'
+    r'|(?:january|february|march|april|may|june|july|august|september|october|november|december)[\s\-–]*\d{4}'
+    r'|obecnie|present|current'
+)
+
+_EDUCATION_DATE_RE = re.compile(
+    r'\d{4}[\s-]*\d{4}'                                # 2020-2024
+    r'|\d{1,2}[\./]\d{4}[\s-]*\d{1,2}[\./]\d{4}'      # 01/2020 - 12/2024
+)
+
 def parse_cv_to_structured_data(cv_text):
     """
     Parsuje tekst CV i wyodrębnia strukturalne dane do szablonu
@@ -30,19 +187,15 @@ def parse_cv_to_structured_data(cv_text):
         # Wyczyść tekst i podziel na linie
         lines = [line.strip() for line in cv_text.strip().split('\n') if line.strip()]
         
-        # Ulepszone wyodrębnianie imienia i nazwiska
-        name_patterns = [
-            r'^([A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+\s+[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+)$',  # Jan Kowalski
-            r'^([A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+\s+[A-ZĄĆĘŁŃÓŚŹŻ]\.\s+[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż]+)$',  # Jan M. Kowalski
-            r'^([A-Z][a-z]+\s+[A-Z][a-z]+)$',  # John Smith
-        ]
+        # Markery sekcji i lokalizacje - jedno przejście automatu po każdej linii
+        # (nagłówki i lokalizacje są zawsze krótsze niż 60 znaków)
+        line_keywords = [_KEYWORD_MATCHER.find_all(line.lower()) if len(line) < 60 else []
+                         for line in lines]
         
+        # Ulepszone wyodrębnianie imienia i nazwiska
         for line in lines[:10]:  # Sprawdź pierwsze 10 linii
-            for pattern in name_patterns:
-                if re.match(pattern, line):
-                    cv_data['name'] = line
-                    break
-            if cv_data['name']:
+            if _NAME_RE.match(line):
+                cv_data['name'] = line
                 break
         
         # Jeśli nie znaleziono, szukaj w pierwszych 3 liniach
@@ -55,91 +208,28 @@ def parse_cv_to_structured_data(cv_text):
                         break
         
         # Ulepszone wyodrębnianie emaila
-        email_pattern = r'\b[A-Za-z0-9._%+-]+@[A-Za-z0-9.-]+\.[A-Z|a-z]{2,7}\b'
-        emails = re.findall(email_pattern, cv_text, re.IGNORECASE)
-        if emails:
-            cv_data['email'] = emails[0]
+        email_match = _EMAIL_RE.search(cv_text)
+        if email_match:
+            cv_data['email'] = email_match.group(0)
         
         # Ulepszone wyodrębnianie telefonu
-        phone_patterns = [
-            r'(?:\+48[\s-]?)?(?:\d{3}[\s-]?\d{3}[\s-]?\d{3})',  # +48 123 456 789
-            r'(?:\+48[\s-]?)?(?:\d{2}[\s-]?\d{3}[\s-]?\d{2}[\s-]?\d{2})',  # +48 12 345 67 89
-            r'(?:\+48[\s-]?)?\(?\d{2,3}\)?[\s-]?\d{3}[\s-]?\d{3}',  # (12) 345 678
-            r'\b\d{9}\b',  # 123456789
-        ]
-        
-        for pattern in phone_patterns:
-            phones = re.findall(pattern, cv_text)
-            if phones:
-                cv_data['phone'] = phones[0]
+        for phone_re in _PHONE_RES:
+            phone_match = phone_re.search(cv_text)
+            if phone_match:
+                cv_data['phone'] = phone_match.group(0)
                 break
         
         # Ulepszone wyodrębnianie lokalizacji
-        location_keywords = [
-            'warszawa', 'kraków', 'poznań', 'wrocław', 'gdańsk', 'łódź', 'katowice', 
-            'szczecin', 'bydgoszcz', 'lublin', 'białystok', 'częstochowa', 'radom',
-            'sosnowiec', 'toruń', 'kielce', 'gliwice', 'zabrze', 'bytom', 'bielsko',
-            'polska', 'poland', 'mazowieckie', 'małopolskie', 'śląskie'
-        ]
-        
-        for line in lines:
-            line_lower = line.lower()
-            for keyword in location_keywords:
-                if keyword in line_lower and len(line) < 50:  # Nie za długa linia
-                    cv_data['location'] = line.strip()
-                    break
-            if cv_data['location']:
+        for line, keywords in zip(lines, line_keywords):
+            if len(line) < 50 and any(kind == _LOCATION for _, _, (kind, _, _) in keywords):  # Nie za długa linia
+                cv_data['location'] = line.strip()
                 break
         
         # Ulepszone wyodrębnianie sekcji CV
         current_section = None
         current_content = []
         
-        # Rozszerzone markery sekcji z różnymi wariantami
-        section_markers = {
-            'streszczenie': 'summary',
-            'profil': 'summary',
-            'profil zawodowy': 'summary',
-            'o mnie': 'summary',
-            'opis': 'summary',
-            'cel zawodowy': 'summary',
-            'podsumowanie': 'summary',
-            'podsumowanie zawodowe': 'summary',
-            'umiejętności': 'skills',
-            'kompetencje': 'skills',
-            'skills': 'skills',
-            'technologie': 'skills',
-            'narzędzia': 'skills',
-            'języki programowania': 'skills',
-            'techniczne': 'skills',
-            'komunikacyjne': 'skills',
-            'doświadczenie': 'experience',
-            'doświadczenie zawodowe': 'experience',
-            'praca': 'experience',
-            'historia zatrudnienia': 'experience',
-            'kariera': 'experience',
-            'work experience': 'experience',
-            'zatrudnienie': 'experience',
-            'wykształcenie': 'education',
-            'edukacja': 'education',
-            'education': 'education',
-            'szkoły': 'education',
-            'studia': 'education',
-            'kursy': 'education',
-            'certyfikaty': 'education',
-            'zainteresowania': 'interests',
-            'hobby': 'interests',
-            'interests': 'interests',
-            'pasje': 'interests',
-            'dodatkowe': 'additional_info',
-            'dodatkowe informacje': 'additional_info',
-            'inne': 'additional_info',
-            'projekty': 'additional_info',
-            'osiągnięcia': 'additional_info',
-            'informacje dodatkowe': 'additional_info'
-        }
-        
-        for i, line in enumerate(lines):
+        for line, keywords in zip(lines, line_keywords):
             if not line:
                 continue
                 
@@ -148,18 +238,16 @@ def parse_cv_to_structured_data(cv_text):
             found_section = None
             
             # Dokładne dopasowanie
-            if line_lower in section_markers:
-                found_section = section_markers[line_lower]
-            else:
-                # Częściowe dopasowanie dla nagłówków sekcji
-                for marker, section in section_markers.items():
-                    if (marker in line_lower and 
-                        len(line) < 60 and 
-                        len(line.split()) <= 4 and
-                        not any(char in line for char in '@+()') and  # Nie telefon/email
-                        not re.search(r'\d{4}', line)):  # Nie data
-                        found_section = section
-                        break
+            if line_lower in SECTION_MARKERS:
+                found_section = SECTION_MARKERS[line_lower]
+            elif (len(line) < 60 and
+                  len(line.split()) <= 4 and
+                  not any(char in line for char in '@+()') and  # Nie telefon/email
+                  not _YEAR_RE.search(line)):  # Nie data
+                # Częściowe dopasowanie dla nagłówków sekcji (marker najwyżej w słowniku)
+                markers = [value for _, _, value in keywords if value[0] == _SECTION]
+                if markers:
+                    found_section = min(markers)[2]
             
             if found_section:
                 # Przetwórz poprzednią sekcję
@@ -230,78 +318,53 @@ def split_experience_entries(content):
     
     experiences = []
     current_experience = []
+    # Flagi bieżącej grupy aktualizowane przy dodawaniu linii - bez ponownego
+    # skanowania current_experience dla każdej kandydującej linii
+    has_responsibilities = False  # Jakakolwiek linia zaczyna się markerem obowiązku
+    has_company_or_date = False   # Linia (poza pierwszą) z datą lub firmą
     
-    # Wzorce które mogą oznaczać początek nowego doświadczenia
-    job_title_patterns = [
-        r'^[-–—]{3}\s*stanowisko\s*[-–—]{3}',                       # "--- STANOWISKO ---" (odporny separator)
-        r'^[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż\s]+\|\s*[A-ZĄĆĘŁŃÓŚŹŻ]',  # "Kurier | DHL"
-        r'^[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż\s]+\s-\s[A-ZĄĆĘŁŃÓŚŹŻ]',   # "Kurier - DHL" 
-        r'^\*\*[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż\s]+\*\*',              # "**Kurier**"
-        r'^[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż\s]+$',                       # "Kurier" (samodzielnie)
-        r'^[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż\s]*[A-ZĄĆĘŁŃÓŚŹŻ][a-ząćęłńóśźż\s]*$',  # "Load Master"
-        r'^[A-Z][a-z]+\s+[A-Z][a-z]+',                              # "Load Master" (EN)
-        r'^\*\*[A-Z][a-z\s]+\*\*'                                   # "**Load Master**"
-    ]
-    
-    # Wzorce dat które mogą oznaczać nowy okres pracy
-    date_patterns = [
-        r'\d{4}[\s\-–]*(?:\d{4}|obecnie|obecnie.*|present|current)',
-        r'\*\d{4}[\s\-–]*\d{4}\*',
-        r'^\d{4}\s*[\-–]\s*\d{4}',
-        r'^\d{4}\s*[\-–]\s*obecnie'
-    ]
-    
-    responsibility_markers = ['-', '•', '*', '▸', '→', '◦', '–', '‒', '✓', '+']
-    
-    for i, line in enumerate(content):
+    for line in content:
         line = line.strip()
         if not line:
             continue
+        
+        is_responsibility = line.startswith(RESPONSIBILITY_MARKERS)
+        # Data w linii obowiązku nie ma znaczenia - grupa z obowiązkiem ma już
+        # has_responsibilities, które samo rozstrzyga o podziale
+        is_date = not is_responsibility and _EXPERIENCE_DATE_RE.search(line.lower()) is not None
             
         # Sprawdź czy to początek nowego doświadczenia
         is_new_job = False
         
         # 1. Sprawdź wzorce stanowisk pracy
-        for pattern in job_title_patterns:
-            # Pierwszy wzorzec (separator) używa case-insensitive matching
-            if pattern.startswith(r'^[-–—]{3}'):
-                if re.match(pattern, line, re.IGNORECASE):
-                    is_new_job = True
-                    break
-            elif re.match(pattern, line):
-                is_new_job = True
-                break
+        if _JOB_TITLE_RE.match(line):
+            is_new_job = True
         
         # 2. Sprawdź czy linia wygląda jak stanowisko (nie zaczyna się od markera)
         if (not is_new_job and 
-            not any(line.startswith(marker) for marker in responsibility_markers) and
-            not any(re.search(pattern, line.lower()) for pattern in date_patterns) and
+            not is_responsibility and
+            not is_date and
             len(line) > 3 and len(line) < 80 and
             any(c.isupper() for c in line[:3])):  # Zaczyna się dużą literą
             
-            # Sprawdź czy poprzednia grupa ma już jakieś obowiązki (wtedy to prawdopodobnie nowe stanowisko)
+            # Poprzednia grupa ma już obowiązki albo firmę i datę (kompletne stanowisko)
             if current_experience:
-                has_responsibilities = any(
-                    any(resp_line.startswith(marker) for marker in responsibility_markers) 
-                    for resp_line in current_experience
-                )
-                # Również sprawdź czy poprzednia grupa ma już firmę i datę (kompletne stanowisko)
-                has_company_or_date = any(
-                    any(re.search(pattern, resp_line.lower()) for pattern in date_patterns) or
-                    (len(resp_line.split()) >= 2 and not any(resp_line.startswith(marker) for marker in responsibility_markers))
-                    for resp_line in current_experience[1:]  # Pomiń pierwszą linię (stanowisko)
-                )
-                
                 if has_responsibilities or (has_company_or_date and len(current_experience) > 2):
                     is_new_job = True
         
         # Jeśli to nowe stanowisko i mamy już jakieś dane, zapisz poprzednie
         if is_new_job and current_experience:
-            experiences.append(current_experience[:])
+            experiences.append(current_experience)
             current_experience = []
+            has_responsibilities = False
+            has_company_or_date = False
         
         # Nie dodawaj separatora do contentu (tylko używaj go do podziału)
-        if not re.match(r'^[-–—]{3}\s*stanowisko\s*[-–—]{3}', line, re.IGNORECASE):
+        if not _EXPERIENCE_SEPARATOR_RE.match(line):
+            if current_experience:  # Pierwsza linia (stanowisko) nie liczy się jako firma/data
+                has_company_or_date = has_company_or_date or is_date or (
+                    not is_responsibility and len(line.split()) >= 2)
+            has_responsibilities = has_responsibilities or is_responsibility
             current_experience.append(line)
     
     # Dodaj ostatnie doświadczenie
@@ -424,38 +487,26 @@ def parse_experience_item(content):
         exp['position'] = first_line
     
     # Szukaj daty, firmy i obowiązków
-    date_patterns = [
-        r'\d{4}[\s\-–]*(?:\d{4}|obecnie|obecnie.*|present|current)',  # 2020-2024, 2020-obecnie
-        r'\d{1,2}[\./]\d{4}[\s\-–]*\d{1,2}[\./]\d{4}',  # 01/2020 - 12/2024
-        r'(?:styczeń|luty|marzec|kwiecień|maj|czerwiec|lipiec|sierpień|wrzesień|październik|listopad|grudzień)[\s\-–]*\d{4}',
-        r'(?:january|february|march|april|may|june|july|august|september|october|november|december)[\s\-–]*\d{4}',
-        r'obecnie|present|current',
-        r'\d{4}[\s\-–]*obecnie',
-        r'\d{4}[\s\-–]*\d{4}'
-    ]
-    
-    responsibility_markers = ['-', '•', '*', '▸', '→', '◦', '–', '‒', '✓', '+']
-    
     for i, line in enumerate(content):
         line = line.strip()
         if not line or i == 0:  # Pomiń pierwszą linię (już przetworzoną)
             continue
             
         # Sprawdź czy zawiera datę
-        is_date = any(re.search(pattern, line.lower()) for pattern in date_patterns)
+        is_date = _PERIOD_RE.search(line.lower()) is not None
         
         if is_date and not exp['period']:
             exp['period'] = line
         elif (not exp['company'] and 
-              not any(line.startswith(marker) for marker in responsibility_markers) and
+              not line.startswith(RESPONSIBILITY_MARKERS) and
               not is_date and
               len(line) > 2 and len(line) < 100 and
               not line.lower().startswith(('opis', 'obowiązki', 'zakres', 'odpowiedzialności'))):
             exp['company'] = line
-        elif any(line.startswith(marker) for marker in responsibility_markers):
+        elif line.startswith(RESPONSIBILITY_MARKERS):
             # Usuń marker i dodaj do obowiązków
             responsibility = line
-            for marker in responsibility_markers:
+            for marker in RESPONSIBILITY_MARKERS:
                 if responsibility.startswith(marker):
                     responsibility = responsibility[len(marker):].strip()
                     break
@@ -494,18 +545,13 @@ def parse_education_item(content):
             break
     
     # Szukaj uczelni i okresu
-    date_patterns = [
-        r'\d{4}[\s-]*\d{4}',  # 2020-2024
-        r'\d{1,2}[\./]\d{4}[\s-]*\d{1,2}[\./]\d{4}',  # 01/2020 - 12/2024
-    ]
-    
     for line in content[1:] if len(content) > 1 else []:
         line = line.strip()
         if not line:
             continue
             
         # Sprawdź czy zawiera datę
-        is_date = any(re.search(pattern, line) for pattern in date_patterns)
+        is_date = _EDUCATION_DATE_RE.search(line) is not None
         
         if is_date and not edu['period']:
             edu['period'] = line
@@ -532,33 +578,39 @@ def get_default_cv_data():
         'additional_info': []
     }
 
+def parse_cv_document(cv_text):
+    """
+    Parsuje tekst CV do typowanego dokumentu CVDocument
+    """
+    return CVDocument.from_dict(parse_cv_to_structured_data(cv_text))
+
 def generate_cv_html(cv_text):
     """
-    Generuje sformatowane HTML CV na podstawie tekstu
+    Generuje sformatowane HTML CV na podstawie tekstu lub gotowego CVDocument
     """
     try:
-        if not cv_text or not cv_text.strip():
-            return None
-            
-        # Parsuj CV do strukturalnych danych
-        cv_data = parse_cv_to_structured_data(cv_text)
+        if isinstance(cv_text, CVDocument):
+            # Dokument już sparsowany (np. zapisany przy CVUpload)
+            cv_data = cv_text.template_context()
+        else:
+            if not cv_text or not cv_text.strip():
+                return None
+                
+            # Parsuj CV do strukturalnych danych
+            cv_data = parse_cv_to_structured_data(cv_text)
         
         # Sprawdź czy cv_data jest prawidłowe
         if not cv_data or not isinstance(cv_data, dict):
             logger.error("Failed to parse CV data")
             return None
         
-        # Wczytaj szablon
+        # Renderuj szablon z danymi (skompilowany szablon pochodzi z cache Jinja)
         try:
-            with open('templates/cv_template.html', 'r', encoding='utf-8') as f:
-                template_content = f.read()
-        except FileNotFoundError:
+            html_cv = render_template(CV_TEMPLATE_NAME, **cv_data)
+        except TemplateNotFound:
             logger.error("CV template file not found")
             return None
         
-        # Renderuj szablon z danymi
-        html_cv = render_template_string(template_content, **cv_data)
-        
         # Sprawdź czy HTML został wygenerowany poprawnie
         if html_cv and len(html_cv.strip()) > 100:  # Podstawowa walidacja długości
             return html_cv
@@ -0,0 +1,169 @@
+# -*- coding: utf-8 -*-
+"""
+Konfiguracja silnika bazy danych: rozmiar puli dla gunicorn + gevent,
+tryb zgodny z PgBouncer, limity czasu zapytań i pomiar oczekiwania na pulę.
+
+Zmienne środowiskowe (wszystkie opcjonalne):
+    WEB_CONCURRENCY          liczba procesów gunicorn (jak w Procfile)
+    DB_MAX_CONNECTIONS       budżet połączeń wszystkich procesów (domyślnie 90)
+    DB_POOL_SIZE             stały rozmiar puli na proces
+    DB_MAX_OVERFLOW          dodatkowe połączenia ponad pulę
+    DB_POOL_TIMEOUT          sekundy oczekiwania na wolne połączenie
+    DB_POOL_PRE_PING         1 = sprawdzanie połączenia przy każdym pobraniu z puli
+    DB_STATEMENT_TIMEOUT_MS  limit czasu pojedynczego zapytania
+    DB_PGBOUNCER             1 = połączenie przez PgBouncer (transaction pooling)
+"""
+import logging
+import os
+import threading
+import time
+
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+from sqlalchemy.pool import QueuePool
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MAX_CONNECTIONS = 90  # max_connections=100 minus połączenia administracyjne
+DEFAULT_STATEMENT_TIMEOUT_MS = 30000
+DEFAULT_IDLE_IN_TRANSACTION_TIMEOUT_MS = 60000
+SLOW_CHECKOUT_SECONDS = 0.1
+
+
+class PoolWaitStats:
+    """Liczniki czasu oczekiwania na połączenie z puli (na proces)"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.checkouts = 0
+        self.slow_checkouts = 0
+        self.timeouts = 0
+        self.total_wait = 0.0
+        self.max_wait = 0.0
+
+    def record(self, wait, timed_out=False):
+        with self._lock:
+            self.checkouts += 1
+            self.total_wait += wait
+            self.max_wait = max(self.max_wait, wait)
+            if wait >= SLOW_CHECKOUT_SECONDS:
+                self.slow_checkouts += 1
+            if timed_out:
+                self.timeouts += 1
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'checkouts': self.checkouts,
+                'slow_checkouts': self.slow_checkouts,
+                'timeouts': self.timeouts,
+                'avg_wait_ms': round(self.total_wait / self.checkouts * 1000, 2) if self.checkouts else 0.0,
+                'max_wait_ms': round(self.max_wait * 1000, 2)
+            }
+
+
+pool_wait_stats = PoolWaitStats()
+
+
+class TimedQueuePool(QueuePool):
+    """QueuePool mierzący czas oczekiwania na połączenie (również tworzenie nowego)"""
+
+    def _do_get(self):
+        start = time.perf_counter()
+        timed_out = False
+        try:
+            return super()._do_get()
+        except PoolTimeoutError:
+            timed_out = True
+            raise
+        finally:
+            wait = time.perf_counter() - start
+            pool_wait_stats.record(wait, timed_out)
+            if wait >= SLOW_CHECKOUT_SECONDS:
+                logger.warning(f"Slow DB pool checkout: {wait * 1000:.0f} ms ({self.status()})")
+
+
+def gevent_active():
+    """Czy proces działa w workerze gevent (moduł socket podmieniony)"""
+    try:
+        from gevent import monkey
+    except ImportError:
+        return False
+    return monkey.is_module_patched('socket')
+
+
+def patch_psycopg_for_gevent():
+    """
+    psycopg2 blokuje cały proces podczas zapytania - psycogreen przełącza je
+    w tryb asynchroniczny, żeby greenlety nie czekały na siebie nawzajem
+    """
+    try:
+        from psycogreen.gevent import patch_psycopg
+    except ImportError:
+        logger.warning("psycogreen not installed - PostgreSQL queries will block the gevent worker")
+        return False
+    patch_psycopg()
+    return True
+
+
+def _env_int(environ, name, default=None):
+    value = environ.get(name)
+    return int(value) if value not in (None, '') else default
+
+
+def pool_sizing(environ, use_gevent):
+    """
+    Zwraca (pool_size, max_overflow) dla jednego procesu.
+    Suma po procesach nie przekracza DB_MAX_CONNECTIONS.
+    """
+    workers = max(1, _env_int(environ, 'WEB_CONCURRENCY', 2))
+    budget = _env_int(environ, 'DB_MAX_CONNECTIONS', DEFAULT_MAX_CONNECTIONS)
+    per_worker = max(2, budget // workers)
+
+    # gevent: setki greenletów w procesie - pula z budżetu; sync/threaded: kilka połączeń wystarczy
+    default_pool = max(2, per_worker * 2 // 3) if use_gevent else min(5, per_worker)
+    pool_size = min(_env_int(environ, 'DB_POOL_SIZE', default_pool), per_worker)
+    max_overflow = _env_int(environ, 'DB_MAX_OVERFLOW', per_worker - pool_size)
+    return pool_size, max_overflow
+
+
+def build_engine_options(database_url, environ=None, use_gevent=None):
+    """Opcje SQLALCHEMY_ENGINE_OPTIONS dla podanego adresu bazy"""
+    environ = os.environ if environ is None else environ
+    if database_url and database_url.startswith('sqlite'):
+        return {'pool_pre_ping': True}
+
+    if use_gevent is None:
+        use_gevent = gevent_active()
+    pool_size, max_overflow = pool_sizing(environ, use_gevent)
+    pgbouncer = environ.get('DB_PGBOUNCER') == '1'
+    statement_timeout = _env_int(environ, 'DB_STATEMENT_TIMEOUT_MS', DEFAULT_STATEMENT_TIMEOUT_MS)
+
+    connect_args = {
+        'client_encoding': 'utf8',
+        'connect_timeout': 10,
+        # Martwe połączenia wykrywa TCP keepalive zamiast pingu przy każdym pobraniu
+        'keepalives': 1,
+        'keepalives_idle': 30,
+        'keepalives_interval': 10,
+        'keepalives_count': 3,
+    }
+    if not pgbouncer:
+        # PgBouncer odrzuca parametr startowy options - limity ustaw przez ALTER ROLE ... SET
+        connect_args['options'] = (
+            f'-c statement_timeout={statement_timeout} '
+            f'-c idle_in_transaction_session_timeout={DEFAULT_IDLE_IN_TRANSACTION_TIMEOUT_MS}')
+
+    return {
+        'poolclass': TimedQueuePool,
+        'pool_size': pool_size,
+        'max_overflow': max_overflow,
+        'pool_timeout': _env_int(environ, 'DB_POOL_TIMEOUT', 10),
+        'pool_recycle': 300,
+        'pool_pre_ping': environ.get('DB_POOL_PRE_PING') == '1',
+        # LIFO - nadmiarowe połączenia szybciej się starzeją i są zamykane przez pool_recycle
+        'pool_use_lifo': True,
+        'connect_args': connect_args,
+    }
@@ -0,0 +1,85 @@
+# -*- coding: utf-8 -*-
+from collections import deque
+
+
+class KeywordMatcher:
+    """
+    Automat Aho–Corasick wyszukujący wiele słów kluczowych w jednym przejściu po tekście.
+
+    Czas wyszukiwania zależy od długości tekstu i liczby trafień, a nie od
+    rozmiaru słownika - można go rozszerzać o kolejne języki i miasta.
+    """
+
+    def __init__(self, keywords=None):
+        # Trie: przejścia i wyjścia (słowo, wartość) per stan; DFA budowane leniwie
+        self._goto = [{}]
+        self._outputs = [[]]
+        self._delta = None
+        if keywords:
+            for keyword, value in keywords:
+                self.add(keyword, value)
+
+    def add(self, keyword, value=None):
+        """
+        Dodaje słowo kluczowe z przypisaną wartością (to samo słowo może mieć kilka wartości)
+        """
+        if not keyword:
+            raise ValueError("Słowo kluczowe nie może być puste")
+
+        state = 0
+        for char in keyword:
+            next_state = self._goto[state].get(char)
+            if next_state is None:
+                next_state = len(self._goto)
+                self._goto.append({})
+                self._outputs.append([])
+                self._goto[state][char] = next_state
+            state = next_state
+        self._outputs[state].append((keyword, value))
+        self._delta = None  # Automat do przebudowy przy następnym wyszukiwaniu
+
+    def _build(self):
+        """
+        Wylicza linki porażki i pełną tablicę przejść (DFA) - jedno dict.get na znak
+        """
+        fail = [0] * len(self._goto)
+        outputs = [list(out) for out in self._outputs]
+        delta = [None] * len(self._goto)
+        delta[0] = dict(self._goto[0])
+
+        queue = deque()
+        for child in self._goto[0].values():
+            queue.append(child)
+
+        while queue:
+            state = queue.popleft()
+            # Przejścia stanu = przejścia jego linku porażki nadpisane własnymi krawędziami trie
+            delta[state] = {**delta[fail[state]], **self._goto[state]}
+            for char, child in self._goto[state].items():
+                fail[child] = delta[fail[state]].get(char, 0)
+                outputs[child].extend(outputs[fail[child]])
+                queue.append(child)
+
+        self._delta = delta
+        self._build_outputs = outputs
+
+    def find_all(self, text):
+        """
+        Zwraca listę trafień (pozycja_początku, słowo, wartość) w kolejności końca dopasowania
+        """
+        if self._delta is None:
+            self._build()
+        delta = self._delta
+        outputs = self._build_outputs
+
+        matches = []
+        state = 0
+        for end, char in enumerate(text):
+            state = delta[state].get(char, 0)
+            if outputs[state]:
+                for keyword, value in outputs[state]:
+                    matches.append((end - len(keyword) + 1, keyword, value))
+        return matches
+
+    def __len__(self):
+        return sum(len(out) for out in self._outputs)
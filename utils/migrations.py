@@ -0,0 +1,203 @@
+# -*- coding: utf-8 -*-
+"""
+Wersjonowane migracje schematu bazy danych (w stylu Alembic, bez zależności)
+
+Każda migracja ma identyfikator rewizji i jest wykonywana dokładnie raz -
+zastosowane rewizje zapisywane są w tabeli schema_migrations. Migracje
+muszą być idempotentne (IF NOT EXISTS, sprawdzanie kolumn), bo pierwsza
+z nich tworzy brakujące tabele z aktualnych modeli.
+"""
+import logging
+from datetime import datetime
+
+from sqlalchemy import LargeBinary, inspect, text
+from sqlalchemy.exc import IntegrityError
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_TABLE = 'schema_migrations'
+# Klucz pg_advisory_xact_lock - migracje z kilku procesów (build, release) po kolei
+MIGRATIONS_LOCK_KEY = 720_035_001
+
+# (rewizja, opis, funkcja(conn, metadata)) - w kolejności wykonywania
+MIGRATIONS = []
+
+
+def migration(revision, description):
+    """Dekorator rejestrujący migrację"""
+    def register(func):
+        MIGRATIONS.append((revision, description, func))
+        return func
+    return register
+
+
+def add_column(conn, table, column, column_type):
+    """Dodaje kolumnę nullable jeśli jeszcze nie istnieje"""
+    existing = {col['name'] for col in inspect(conn).get_columns(table)}
+    if column not in existing:
+        quoted_table = conn.dialect.identifier_preparer.quote(table)
+        conn.execute(text(f'ALTER TABLE {quoted_table} ADD COLUMN {column} {column_type}'))
+
+
+def create_index(conn, name, table, columns, unique=False):
+    """Tworzy indeks jeśli jeszcze nie istnieje (PostgreSQL i SQLite)"""
+    unique_sql = 'UNIQUE ' if unique else ''
+    conn.execute(text(
+        f'CREATE {unique_sql}INDEX IF NOT EXISTS {name} ON {table} ({", ".join(columns)})'))
+
+
+@migration('0001_initial', 'Tabele z modeli aplikacji')
+def initial_schema(conn, metadata):
+    metadata.create_all(conn)
+
+
+@migration('0002_user_statistics_counters', 'Zmaterializowane liczniki w user_statistics')
+def user_statistics_counters(conn, metadata):
+    for column in ('cv_count', 'optimized_count', 'analyzed_count', 'cover_letters_count',
+                   'interview_questions_count', 'skills_analyses_count', 'total_spent'):
+        add_column(conn, 'user_statistics', column, 'INTEGER')
+
+
+@migration('0003_user_entitlements_version', 'Wersja uprawnień użytkownika')
+def user_entitlements_version(conn, metadata):
+    add_column(conn, 'user', 'entitlements_version', 'INTEGER')
+
+
+# Indeksy dla zapytań wykonywanych przy każdym żądaniu
+HOT_PATH_INDEXES = (
+    ('ix_cv_upload_user_id_created_at', 'cv_upload', ('user_id', 'created_at')),
+    ('ix_cover_letter_cv_upload_id', 'cover_letter', ('cv_upload_id',)),
+    ('ix_cover_letter_user_id_created_at', 'cover_letter', ('user_id', 'created_at')),
+    ('ix_interview_questions_cv_upload_id', 'interview_questions', ('cv_upload_id',)),
+    ('ix_interview_questions_user_id_created_at', 'interview_questions', ('user_id', 'created_at')),
+    ('ix_skills_gap_analysis_cv_upload_id', 'skills_gap_analysis', ('cv_upload_id',)),
+    ('ix_skills_gap_analysis_user_id_created_at', 'skills_gap_analysis', ('user_id', 'created_at')),
+    ('ix_subscription_user_id_status', 'subscription', ('user_id', 'status')),
+    ('ix_single_payment_user_id', 'single_payment', ('user_id',)),
+    ('ix_stripe_payment_user_id_status', 'stripe_payment', ('user_id', 'status')),
+    ('ix_user_statistics_user_id', 'user_statistics', ('user_id',)),
+)
+
+
+@migration('0004_hot_path_indexes', 'Indeksy złożone dla zapytań tras')
+def hot_path_indexes(conn, metadata):
+    for name, table, columns in HOT_PATH_INDEXES:
+        create_index(conn, name, table, columns)
+
+
+# Kolumny typu CompressedText (utils/compressed_text.py)
+COMPRESSED_TEXT_COLUMNS = (
+    ('cv_upload', 'original_text'),
+    ('cv_upload', 'optimized_cv'),
+    ('cv_upload', 'cv_analysis'),
+    ('cover_letter', 'cover_letter_content'),
+    ('interview_questions', 'questions_content'),
+    ('skills_gap_analysis', 'analysis_content'),
+)
+
+
+@migration('0005_compressed_text_columns', 'Kolumny bytea dla kompresowanych tekstów')
+def compressed_text_columns(conn, metadata):
+    # SQLite zapisuje BLOB w kolumnie TEXT bez zmiany typu; istniejące wiersze
+    # pozostają tekstem do czasu `flask compress-texts`
+    if conn.dialect.name != 'postgresql':
+        return
+    inspector = inspect(conn)
+    for table, column in COMPRESSED_TEXT_COLUMNS:
+        column_types = {col['name']: col['type'] for col in inspector.get_columns(table)}
+        if isinstance(column_types[column], LargeBinary):
+            continue
+        conn.execute(text(
+            f"ALTER TABLE {table} ALTER COLUMN {column} TYPE bytea "
+            f"USING convert_to({column}, 'UTF8')"))
+
+
+@migration('0006_stripe_webhook_inbox', 'Skrzynka odbiorcza webhooków Stripe')
+def stripe_webhook_inbox(conn, metadata):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS stripe_webhook_event ('
+        'id VARCHAR(255) PRIMARY KEY, '
+        'event_type VARCHAR(100) NOT NULL, '
+        'payload TEXT NOT NULL, '
+        'status VARCHAR(20) NOT NULL, '
+        'attempts INTEGER NOT NULL, '
+        'last_error TEXT, '
+        'received_at TIMESTAMP NOT NULL, '
+        'locked_at TIMESTAMP, '
+        'processed_at TIMESTAMP)'))
+    create_index(conn, 'ix_stripe_webhook_event_status_received_at', 'stripe_webhook_event',
+                 ('status', 'received_at'))
+
+
+@migration('0007_credit_reservations', 'Rezerwacje kredytów optymalizacji')
+def credit_reservations(conn, metadata):
+    conn.execute(text(
+        'CREATE TABLE IF NOT EXISTS credit_reservation ('
+        f'id {"SERIAL" if conn.dialect.name == "postgresql" else "INTEGER"} PRIMARY KEY, '
+        'user_id INTEGER NOT NULL REFERENCES "user" (id), '
+        'single_payment_id INTEGER NOT NULL REFERENCES single_payment (id), '
+        'status VARCHAR(20) NOT NULL, '
+        'created_at TIMESTAMP NOT NULL, '
+        'settled_at TIMESTAMP)'))
+    create_index(conn, 'ix_credit_reservation_user_id_status', 'credit_reservation',
+                 ('user_id', 'status'))
+
+
+@migration('0008_rate_limit_counters', 'Liczniki limitów zapytań')
+def rate_limit_counter_table(conn, metadata):
+    from utils.rate_limit import rate_limit_counters
+    rate_limit_counters.create(conn, checkfirst=True)
+
+
+def _ensure_migrations_table(conn):
+    conn.execute(text(
+        f'CREATE TABLE IF NOT EXISTS {MIGRATIONS_TABLE} ('
+        'revision VARCHAR(64) PRIMARY KEY, '
+        'description VARCHAR(255), '
+        'applied_at TIMESTAMP)'))
+
+
+def applied_revisions(engine):
+    """Zwraca zbiór zastosowanych rewizji"""
+    with engine.begin() as conn:
+        _ensure_migrations_table(conn)
+        return {row[0] for row in conn.execute(text(f'SELECT revision FROM {MIGRATIONS_TABLE}'))}
+
+
+def pending_migrations(engine):
+    applied = applied_revisions(engine)
+    return [(revision, description) for revision, description, _ in MIGRATIONS
+            if revision not in applied]
+
+
+def upgrade(engine, metadata):
+    """
+    Wykonuje brakujące migracje - każda we własnej transakcji.
+    Zwraca listę zastosowanych rewizji.
+    """
+    applied = applied_revisions(engine)
+    newly_applied = []
+    for revision, description, func in MIGRATIONS:
+        if revision in applied:
+            continue
+        try:
+            with engine.begin() as conn:
+                if conn.dialect.name == 'postgresql':
+                    conn.execute(text('SELECT pg_advisory_xact_lock(:key)'), {'key': MIGRATIONS_LOCK_KEY})
+                    if conn.execute(text(f'SELECT 1 FROM {MIGRATIONS_TABLE} WHERE revision = :revision'),
+                                    {'revision': revision}).scalar():
+                        logger.info(f"Migration {revision} already applied by another process")
+                        continue
+                func(conn, metadata)
+                conn.execute(
+                    text(f'INSERT INTO {MIGRATIONS_TABLE} (revision, description, applied_at) '
+                         'VALUES (:revision, :description, :applied_at)'),
+                    {'revision': revision, 'description': description,
+                     'applied_at': datetime.utcnow()})
+        except IntegrityError:
+            # Inny proces zastosował tę rewizję równolegle
+            logger.info(f"Migration {revision} already applied by another process")
+            continue
+        logger.info(f"Applied migration {revision}: {description}")
+        newly_applied.append(revision)
+    return newly_applied
@@ -5,8 +5,6 @@ import requests
 import urllib.parse
 import hashlib
 import time
-from bs4 import BeautifulSoup
-from dotenv import load_dotenv
 
 # Create persistent session for connection reuse
 session = requests.Session()
@@ -59,9 +57,6 @@ def save_to_cache(cache_key, response, model_used):
     logger.info(f"💾 Zapisano do cache (obecny rozmiar: {len(_cache)} wpisów)")
 
 
-# Load environment variables from .env file with override
-load_dotenv(override=True)
-
 logger = logging.getLogger(__name__)
 
 # Load and validate OpenRouter API key
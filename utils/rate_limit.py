@@ -0,0 +1,176 @@
+# -*- coding: utf-8 -*-
+"""
+Limity zapytań w oknie przesuwnym (sliding window counter)
+
+Licznik bieżącego okna plus licznik poprzedniego okna ważony częścią, która
+wciąż mieści się w oknie - dokładność bliska logowi zapytań przy dwóch
+liczbach na klucz. Liczniki są w pamięci procesu (MemoryStore) albo w bazie
+(DatabaseStore, wspólne dla wszystkich workerów gunicorn).
+
+Limity zapisuje się jako '10/minute', '100/hour' itp.
+"""
+import math
+import threading
+import time
+from collections import namedtuple
+
+from sqlalchemy import BigInteger, Column, Integer, MetaData, String, Table, delete, select, update
+
+RateLimit = namedtuple('RateLimit', 'limit window')
+RateLimitResult = namedtuple('RateLimitResult', 'allowed retry_after remaining')
+
+PERIODS = {'second': 1, 'minute': 60, 'hour': 3600, 'day': 86400}
+CLEANUP_INTERVAL_SECONDS = 300
+
+metadata = MetaData()
+rate_limit_counters = Table(
+    'rate_limit_counter', metadata,
+    Column('key', String(255), primary_key=True),
+    Column('window_start', BigInteger, primary_key=True),
+    Column('count', Integer, nullable=False),
+    Column('expires_at', BigInteger, nullable=False, index=True),
+)
+
+
+def parse_rate(rate):
+    """'10/minute' -> RateLimit(10, 60); przyjmuje też '5/10 minutes'"""
+    count, _, period = rate.partition('/')
+    amount, _, unit = period.strip().rpartition(' ')
+    seconds = PERIODS.get(unit.rstrip('s')) if unit else None
+    if seconds is None:
+        raise ValueError(f"Nieprawidłowy limit: {rate}")
+    return RateLimit(int(count), seconds * (int(amount) if amount else 1))
+
+
+def parse_rates(rates):
+    return [parse_rate(rate) if isinstance(rate, str) else rate for rate in rates]
+
+
+class MemoryStore:
+    """Liczniki w pamięci procesu - limit obowiązuje osobno w każdym workerze"""
+
+    def __init__(self):
+        self._counts = {}  # (klucz, początek okna) -> (licznik, wygasa)
+        self._lock = threading.Lock()
+        self._last_cleanup = 0
+
+    def hit(self, slots, now, accept):
+        """
+        Zwiększa liczniki okien slots [(klucz, początek okna, długość okna)] i zwraca
+        [(licznik poprzedniego okna, licznik bieżącego)]. Gdy accept(liczniki) zwróci
+        False, zwiększenie jest cofane - odrzucone zapytanie nie zużywa limitu.
+        """
+        with self._lock:
+            if now - self._last_cleanup >= CLEANUP_INTERVAL_SECONDS:
+                self._counts = {k: v for k, v in self._counts.items() if v[1] > now}
+                self._last_cleanup = now
+            counts = []
+            for key, window_start, window in slots:
+                count = self._counts.get((key, window_start), (0, 0))[0] + 1
+                self._counts[(key, window_start)] = (count, window_start + 2 * window)
+                counts.append((self._counts.get((key, window_start - window), (0, 0))[0], count))
+            if not accept(counts):
+                for (key, window_start, _), (_, count) in zip(slots, counts):
+                    self._counts[(key, window_start)] = (count - 1, self._counts[(key, window_start)][1])
+        return counts
+
+
+class DatabaseStore:
+    """Liczniki w tabeli rate_limit_counter - wspólne dla wszystkich procesów"""
+
+    def __init__(self, engine):
+        self.engine = engine
+        self._last_cleanup = 0
+
+    def _insert(self):
+        if self.engine.dialect.name == 'postgresql':
+            from sqlalchemy.dialects.postgresql import insert
+        else:
+            from sqlalchemy.dialects.sqlite import insert
+        return insert(rate_limit_counters)
+
+    def hit(self, slots, now, accept):
+        """Jak MemoryStore.hit - wszystkie okna i klucze w jednej transakcji"""
+        table = rate_limit_counters
+        insert = self._insert()
+        counts = []
+        # Własne połączenie - licznik nie czeka na transakcję żądania
+        with self.engine.begin() as conn:
+            for key, window_start, window in slots:
+                upsert = insert.values(key=key, window_start=window_start, count=1,
+                                       expires_at=window_start + 2 * window)
+                upsert = upsert.on_conflict_do_update(
+                    index_elements=[table.c.key, table.c.window_start],
+                    set_={'count': table.c.count + 1}).returning(table.c.count)
+                count = conn.execute(upsert).scalar()
+                previous = conn.execute(select(table.c.count).where(
+                    table.c.key == key, table.c.window_start == window_start - window)).scalar() or 0
+                counts.append((previous, count))
+            if not accept(counts):
+                for key, window_start, _ in slots:
+                    conn.execute(update(table).where(
+                        table.c.key == key, table.c.window_start == window_start
+                    ).values(count=table.c.count - 1))
+            if now - self._last_cleanup >= CLEANUP_INTERVAL_SECONDS:
+                self._last_cleanup = now
+                conn.execute(delete(table).where(table.c.expires_at <= now))
+        return counts
+
+
+class RateLimiter:
+
+    def __init__(self, store, clock=time.time):
+        self.store = store
+        self.clock = clock
+
+    def hit(self, key, limits):
+        """Rejestruje zapytanie dla klucza i sprawdza wszystkie limity"""
+        return self.hit_many([(key, limits)])[0]
+
+    def hit_many(self, checks):
+        """
+        Sprawdza kilka kluczy naraz [(klucz, limity)] - jeden dostęp do magazynu.
+        Zapytanie jest liczone tylko wtedy, gdy mieszczą się wszystkie limity
+        wszystkich kluczy; odrzucone nie wydłuża blokady.
+        """
+        now = self.clock()
+        slots, rates = [], []
+        for index, (key, limits) in enumerate(checks):
+            for rate in limits:
+                slots.append((f"{key}:{rate.window}", int(now // rate.window * rate.window), rate.window))
+                rates.append((index, rate))
+
+        def estimate(rate, window_start, previous, current):
+            return previous * (1 - (now - window_start) / rate.window) + current
+
+        def accept(counts):
+            return all(estimate(rate, slot[1], *count) <= rate.limit
+                       for (_, rate), slot, count in zip(rates, slots, counts))
+
+        counts = self.store.hit(slots, int(now), accept)
+        accepted = accept(counts)
+
+        results = [[True, 0, None] for _ in checks]
+        for (index, rate), (_, window_start, _), (previous, current) in zip(rates, slots, counts):
+            result = results[index]
+            estimated = estimate(rate, window_start, previous, current)
+            left = max(0, math.floor(rate.limit - estimated)) if accepted else 0
+            result[2] = left if result[2] is None else min(result[2], left)
+            if estimated > rate.limit:
+                result[0] = False
+                # Licznik w magazynie nie obejmuje odrzuconego zapytania
+                result[1] = max(result[1], self._retry_after(rate, now, window_start, previous, current - 1))
+        return [RateLimitResult(allowed, retry_after, remaining or 0)
+                for allowed, retry_after, remaining in results]
+
+    @staticmethod
+    def _retry_after(rate, now, window_start, previous, current):
+        """Sekundy do chwili, w której kolejne zapytanie zmieści się w limicie (current - zapisany licznik)"""
+        # Jeszcze w bieżącym oknie: previous * (1 - f) + current + 1 <= limit
+        if current < rate.limit and previous:
+            fraction = 1 - (rate.limit - current - 1) / previous
+            if fraction <= 1:
+                return max(1, math.ceil(window_start + fraction * rate.window - now))
+        # W następnym oknie bieżący licznik staje się poprzednim: current * (1 - f) + 1 <= limit
+        fraction = 1 - (rate.limit - 1) / max(current, 1)
+        return max(1, math.ceil(window_start + rate.window + fraction * rate.window - now))
@@ -0,0 +1,46 @@
+# -*- coding: utf-8 -*-
+from datetime import datetime
+
+from sqlalchemy import func
+
+# Formaty klucza przedziału: (PostgreSQL to_char, SQLite strftime, Python strftime)
+_BUCKET_FORMATS = {
+    'day': ('YYYY-MM-DD', '%Y-%m-%d', '%Y-%m-%d'),
+    'month': ('YYYY-MM', '%Y-%m', '%Y-%m'),
+    'year': ('YYYY', '%Y', '%Y'),
+}
+
+
+def time_bucket(column, dialect_name, unit='month'):
+    """
+    Zwraca wyrażenie SQL z kluczem przedziału czasu jako tekst (np. '2025-03')
+
+    PostgreSQL używa date_trunc + to_char, SQLite strftime - klucz jest taki sam
+    jak bucket_key() po stronie Pythona, więc wyniki GROUP BY można łączyć z listą
+    oczekiwanych przedziałów.
+    """
+    if unit not in _BUCKET_FORMATS:
+        raise ValueError(f"Nieobsługiwana jednostka przedziału: {unit}")
+
+    pg_format, sqlite_format, _ = _BUCKET_FORMATS[unit]
+    if dialect_name == 'postgresql':
+        return func.to_char(func.date_trunc(unit, column), pg_format)
+    return func.strftime(sqlite_format, column)
+
+
+def bucket_key(moment, unit='month'):
+    """Klucz przedziału dla daty - zgodny z time_bucket()"""
+    return moment.strftime(_BUCKET_FORMATS[unit][2])
+
+
+def last_month_starts(count, now=None):
+    """Zwraca początki ostatnich `count` miesięcy kalendarzowych, od najstarszego"""
+    now = now or datetime.utcnow()
+    year, month = now.year, now.month
+    starts = []
+    for _ in range(count):
+        starts.append(datetime(year, month, 1))
+        month -= 1
+        if month == 0:
+            year, month = year - 1, 12
+    return list(reversed(starts))
@@ -0,0 +1,25 @@
+# -*- coding: utf-8 -*-
+import time
+
+
+class StartupTimer:
+    """Czas kolejnych etapów importu aplikacji - raport logowany po starcie procesu"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self._last = self.started
+        self.phases = []
+
+    def mark(self, phase):
+        """Zamyka etap trwający od poprzedniego znacznika"""
+        now = time.perf_counter()
+        self.phases.append((phase, now - self._last))
+        self._last = now
+
+    @property
+    def total(self):
+        return self._last - self.started
+
+    def report(self):
+        phases = ', '.join(f"{phase} {seconds * 1000:.0f} ms" for phase, seconds in self.phases)
+        return f"Startup timing: {phases} (total {self.total * 1000:.0f} ms)"
@@ -0,0 +1,157 @@
+# -*- coding: utf-8 -*-
+"""
+Pliki statyczne z nazwami zawierającymi skrót zawartości
+
+url_for('static', filename='css/custom.css') zwraca /static/css/custom.<skrót>.css.
+Taki adres zmienia się razem z zawartością pliku, więc można go cache'ować
+bezterminowo (immutable). Zwykłe nazwy i nieaktualne skróty nadal działają,
+ale z krótkim cache i rewalidacją przez ETag/Last-Modified.
+
+/service-worker.js to static/service-worker.js poprzedzony konfiguracją z listą
+adresów app shell ze skrótami - nowa wersja pliku oznacza nowego workera i cache.
+"""
+import hashlib
+import json
+import mimetypes
+import os
+import re
+
+from flask import Response, request, send_from_directory, url_for
+from werkzeug.security import safe_join
+
+from utils.compression import (MIN_COMPRESS_SIZE, STATIC_LEVELS, compress, is_compressible,
+                               negotiate_encoding)
+
+IMMUTABLE_CACHE_CONTROL = 'public, max-age=31536000, immutable'
+REVALIDATE_CACHE_CONTROL = 'public, max-age=300, must-revalidate'
+
+# Pliki, których adres nie może się zmieniać (np. service worker - zakres rejestracji)
+UNHASHED_FILES = frozenset({'service-worker.js'})
+
+SERVICE_WORKER_FILE = 'service-worker.js'
+OFFLINE_PAGE = 'offline.html'
+# App shell zapisywany w cache przy instalacji service workera
+SERVICE_WORKER_PRECACHE = (OFFLINE_PAGE, 'css/custom.css', 'js/main.js', 'manifest.json', 'icon-192.png')
+
+_HASHED_NAME_RE = re.compile(r'^(?P<stem>.+)\.(?P<digest>[0-9a-f]{12})(?P<ext>\.[^./]+)$')
+
+
+class StaticAssets:
+    """Mapa nazwa pliku -> nazwa ze skrótem, przeliczana po zmianie mtime pliku"""
+
+    def __init__(self, static_folder, check_mtime=True):
+        self.static_folder = static_folder
+        self.check_mtime = check_mtime
+        self._hashed = {}  # filename -> (mtime, hashed_name)
+        self._compressed = {}  # (filename, kodowanie) -> (mtime, dane)
+
+    def hashed_name(self, filename):
+        """Nazwa ze skrótem zawartości lub oryginalna nazwa, gdy pliku nie da się odczytać"""
+        cached = self._hashed.get(filename)
+        if cached and not self.check_mtime:
+            return cached[1]
+
+        path = safe_join(self.static_folder, filename)
+        stem, ext = os.path.splitext(filename)
+        if path is None or not ext or os.path.basename(filename) in UNHASHED_FILES:
+            return filename
+        try:
+            mtime = os.stat(path).st_mtime_ns
+        except OSError:
+            return filename
+        if cached and cached[0] == mtime:
+            return cached[1]
+
+        with open(path, 'rb') as f:
+            digest = hashlib.sha256(f.read()).hexdigest()[:12]
+        hashed = f"{stem}.{digest}{ext}"
+        self._hashed[filename] = (mtime, hashed)
+        return hashed
+
+    def resolve(self, requested):
+        """Zwraca (rzeczywista_nazwa, czy_adres_z_aktualnym_skrótem)"""
+        match = _HASHED_NAME_RE.match(requested)
+        if match:
+            filename = match.group('stem') + match.group('ext')
+            path = safe_join(self.static_folder, filename)
+            if path and os.path.isfile(path):
+                return filename, self.hashed_name(filename) == requested
+        return requested, False
+
+    def compressed(self, filename, encoding):
+        """
+        Skompresowana zawartość pliku (maksymalny poziom, raz na proces i wersję
+        pliku) albo None, gdy plik jest za mały lub kompresja nic nie daje
+        """
+        path = safe_join(self.static_folder, filename)
+        stat = os.stat(path)
+        cached = self._compressed.get((filename, encoding))
+        if cached and cached[0] == stat.st_mtime_ns:
+            return cached[1]
+
+        data = None
+        if stat.st_size >= MIN_COMPRESS_SIZE:
+            with open(path, 'rb') as f:
+                raw = f.read()
+            data = compress(raw, encoding, STATIC_LEVELS[encoding])
+            if len(data) >= len(raw):
+                data = None
+        self._compressed[(filename, encoding)] = (stat.st_mtime_ns, data)
+        return data
+
+    def send(self, filename):
+        """Widok trasy /static/<path:filename>"""
+        filename, fingerprinted = self.resolve(filename)
+        mimetype = mimetypes.guess_type(filename)[0]
+        path = safe_join(self.static_folder, filename)
+
+        response = None
+        if is_compressible(mimetype) and path and os.path.isfile(path):
+            encoding = negotiate_encoding(request.accept_encodings)
+            data = self.compressed(filename, encoding) if encoding else None
+            if data is not None:
+                response = Response(data, mimetype=mimetype)
+                response.headers['Content-Encoding'] = encoding
+                response.set_etag(f"{self.hashed_name(filename)}-{encoding}")
+                response.last_modified = os.path.getmtime(path)
+                response.make_conditional(request)
+        if response is None:
+            response = send_from_directory(self.static_folder, filename)
+        if is_compressible(mimetype):
+            response.vary.add('Accept-Encoding')
+        response.headers['Cache-Control'] = (
+            IMMUTABLE_CACHE_CONTROL if fingerprinted else REVALIDATE_CACHE_CONTROL)
+        return response
+
+    def service_worker(self):
+        """Widok /service-worker.js - skrypt z wersją i listą precache (zakres: cała witryna)"""
+        with open(safe_join(self.static_folder, SERVICE_WORKER_FILE), 'rb') as f:
+            source = f.read()
+        precache = [url_for('static', filename=filename) for filename in SERVICE_WORKER_PRECACHE]
+        version = hashlib.sha256(source + '\n'.join(precache).encode('utf-8')).hexdigest()[:12]
+        config = {'version': version, 'precache': precache,
+                  'offline': url_for('static', filename=OFFLINE_PAGE)}
+
+        response = Response(f"self.__SW_CONFIG = {json.dumps(config)};\n".encode('utf-8') + source,
+                            mimetype='application/javascript')
+        response.set_etag(version)
+        response.make_conditional(request)
+        # Każde sprawdzenie aktualizacji workera rewaliduje skrypt (ETag = wersja)
+        response.headers['Cache-Control'] = 'no-cache'
+        response.headers['Service-Worker-Allowed'] = '/'
+        return response
+
+
+def init_static_assets(app, check_mtime=True):
+    """Podpina nazwy ze skrótem do url_for('static'), obsługę trasy /static i /service-worker.js"""
+    assets = StaticAssets(app.static_folder, check_mtime)
+
+    @app.url_defaults
+    def hashed_static_url(endpoint, values):
+        if endpoint == 'static' and 'filename' in values:
+            values['filename'] = assets.hashed_name(values['filename'])
+
+    app.view_functions['static'] = assets.send
+    app.add_url_rule('/service-worker.js', 'service_worker', assets.service_worker)
+    app.extensions['static_assets'] = assets
+    return assets
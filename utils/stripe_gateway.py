@@ -0,0 +1,161 @@
+# -*- coding: utf-8 -*-
+"""
+Dostęp do API Stripe: limity czasu, ponowienia, cache i ponowne użycie sesji checkout
+
+- każde wywołanie ma limit czasu połączenia i odpowiedzi (zamiast domyślnych 80 s)
+- sesje checkout w stanie końcowym są pamiętane w procesie
+- otwarta sesja checkout tego samego użytkownika i produktu jest używana ponownie
+  (lokalnie z cache, między procesami przez Idempotency-Key Stripe)
+
+Zmienne środowiskowe (opcjonalne):
+    STRIPE_API_BASE   adres API, np. http://localhost:12111 dla stripe_stub.py (atrapa z testów)
+    STRIPE_TIMEOUT    limit czasu odpowiedzi w sekundach (domyślnie 10)
+"""
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+CONNECT_TIMEOUT_SECONDS = 3.05
+DEFAULT_TIMEOUT_SECONDS = 10
+MAX_NETWORK_RETRIES = 2
+
+CACHE_TTL_SECONDS = 600
+CACHE_MAX_ENTRIES = 2000
+# Otwarta sesja checkout jest używana ponownie przez ten czas od utworzenia...
+CHECKOUT_REUSE_SECONDS = 30 * 60
+# ...o ile do jej wygaśnięcia zostało co najmniej tyle
+CHECKOUT_MIN_REMAINING_SECONDS = 10 * 60
+
+# Sesja, która już się nie zmieni (opłacona lub wygasła) - można ją cache'ować
+_FINAL_PAYMENT_STATUSES = frozenset({'paid', 'no_payment_required'})
+
+
+def _replayed(stripe_object):
+    """Czy Stripe zwrócił zapisaną odpowiedź na powtórzony Idempotency-Key"""
+    response = getattr(stripe_object, 'last_response', None)
+    return response is not None and response.headers.get('Idempotent-Replayed') == 'true'
+
+
+class _TTLCache:
+    """Mały słownik z czasem życia wpisów (na proces)"""
+
+    def __init__(self, ttl, max_entries=CACHE_MAX_ENTRIES, clock=time.monotonic):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.clock = clock
+        self._entries = {}
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        expires_at, value = entry
+        if expires_at <= self.clock():
+            self._entries.pop(key, None)
+            return None
+        return value
+
+    def set(self, key, value):
+        with self._lock:
+            if len(self._entries) >= self.max_entries:
+                now = self.clock()
+                for entry_key, (expires_at, _) in list(self._entries.items()):
+                    if expires_at <= now:
+                        del self._entries[entry_key]
+                if len(self._entries) >= self.max_entries:
+                    self._entries.clear()
+            self._entries[key] = (self.clock() + self.ttl, value)
+
+
+class StripeGateway:
+
+    def __init__(self, api_key, api_base=None, timeout=DEFAULT_TIMEOUT_SECONDS,
+                 cache_ttl=CACHE_TTL_SECONDS, clock=time.time):
+        self.api_key = api_key
+        self.api_base = api_base
+        self.timeout = timeout
+        self.clock = clock
+        self._stripe = None
+        self._lock = threading.Lock()
+        self._sessions = _TTLCache(cache_ttl)
+        self._open_checkouts = _TTLCache(CHECKOUT_REUSE_SECONDS)
+
+    @property
+    def stripe(self):
+        """Moduł stripe skonfigurowany przy pierwszym użyciu (import trwa ok. 0,7 s)"""
+        if self._stripe is None:
+            with self._lock:
+                if self._stripe is None:
+                    import stripe
+                    if self.api_key:
+                        stripe.api_key = self.api_key
+                    if self.api_base:
+                        stripe.api_base = self.api_base
+                    stripe.max_network_retries = MAX_NETWORK_RETRIES
+                    stripe.default_http_client = stripe.RequestsClient(
+                        timeout=(CONNECT_TIMEOUT_SECONDS, self.timeout))
+                    self._stripe = stripe
+        return self._stripe
+
+    def create_customer(self, **params):
+        return self.stripe.Customer.create(**params)
+
+    def checkout_session(self, session_id, expand=None):
+        """Sesja checkout; opłacone i wygasłe sesje są pamiętane (ich stan już się nie zmienia)"""
+        key = (session_id, tuple(expand or ()))
+        session = self._sessions.get(key)
+        if session is None:
+            params = {'expand': list(expand)} if expand else {}
+            session = self.stripe.checkout.Session.retrieve(session_id, **params)
+            if session.payment_status in _FINAL_PAYMENT_STATUSES or session.status == 'expired':
+                self._sessions.set(key, session)
+        return session
+
+    def open_checkout_session(self, user_id, product, version, **params):
+        """
+        Sesja checkout dla użytkownika i produktu - ponownie ta sama, dopóki jest
+        otwarta. version (np. wersja uprawnień użytkownika) zmienia się po płatności,
+        więc po zakupie powstaje nowa sesja. Przed ponownym użyciem stan sesji jest
+        sprawdzany w Stripe - webhook z płatnością może jeszcze czekać w skrzynce,
+        a version zmieni się dopiero po jego przetworzeniu.
+        """
+        key = (user_id, product, version)
+        session = self._open_checkouts.get(key)
+        if session is not None:
+            session = self._still_open(session)
+            if session is not None:
+                logger.info(f"Reusing open checkout session {session.id} for user {user_id}")
+                return session
+
+        # Ten sam klucz w innym procesie (lub po restarcie) zwraca z Stripe tę samą sesję
+        window = int(self.clock() // CHECKOUT_REUSE_SECONDS)
+        idempotency_key = f"checkout-{user_id}-{product}-{version}-{window}"
+        try:
+            session = self.stripe.checkout.Session.create(idempotency_key=idempotency_key, **params)
+        except self.stripe.error.IdempotencyError:
+            # Parametry zmieniły się w tym oknie (np. inny adres powrotu) - nowa sesja
+            session = self.stripe.checkout.Session.create(**params)
+        else:
+            # Powtórzona odpowiedź ma stan z chwili utworzenia - sesja mogła być już opłacona
+            if _replayed(session):
+                session = self._still_open(session)
+        if session is None or not self._reusable(session):
+            session = self.stripe.checkout.Session.create(**params)
+        self._open_checkouts.set(key, session)
+        return session
+
+    def _still_open(self, session):
+        """Aktualny stan sesji z Stripe albo None, jeśli nie nadaje się już do użycia"""
+        current = self.checkout_session(session.id)
+        return current if self._reusable(current) else None
+
+    def _reusable(self, session):
+        return (session.status == 'open'
+                and session.expires_at - self.clock() >= CHECKOUT_MIN_REMAINING_SECONDS)
+
+    def subscription(self, subscription_id):
+        # Stan subskrypcji zmienia się (odnowienia, anulowanie) - bez cache
+        return self.stripe.Subscription.retrieve(subscription_id)